@@ -23,6 +23,25 @@ CREATE TABLE Producto (
     estado VARCHAR(20) CHECK (estado IN ('ACTIVO', 'DESCONTINUADO', 'EN_PROMOCION', 'AGOTADO'))
 );
 
+-- Avisa por el canal catalogo_productos qué producto cambió (actualizar_producto, descuento de
+-- stock de un pedido, SQL directo); los catálogos en memoria que escuchan lo releen.
+-- El aviso sale al confirmar la transacción y los repetidos en una misma transacción se juntan.
+CREATE OR REPLACE FUNCTION notificar_cambio_producto()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('catalogo_productos', OLD.id);
+    ELSE
+        PERFORM pg_notify('catalogo_productos', NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_producto_notificar
+AFTER INSERT OR UPDATE OR DELETE ON Producto
+FOR EACH ROW EXECUTE PROCEDURE notificar_cambio_producto();
+
 -- Tabla: Pedido
 CREATE TABLE Pedido (
     id VARCHAR PRIMARY KEY,
@@ -31,6 +50,9 @@ CREATE TABLE Pedido (
     estado VARCHAR(20) CHECK (estado IN ('PENDIENTE', 'EN_PROCESO', 'EN_RUTA', 'ENTREGADO', 'CANCELADO'))
 );
 
+-- Pedidos de un cliente ordenados por fecha; id desempata la paginación por llave (consultar_pedidos_pagina)
+CREATE INDEX idx_pedido_cliente_fecha ON Pedido(cliente_id, fecha DESC, id DESC);
+
 -- Tabla intermedia: Pedido_Producto
 CREATE TABLE Pedido_Producto (
     pedido_id VARCHAR REFERENCES Pedido(id) ON DELETE CASCADE,
@@ -39,6 +61,16 @@ CREATE TABLE Pedido_Producto (
     PRIMARY KEY (pedido_id, producto_id)
 );
 
+-- Pedidos cargados por importar_pedidos.py: la referencia del cliente (su orden de compra)
+-- solo entra una vez, así que volver a importar el mismo archivo no duplica pedidos
+CREATE TABLE PedidoImportado (
+    cliente_id VARCHAR NOT NULL REFERENCES Cliente(id),
+    referencia VARCHAR NOT NULL,
+    pedido_id VARCHAR NOT NULL UNIQUE REFERENCES Pedido(id) ON DELETE CASCADE,
+    fecha_importacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (cliente_id, referencia)
+);
+
 -- Tabla: Factura
 CREATE TABLE Factura (
     id VARCHAR PRIMARY KEY,
@@ -3,10 +3,24 @@ import json
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 from datetime import datetime
+from catalogo import CatalogoProductos
 
 # Ruta de la base de datos (ajusta según tu estructura de archivos)
 DB_PATH = 'Base_datos.db'
 
+def cargar_productos(ids=None):
+    """Filas del catálogo: todos los productos o solo los ids indicados"""
+    with sqlite3.connect(DB_PATH) as conn:
+        if ids is None:
+            return conn.execute("SELECT id, nombre, precio, stock, estado FROM Producto").fetchall()
+        return conn.execute(
+            "SELECT id, nombre, precio, stock, estado FROM Producto WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(ids)),)
+        ).fetchall()
+
+# Catálogo en memoria: la lista se redibuja sin volver a leer toda la tabla Producto
+catalogo = CatalogoProductos(cargar_productos)
+
 class NegociacionApp:
     def __init__(self, root):
         self.root = root
@@ -137,15 +151,11 @@ class NegociacionApp:
         try:
             self.lista_productos.delete(0, tk.END)
             
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, nombre, precio, stock FROM Producto")
-                
-                for producto in cursor.fetchall():
-                    self.lista_productos.insert(
-                        tk.END, 
-                        f"{producto[0]} - {producto[1]} - ${producto[2]:.2f} - Stock: {producto[3]}"
-                    )
+            for producto in catalogo.productos():
+                self.lista_productos.insert(
+                    tk.END, 
+                    f"{producto[0]} - {producto[1]} - ${producto[2]:.2f} - Stock: {producto[3]}"
+                )
         except Exception as e:
             messagebox.showerror("Error", f"No se pudieron cargar los productos: {str(e)}")
 
@@ -168,58 +178,65 @@ class NegociacionApp:
 
             # Procesar productos seleccionados
             productos = []
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                for index in productos_seleccionados:
-                    item = self.lista_productos.get(index)
-                    partes = item.split(" - ")
+            try:
+                with sqlite3.connect(DB_PATH) as conn:
+                    cursor = conn.cursor()
+                    for index in productos_seleccionados:
+                        item = self.lista_productos.get(index)
+                        partes = item.split(" - ")
                     
-                    if len(partes) < 4:
-                        continue  # Saltar elementos mal formados
+                        if len(partes) < 4:
+                            continue  # Saltar elementos mal formados
                         
-                    producto_id = partes[0]
-                    stock = int(partes[3].split(": ")[1])
+                        producto_id = partes[0]
+                        stock = int(partes[3].split(": ")[1])
                     
-                    cantidad = simpledialog.askinteger(
-                        "Cantidad",
-                        f"Ingrese cantidad para {partes[1]} (Stock: {stock}):",
-                        parent=self.root,
-                        minvalue=1,
-                        maxvalue=stock
-                    )
+                        cantidad = simpledialog.askinteger(
+                            "Cantidad",
+                            f"Ingrese cantidad para {partes[1]} (Stock: {stock}):",
+                            parent=self.root,
+                            minvalue=1,
+                            maxvalue=stock
+                        )
                     
-                    if not cantidad:  # Usuario canceló
-                        return
+                        if not cantidad:  # Usuario canceló
+                            conn.rollback()  # Deshacer lo descontado a los productos anteriores
+                            return
                         
-                    # Agregar producto a la negociación
-                    productos.append({
-                        "producto_id": producto_id,
-                        "nombre": partes[1],
-                        "precio": float(partes[2][1:]),  # Eliminar $
-                        "cantidad": cantidad,
-                        "stock_actual": stock
-                    })
-
-                    # Actualizar el stock del producto
-                    nuevo_stock = stock - cantidad
+                        # Agregar producto a la negociación
+                        productos.append({
+                            "producto_id": producto_id,
+                            "nombre": partes[1],
+                            "precio": float(partes[2][1:]),  # Eliminar $
+                            "cantidad": cantidad,
+                            "stock_actual": stock
+                        })
+
+                        # Descontar sobre el stock actual de la base: el de la lista puede venir del
+                        # catálogo en caché y otro usuario pudo vender mientras tanto
+                        cursor.execute(
+                            "UPDATE Producto SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                            (cantidad, producto_id, cantidad)
+                        )
+                        if cursor.rowcount == 0:
+                            raise ValueError(f"Stock insuficiente para {partes[1]}; actualice la lista e intente de nuevo")
+
+                    # Crear términos de negociación
+                    terminos = {
+                        "productos": productos,
+                        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "estado": "Pendiente"
+                    }
+
+                    # Insertar en la base de datos
                     cursor.execute(
-                        "UPDATE Producto SET stock = ? WHERE id = ?",
-                        (nuevo_stock, producto_id)
+                        "INSERT INTO Negociacion (vendedor_id, tienda_id, terminos) VALUES (?, ?, ?)",
+                        (self.vendedor_seleccionado.get(), self.tienda_seleccionada.get(), json.dumps(terminos))
                     )
-
-                # Crear términos de negociación
-                terminos = {
-                    "productos": productos,
-                    "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "estado": "Pendiente"
-                }
-
-                # Insertar en la base de datos
-                cursor.execute(
-                    "INSERT INTO Negociacion (vendedor_id, tienda_id, terminos) VALUES (?, ?, ?)",
-                    (self.vendedor_seleccionado.get(), self.tienda_seleccionada.get(), json.dumps(terminos))
-                )
-                conn.commit()
+                    conn.commit()
+            finally:
+                # Solo se releen los productos cuyo stock se tocó (también si se canceló a medias)
+                catalogo.invalidar(p["producto_id"] for p in productos)
 
             messagebox.showinfo("Éxito", "Negociación registrada correctamente y stock actualizado")
             self.lista_productos.selection_clear(0, tk.END)  # Limpiar selección
@@ -0,0 +1,332 @@
+# almacen_columnar.py
+import sys
+from array import array
+from datetime import datetime
+from zlib import crc32
+
+from conexion import conectar
+from conciliacion import ResultadoConciliacion, marcar_conciliadas, TAMANO_LOTE_CONCILIACION
+from modelo import Transaccion, a_centavos
+
+# Marca de "sin valor" en las columnas numéricas
+NULO = -1
+NULO_REAL = float("nan")
+
+
+class _Catalogo:
+    """Valores muy repetidos (métodos de pago, estados) guardados una sola vez; cada fila lleva su código"""
+
+    def __init__(self):
+        self.codigos = {}
+        self.valores = []
+
+    def codigo(self, valor):
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = len(self.valores)
+            valor = sys.intern(valor) if isinstance(valor, str) else valor
+            self.codigos[valor] = codigo
+            self.valores.append(valor)
+        return codigo
+
+
+class _ColumnaTexto:
+    """
+    Textos casi únicos (ids, facturas, referencias) concatenados en un solo bytearray.
+    Cuesta los bytes del texto más 8 del fin (y 4 del hash), contra ~100 de un str
+    dentro de un diccionario. El hash es crc32: igual en cualquier proceso.
+    """
+
+    def __init__(self, con_hash=False):
+        self.datos = bytearray()
+        self.fin = array("q")
+        self.hashes = array("I") if con_hash else None  # "L" ocupa 8 bytes en Linux de 64 bits
+
+    def agregar(self, texto):
+        codificado = texto.encode()
+        self.datos += codificado
+        self.fin.append(len(self.datos))
+        if self.hashes is not None:
+            self.hashes.append(crc32(codificado))
+
+    def __getitem__(self, fila):
+        inicio = self.fin[fila - 1] if fila else 0
+        return self.datos[inicio:self.fin[fila]].decode()
+
+    def filas_iguales(self, texto, filas):
+        """Filas (de las dadas) cuyo texto es igual; compara primero el hash"""
+        codificado = texto.encode()
+        objetivo, hashes, datos, fin = crc32(codificado), self.hashes, self.datos, self.fin
+        return [i for i in filas
+                if hashes[i] == objetivo and datos[(fin[i - 1] if i else 0):fin[i]] == codificado]
+
+    def nbytes(self):
+        total = len(self.datos) + self.fin.itemsize * len(self.fin)
+        if self.hashes is not None:
+            total += self.hashes.itemsize * len(self.hashes)
+        return total
+
+
+def _a_epoch(valor):
+    if valor is None:
+        return NULO
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return int(valor.timestamp())
+
+
+class AlmacenTransacciones:
+    """
+    Transacciones en columnas paralelas (array) en lugar de objetos Transaccion.
+
+    Cada fila ocupa del orden de 100 bytes: montos en centavos int64, fechas en
+    segundos epoch, métodos y estados como códigos de catálogo, e ids, facturas
+    y referencias en bloques de bytes contiguos. Los objetos Transaccion solo
+    se crean para las filas que cambian.
+    """
+
+    def __init__(self):
+        self.ids = _ColumnaTexto()
+        self.facturas = _ColumnaTexto(con_hash=True)
+        self.referencias = _ColumnaTexto(con_hash=True)
+        self.monto = array("q")               # Centavos
+        self.fecha = array("q")               # Epoch (segundos)
+        self.fecha_conciliacion = array("q")  # Epoch o NULO
+        self.conciliado = array("b")
+        self.timestamp_inicio = array("d")    # NaN = sin valor
+        self.timestamp_fin = array("d")
+        self.metodo = array("B")
+        self.estado = array("B")
+        self.metodos = _Catalogo()
+        self.estados = _Catalogo()
+
+        # Índice hash por referencia (se arma al buscar): cubetas[hash & máscara] -> fila,
+        # siguiente[fila] -> otra fila de la misma cubeta
+        self._cubetas = None
+        self._siguiente = None
+
+        self._modificadas = set()
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def agregar(self, id_transaccion, monto_centavos, metodo_pago, factura_id, referencia_bancaria,
+                fecha, estado="PENDIENTE", conciliado=False, fecha_conciliacion=None,
+                timestamp_inicio=None, timestamp_fin=None):
+        self.ids.agregar(id_transaccion)
+        self.facturas.agregar(factura_id)
+        self.referencias.agregar(referencia_bancaria)
+        self.monto.append(monto_centavos)
+        self.fecha.append(_a_epoch(fecha))
+        self.fecha_conciliacion.append(_a_epoch(fecha_conciliacion))
+        self.conciliado.append(1 if conciliado else 0)
+        self.timestamp_inicio.append(NULO_REAL if timestamp_inicio is None else timestamp_inicio)
+        self.timestamp_fin.append(NULO_REAL if timestamp_fin is None else timestamp_fin)
+        self.metodo.append(self.metodos.codigo(metodo_pago))
+        self.estado.append(self.estados.codigo(estado))
+        self._cubetas = None
+        return len(self.monto) - 1
+
+    @classmethod
+    def desde_base(cls, conn=None, solo_pendientes=True):
+        """Carga las transacciones (por defecto solo las no conciliadas) sin crear objetos Transaccion"""
+        conn = conn or conectar()
+        almacen = cls()
+        sql = """
+            SELECT id, monto, metodo_pago, factura_id, referencia_bancaria, fecha, estado,
+                   conciliado, fecha_conciliacion, timestamp_inicio, timestamp_fin
+            FROM Transaccion
+        """
+        if solo_pendientes:
+            sql += " WHERE conciliado = 0"
+        agregar = almacen.agregar
+        for (id_transaccion, monto, metodo, factura_id, referencia, fecha, estado,
+             conciliado, fecha_conciliacion, inicio, fin) in conn.execute(sql):
+            agregar(id_transaccion, a_centavos(monto), metodo, factura_id, referencia, fecha, estado,
+                    conciliado, fecha_conciliacion, inicio, fin)
+        return almacen
+
+    # ------------------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.monto)
+
+    def id(self, fila):
+        return self.ids[fila]
+
+    def nbytes(self):
+        """Memoria aproximada de las columnas, catálogos e índice (sin contar el intérprete)"""
+        columnas = [self.monto, self.fecha, self.fecha_conciliacion, self.conciliado,
+                    self.timestamp_inicio, self.timestamp_fin, self.metodo, self.estado]
+        if self._cubetas is not None:
+            columnas += [self._cubetas, self._siguiente]
+        total = sum(c.itemsize * len(c) for c in columnas)
+        total += self.ids.nbytes() + self.facturas.nbytes() + self.referencias.nbytes()
+        for catalogo in (self.metodos, self.estados):
+            total += sys.getsizeof(catalogo.codigos) + sum(sys.getsizeof(v) for v in catalogo.valores)
+        return total
+
+    def a_transaccion(self, fila):
+        """Reconstruye el objeto Transaccion de una fila"""
+        transaccion = Transaccion(
+            self.ids[fila],
+            self.monto[fila] / 100,
+            self.metodos.valores[self.metodo[fila]],
+            self.facturas[fila],
+            self.referencias[fila]
+        )
+        transaccion.fecha = datetime.fromtimestamp(self.fecha[fila])
+        transaccion.estado = self.estados.valores[self.estado[fila]]
+        transaccion.conciliado = bool(self.conciliado[fila])
+        if self.fecha_conciliacion[fila] != NULO:
+            transaccion.fecha_conciliacion = datetime.fromtimestamp(self.fecha_conciliacion[fila])
+        inicio, fin = self.timestamp_inicio[fila], self.timestamp_fin[fila]
+        transaccion.timestamp_inicio = None if inicio != inicio else inicio
+        transaccion.timestamp_fin = None if fin != fin else fin
+        return transaccion
+
+    # ------------------------------------------------------------------
+    # Filtros: recorren las columnas y regresan índices de fila, sin crear objetos
+    # ------------------------------------------------------------------
+
+    def filtrar(self, conciliado=None, metodo_pago=None, factura_id=None,
+                monto_minimo=None, monto_maximo=None, desde=None, hasta=None, filas=None):
+        """
+        Índices (array) de las filas que cumplen todos los criterios dados.
+        Montos en centavos; desde/hasta son datetime o epoch. filas acota la
+        búsqueda al resultado de un filtro anterior.
+        """
+        seleccion = range(len(self)) if filas is None else filas
+
+        if conciliado is not None:
+            columna, valor = self.conciliado, 1 if conciliado else 0
+            seleccion = [i for i in seleccion if columna[i] == valor]
+        if metodo_pago is not None:
+            codigo = self.metodos.codigos.get(metodo_pago)
+            columna = self.metodo
+            seleccion = [i for i in seleccion if columna[i] == codigo]
+        if factura_id is not None:
+            seleccion = self.facturas.filas_iguales(factura_id, seleccion)
+        if monto_minimo is not None or monto_maximo is not None:
+            minimo = monto_minimo if monto_minimo is not None else -(1 << 63)
+            maximo = monto_maximo if monto_maximo is not None else (1 << 63) - 1
+            columna = self.monto
+            seleccion = [i for i in seleccion if minimo <= columna[i] <= maximo]
+        if desde is not None or hasta is not None:
+            minimo = _a_epoch(desde) if desde is not None else -(1 << 63)
+            maximo = _a_epoch(hasta) if hasta is not None else (1 << 63) - 1
+            columna = self.fecha
+            seleccion = [i for i in seleccion if minimo <= columna[i] <= maximo]
+
+        return array("l", seleccion)
+
+    def total_centavos(self, filas=None):
+        if filas is None:
+            return sum(self.monto)
+        columna = self.monto
+        return sum(columna[i] for i in filas)
+
+    # ------------------------------------------------------------------
+    # Conciliación en memoria
+    # ------------------------------------------------------------------
+
+    def _indexar(self):
+        capacidad = 1 << max(4, (2 * len(self)).bit_length())
+        mascara = capacidad - 1
+        cubetas = array("q", [NULO]) * capacidad
+        siguiente = array("q", [NULO]) * len(self)
+        for fila, valor in enumerate(self.referencias.hashes):
+            cubeta = valor & mascara
+            siguiente[fila] = cubetas[cubeta]
+            cubetas[cubeta] = fila
+        self._cubetas, self._siguiente, self._mascara = cubetas, siguiente, mascara
+
+    def filas_con_referencia(self, referencia):
+        """Filas con esa referencia bancaria (conciliadas o no)"""
+        if self._cubetas is None:
+            self._indexar()
+        codificada = referencia.encode()
+        valor = crc32(codificada)
+        hashes, siguiente = self.referencias.hashes, self._siguiente
+        candidatas = []
+        fila = self._cubetas[valor & self._mascara]
+        while fila != NULO:
+            if hashes[fila] == valor:
+                candidatas.append(fila)
+            fila = siguiente[fila]
+        # Confirmar el texto solo para las filas con el mismo hash
+        return self.referencias.filas_iguales(referencia, candidatas) if candidatas else []
+
+    def _primera_abierta(self, filas, monto_centavos, tolerancia_centavos):
+        conciliado, monto = self.conciliado, self.monto
+        for fila in filas:
+            if not conciliado[fila] and abs(monto[fila] - monto_centavos) <= tolerancia_centavos:
+                return fila
+        return None
+
+    def buscar(self, referencia, monto_centavos, tolerancia_centavos=0):
+        """Primera fila sin conciliar con esa referencia y monto dentro de la tolerancia, o None"""
+        return self._primera_abierta(self.filas_con_referencia(referencia), monto_centavos, tolerancia_centavos)
+
+    def marcar_conciliada(self, fila, momento=None):
+        momento = momento if momento is not None else datetime.now().timestamp()
+        self.conciliado[fila] = 1
+        self.estado[fila] = self.estados.codigo("CONCILIADA")
+        self.fecha_conciliacion[fila] = int(momento)
+        self.timestamp_fin[fila] = momento
+        self._modificadas.add(fila)
+
+    def conciliar(self, movimientos, tolerancia_centavos=0, al_no_conciliar=None):
+        """
+        Empareja movimientos bancarios contra las filas sin conciliar, solo en memoria.
+        Las filas conciliadas quedan como modificadas para guardar_cambios().
+        """
+        resultado = ResultadoConciliacion()
+        momento = datetime.now().timestamp()
+        for movimiento in movimientos:
+            resultado.leidos += 1
+            if movimiento.monto_centavos is None or movimiento.monto_centavos <= 0:
+                resultado.ignorados += 1
+                continue
+            filas = self.filas_con_referencia(movimiento.referencia)
+            if not filas:
+                resultado.sin_referencia += 1
+                if al_no_conciliar:
+                    al_no_conciliar(movimiento, "sin_referencia")
+                continue
+            fila = self._primera_abierta(filas, movimiento.monto_centavos, tolerancia_centavos)
+            if fila is None:
+                resultado.diferencia_monto += 1
+                if al_no_conciliar:
+                    al_no_conciliar(movimiento, "diferencia_monto")
+                continue
+            self.marcar_conciliada(fila, momento)
+            resultado.conciliados += 1
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------------
+
+    def filas_modificadas(self):
+        return sorted(self._modificadas)
+
+    def transacciones_modificadas(self):
+        """Objetos Transaccion solo de las filas que cambiaron"""
+        return [self.a_transaccion(fila) for fila in self.filas_modificadas()]
+
+    def guardar_cambios(self, tamano_lote=TAMANO_LOTE_CONCILIACION):
+        """
+        Marca en la base las filas conciliadas en memoria con el instante guardado en
+        timestamp_fin (no el de la escritura); regresa cuántas cambiaron.
+        """
+        por_momento = {}
+        for fila in self.filas_modificadas():
+            por_momento.setdefault(self.timestamp_fin[fila], []).append(self.id(fila))
+        # Un conciliar() usa un solo instante: normalmente hay un grupo por llamada
+        cambiadas = sum(marcar_conciliadas(ids, tamano_lote, momento) for momento, ids in por_momento.items())
+        self._modificadas.clear()
+        return cambiadas
@@ -0,0 +1,286 @@
+# archivo.py
+#
+# Archivo en frío de facturas cerradas. Una factura pagada, con todas sus
+# transacciones conciliadas antes del corte, se mueve junto con sus Transaccion,
+# Pago y SaldoFactura a un archivo SQLite por periodo (mes de emisión):
+# archivo/archivo_2025-06.db. La base caliente solo conserva el catálogo
+# FacturaArchivada (id -> periodo) y la bitácora de auditoría, que es de solo inserción.
+#
+# El traslado va en lotes cortos para no retener el candado de escritura. Cada lote
+# son dos transacciones: primero se confirma la copia en el archivo y después se borra
+# de la base caliente. Con WAL, un COMMIT que toca dos archivos adjuntos no es atómico
+# entre ellos; en este orden una caída deja a lo más una copia repetida (se repite sin
+# error), nunca una factura borrada sin copia. Las consultas históricas ATTACHan los
+# archivos del periodo que se pide (abrir_historico) o el de una sola factura (buscar_factura).
+import contextlib
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import quote
+
+import conexion
+from conexion import conectar
+from persistencia import _en_transaccion
+
+# Tablas que se mueven, padres primero: nombre -> columna que apunta a la factura
+TABLAS = {
+    "Factura": "id",
+    "SaldoFactura": "factura_id",
+    "Transaccion": "factura_id",
+    "Pago": "factura_id",
+}
+
+# Facturas por transacción de escritura
+TAMANO_LOTE_ARCHIVO = 500
+
+# Primeros caracteres de fecha_emision que forman el periodo (7 = 'AAAA-MM')
+LONGITUD_PERIODO = 7
+
+ESQUEMA = "archivo"
+
+# Una factura está cerrada si no debe nada y ninguno de sus pagos sigue abierto o es reciente
+SQL_CERRADAS = """
+    SELECT substr(f.fecha_emision, 1, ?), f.id
+    FROM Factura AS f
+    WHERE f.saldo_pendiente = 0
+      AND f.estado IN ('PAGADA', 'CONCILIADA')
+      AND f.fecha_emision < ?
+      AND COALESCE(f.fecha_pago, f.fecha_emision) < ?
+      AND NOT EXISTS (
+          SELECT 1 FROM Transaccion AS t
+          WHERE t.factura_id = f.id
+            AND (t.conciliado = 0 OR t.fecha_conciliacion IS NULL OR t.fecha_conciliacion >= ?)
+      )
+"""
+
+
+def crear_tablas(cursor):
+    cursor.executescript("""
+    -- Tabla FacturaArchivada: en qué archivo quedó cada factura movida a frío
+    CREATE TABLE IF NOT EXISTS FacturaArchivada (
+        id TEXT PRIMARY KEY,
+        periodo TEXT NOT NULL,
+        fecha_archivo TEXT NOT NULL
+    ) WITHOUT ROWID;
+    """)
+
+
+def directorio_archivo():
+    return os.path.join(os.path.dirname(os.path.abspath(conexion.DB_PATH)), "archivo")
+
+
+def ruta_periodo(periodo):
+    return os.path.join(directorio_archivo(), f"archivo_{periodo}.db")
+
+
+def periodos_archivados():
+    """Periodos con archivo en disco, del más antiguo al más reciente"""
+    rutas = glob.glob(os.path.join(directorio_archivo(), "archivo_*.db"))
+    return sorted(os.path.basename(r)[len("archivo_"):-len(".db")] for r in rutas)
+
+
+def _preparar_archivo(conn, periodo):
+
+    #Crea el archivo del periodo (si no existe) con las mismas tablas e índices que la base caliente.
+    #Los triggers no se copian: el archivo nunca se actualiza.
+
+    os.makedirs(directorio_archivo(), exist_ok=True)
+    ruta = ruta_periodo(periodo)
+    nuevo = not os.path.exists(ruta)
+    archivo = sqlite3.connect(ruta)
+    try:
+        if nuevo:
+            archivo.execute("PRAGMA journal_mode=WAL")
+        for sql, in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name IN (%s) AND sql IS NOT NULL "
+            "AND type IN ('table', 'index') ORDER BY type DESC" % ", ".join("?" * len(TABLAS)),
+            tuple(TABLAS)
+        ):
+            sql = re.sub(r"^CREATE\s+(UNIQUE\s+)?(TABLE|INDEX)\s+(IF\s+NOT\s+EXISTS\s+)?",
+                         lambda m: f"CREATE {m.group(1) or ''}{m.group(2)} IF NOT EXISTS ", sql, flags=re.I)
+            archivo.execute(sql)
+        archivo.commit()
+    finally:
+        archivo.close()
+    return ruta
+
+
+def _columnas(conn, esquema, tabla):
+    return [fila[1] for fila in conn.execute(f"PRAGMA {esquema}.table_info({tabla})")]
+
+
+def _siguen_cerradas(conn, ids, corte, condicion=""):
+    # Vuelve a revisar las facturas dentro de la transacción: pudieron cambiar desde que se listaron
+    return [fila[1] for fila in conn.execute(
+        f"SELECT * FROM ({SQL_CERRADAS}) WHERE id IN (SELECT value FROM json_each(?)) {condicion}",
+        (LONGITUD_PERIODO, corte, corte, corte, json.dumps(ids))
+    )]
+
+
+def _copiar_lote(conn, ids, corte):
+
+    #Primera transacción del lote: copia al archivo adjunto las facturas que siguen cerradas,
+    #sin tocar la base caliente. Regresa los ids copiados.
+
+    ids = _siguen_cerradas(conn, ids, corte)
+    if not ids:
+        return ids
+    lista = json.dumps(ids)
+    for tabla, columna in TABLAS.items():
+        columnas = ", ".join(_columnas(conn, ESQUEMA, tabla))
+        # OR REPLACE: si un lote anterior se copió pero no se borró de la base caliente, se repite sin error
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {ESQUEMA}.{tabla} ({columnas})
+            SELECT {columnas} FROM main.{tabla} WHERE {columna} IN (SELECT value FROM json_each(?))
+        """, (lista,))
+    return ids
+
+
+def _quitar_lote(conn, periodo, ids, corte):
+
+    #Segunda transacción del lote: solo escribe en la base caliente. Borra las facturas que
+    #siguen cerradas y cuya copia ya está confirmada en el archivo; regresa cuántas se movieron.
+
+    ids = _siguen_cerradas(conn, ids, corte, f"AND id IN (SELECT id FROM {ESQUEMA}.Factura)")
+    if not ids:
+        return 0
+    lista = json.dumps(ids)
+
+    fecha = time.strftime("%Y-%m-%dT%H:%M:%S")
+    conn.executemany(
+        "INSERT OR REPLACE INTO FacturaArchivada (id, periodo, fecha_archivo) VALUES (?, ?, ?)",
+        [(id_factura, periodo, fecha) for id_factura in ids]
+    )
+    # Hijos primero; el catálogo ya tiene las facturas, así la bitácora no las registra como eliminadas
+    for tabla, columna in reversed(list(TABLAS.items())):
+        conn.execute(f"DELETE FROM main.{tabla} WHERE {columna} IN (SELECT value FROM json_each(?))", (lista,))
+    return len(ids)
+
+
+def archivar(antes_de, tamano_lote=TAMANO_LOTE_ARCHIVO, pausa=0.0, max_intentos=None, progreso=None):
+    """
+    Mueve a los archivos por periodo las facturas cerradas antes de la fecha antes_de
+    (texto ISO 'AAAA-MM-DD' o date). Cada lote es una transacción corta; pausa (segundos)
+    deja pasar a las cajas entre lotes. Regresa {periodo: facturas movidas}.
+    """
+    corte = antes_de if isinstance(antes_de, str) else antes_de.isoformat()
+    conn = conectar()
+
+    candidatas = {}
+    for periodo, id_factura in conn.execute(SQL_CERRADAS, (LONGITUD_PERIODO, corte, corte, corte)):
+        candidatas.setdefault(periodo, []).append(id_factura)
+
+    movidas = {}
+    for periodo, ids in sorted(candidatas.items()):
+        ruta = _preparar_archivo(conn, periodo)
+        # ATTACH no se permite dentro de una transacción
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute(f"ATTACH DATABASE ? AS {ESQUEMA}", (ruta,))
+        try:
+            movidas[periodo] = 0
+            for inicio in range(0, len(ids), tamano_lote):
+                lote = ids[inicio:inicio + tamano_lote]
+                copiadas = _en_transaccion(lambda c: _copiar_lote(c, lote, corte), max_intentos)
+                if copiadas:
+                    movidas[periodo] += _en_transaccion(
+                        lambda c: _quitar_lote(c, periodo, copiadas, corte), max_intentos
+                    )
+                if progreso:
+                    progreso(periodo, movidas[periodo], len(ids))
+                if pausa:
+                    time.sleep(pausa)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute(f"DETACH DATABASE {ESQUEMA}")
+    return movidas
+
+
+# ---------------------------------------------------------------------------
+# Consultas históricas
+# ---------------------------------------------------------------------------
+
+def _adjuntar(conn, periodos):
+    esquemas = []
+    for i, periodo in enumerate(periodos):
+        esquema = f"archivo_{i}"
+        conn.execute(f"ATTACH DATABASE ? AS {esquema}", (f"file:{quote(ruta_periodo(periodo))}?mode=ro",))
+        esquemas.append(esquema)
+    return esquemas
+
+
+def _copiar_a_temporales(conn, periodos, limite):
+    # Más periodos de los que SQLite adjunta a la vez (SQLITE_LIMIT_ATTACHED, 10 por omisión):
+    # se adjuntan por tandas y sus filas se copian a tablas temporales {tabla}_archivada
+    for tabla in TABLAS:
+        columnas = ", ".join(_columnas(conn, "main", tabla))
+        conn.execute(f"CREATE TEMP TABLE {tabla}_archivada AS SELECT {columnas} FROM main.{tabla} WHERE 0")
+    for inicio in range(0, len(periodos), limite):
+        esquemas = _adjuntar(conn, periodos[inicio:inicio + limite])
+        for tabla in TABLAS:
+            columnas = ", ".join(_columnas(conn, "main", tabla))
+            for esquema in esquemas:
+                conn.execute(f"INSERT INTO temp.{tabla}_archivada SELECT {columnas} FROM {esquema}.{tabla}")
+        # DETACH no se permite dentro de una transacción
+        conn.commit()
+        for esquema in esquemas:
+            conn.execute(f"DETACH DATABASE {esquema}")
+
+
+@contextlib.contextmanager
+def abrir_historico(desde=None, hasta=None):
+    """
+    Conexión de solo consulta con los archivos de los periodos [desde, hasta] adjuntos
+    ('AAAA-MM'; sin límites, todos). Además de las tablas normales (solo datos calientes)
+    tiene vistas temporales Factura_historica, Transaccion_historica, etc. que unen la base
+    caliente con los archivos. Si hay más periodos de los que SQLite puede adjuntar, los
+    archivos se copian por tandas a tablas temporales (más lento, pero sin límite de rango).
+
+        with abrir_historico("2024-01", "2024-06") as conn:
+            conn.execute("SELECT SUM(monto) FROM Transaccion_historica WHERE metodo_pago = ?", ("TARJETA",))
+    """
+    periodos = [p for p in periodos_archivados()
+                if (desde is None or p >= desde) and (hasta is None or p <= hasta)]
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(conexion.DB_PATH))}?mode=ro", uri=True)
+    try:
+        limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(periodos) <= limite:
+            fuentes = [f"{esquema}.{{tabla}}" for esquema in _adjuntar(conn, periodos)]
+        else:
+            _copiar_a_temporales(conn, periodos, limite)
+            fuentes = ["temp.{tabla}_archivada"]
+
+        for tabla in TABLAS:
+            columnas = ", ".join(_columnas(conn, "main", tabla))
+            partes = [f"SELECT {columnas} FROM main.{tabla}"]
+            partes += [f"SELECT {columnas} FROM {fuente.format(tabla=tabla)}" for fuente in fuentes]
+            conn.execute(f"CREATE TEMP VIEW {tabla}_historica AS {' UNION ALL '.join(partes)}")
+        yield conn
+    finally:
+        conn.close()
+
+
+def buscar_factura(id_factura):
+    """
+    Factura y sus transacciones, esté en la base caliente o archivada (solo adjunta el
+    archivo del periodo de esa factura). Regresa (fila de Factura, filas de Transaccion) o None.
+    """
+    conn = conectar()
+    fila = conn.execute("SELECT periodo FROM FacturaArchivada WHERE id = ?", (id_factura,)).fetchone()
+    if fila is None:
+        factura = conn.execute("SELECT * FROM Factura WHERE id = ?", (id_factura,)).fetchone()
+        if factura is None:
+            return None
+        return factura, conn.execute("SELECT * FROM Transaccion WHERE factura_id = ?", (id_factura,)).fetchall()
+
+    with abrir_historico(fila[0], fila[0]) as historico:
+        factura = historico.execute("SELECT * FROM Factura_historica WHERE id = ?", (id_factura,)).fetchone()
+        if factura is None:
+            return None
+        return factura, historico.execute(
+            "SELECT * FROM Transaccion_historica WHERE factura_id = ?", (id_factura,)
+        ).fetchall()
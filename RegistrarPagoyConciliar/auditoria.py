@@ -0,0 +1,222 @@
+# auditoria.py
+#
+# Bitácora de solo inserción con los cambios de cada Factura (estado, saldo, pago).
+# La escriben triggers sobre Factura, así queda en la misma transacción que el
+# cambio sin importar quién lo haga (guardar_factura, registrar_pago, SQL directo).
+#
+# Cada evento guarda solo las columnas que cambiaron. Cada SNAPSHOT_CADA eventos de
+# una factura se guarda una foto completa de la fila, de modo que reconstruir el
+# estado en cualquier momento lee una foto y como mucho SNAPSHOT_CADA eventos.
+import json
+from datetime import datetime
+
+from conexion import conectar
+from persistencia import _en_transaccion
+
+# Eventos de una factura entre una foto y la siguiente
+SNAPSHOT_CADA = 20
+
+# Columnas de Factura que se auditan
+COLUMNAS = ("total", "saldo_pendiente", "estado", "fecha_pago", "comprobante_pago")
+
+TRIGGERS = (
+    "trg_evento_factura_insert",
+    "trg_evento_factura_update",
+    "trg_evento_factura_delete",
+    "trg_evento_factura_snapshot",
+    "trg_evento_factura_sin_update",
+    "trg_evento_factura_sin_delete",
+)
+
+# Foto de cada factura que tiene eventos posteriores a su última foto
+SQL_TOMAR_SNAPSHOTS = """
+    INSERT INTO SnapshotFactura
+    SELECT f.id, e.id, e.fecha, f.total, f.saldo_pendiente, f.estado, f.fecha_pago, f.comprobante_pago
+    FROM Factura AS f
+    JOIN EventoFactura AS e ON e.id = (
+        SELECT MAX(id) FROM EventoFactura WHERE factura_id = f.id
+    )
+    WHERE e.id > COALESCE((SELECT MAX(evento_id) FROM SnapshotFactura WHERE factura_id = f.id), 0)
+"""
+
+# Marca de tiempo con milisegundos, comparable como texto con datetime.isoformat()
+_AHORA = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+
+def _cambios(con_anterior):
+    # JSON con las columnas cuyo valor cambió (todas si no hay fila anterior)
+    partes = []
+    for columna in COLUMNAS:
+        condicion = f"WHERE OLD.{columna} IS NOT NEW.{columna}" if con_anterior else ""
+        partes.append(f"SELECT '{columna}' AS columna, NEW.{columna} AS valor {condicion}")
+    return f"(SELECT json_group_object(columna, valor) FROM ({' UNION ALL '.join(partes)}))"
+
+
+def crear_tablas(cursor):
+
+    #Crea EventoFactura, SnapshotFactura y sus triggers.
+    #EventoFactura no admite UPDATE ni DELETE: cualquier intento aborta la transacción.
+    #Los triggers se borran y se vuelven a crear en cada llamada, así una base existente
+    #recibe la versión actual de su cuerpo; todo va en una transacción para que la
+    #bitácora nunca quede sin protección.
+
+    hubo_cambio = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in COLUMNAS)
+    cursor.executescript(f"""
+    -- Tabla EventoFactura: un renglón por alta, cambio o baja de una factura
+    CREATE TABLE IF NOT EXISTS EventoFactura (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        factura_id TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        tipo TEXT NOT NULL CHECK (tipo IN ('CREADA', 'ACTUALIZADA', 'ELIMINADA')),
+        estado_anterior TEXT,
+        estado_nuevo TEXT,
+        cambios TEXT NOT NULL
+    );
+
+    -- Historial de una factura en orden
+    CREATE INDEX IF NOT EXISTS idx_evento_factura ON EventoFactura(factura_id, id);
+
+    -- Tabla SnapshotFactura: la fila completa de Factura después del evento evento_id
+    CREATE TABLE IF NOT EXISTS SnapshotFactura (
+        factura_id TEXT NOT NULL,
+        evento_id INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        total REAL,
+        saldo_pendiente REAL,
+        estado TEXT,
+        fecha_pago TEXT,
+        comprobante_pago TEXT,
+        PRIMARY KEY (factura_id, evento_id)
+    ) WITHOUT ROWID;
+
+    BEGIN;
+
+    DROP TRIGGER IF EXISTS trg_evento_factura_insert;
+    CREATE TRIGGER trg_evento_factura_insert
+    AFTER INSERT ON Factura
+    BEGIN
+        INSERT INTO EventoFactura (factura_id, fecha, tipo, estado_anterior, estado_nuevo, cambios)
+        VALUES (NEW.id, {_AHORA}, 'CREADA', NULL, NEW.estado, {_cambios(False)});
+    END;
+
+    DROP TRIGGER IF EXISTS trg_evento_factura_update;
+    CREATE TRIGGER trg_evento_factura_update
+    AFTER UPDATE ON Factura
+    WHEN {hubo_cambio}
+    BEGIN
+        INSERT INTO EventoFactura (factura_id, fecha, tipo, estado_anterior, estado_nuevo, cambios)
+        VALUES (NEW.id, {_AHORA}, 'ACTUALIZADA', OLD.estado, NEW.estado, {_cambios(True)});
+    END;
+
+    -- Las facturas que se mueven al archivo en frío (archivo.py) no cuentan como eliminadas
+    DROP TRIGGER IF EXISTS trg_evento_factura_delete;
+    CREATE TRIGGER trg_evento_factura_delete
+    AFTER DELETE ON Factura
+    WHEN NOT EXISTS (SELECT 1 FROM FacturaArchivada WHERE id = OLD.id)
+    BEGIN
+        INSERT INTO EventoFactura (factura_id, fecha, tipo, estado_anterior, estado_nuevo, cambios)
+        VALUES (OLD.id, {_AHORA}, 'ELIMINADA', OLD.estado, NULL, '{{}}');
+    END;
+
+    -- Foto de la fila cada {SNAPSHOT_CADA} eventos de la misma factura (la fila ya tiene el cambio)
+    DROP TRIGGER IF EXISTS trg_evento_factura_snapshot;
+    CREATE TRIGGER trg_evento_factura_snapshot
+    AFTER INSERT ON EventoFactura
+    WHEN NEW.tipo <> 'ELIMINADA' AND (
+        SELECT COUNT(*) FROM EventoFactura
+        WHERE factura_id = NEW.factura_id
+          AND id > COALESCE((SELECT MAX(evento_id) FROM SnapshotFactura WHERE factura_id = NEW.factura_id), 0)
+    ) >= {SNAPSHOT_CADA}
+    BEGIN
+        INSERT INTO SnapshotFactura
+        SELECT id, NEW.id, NEW.fecha, total, saldo_pendiente, estado, fecha_pago, comprobante_pago
+        FROM Factura WHERE id = NEW.factura_id;
+    END;
+
+    DROP TRIGGER IF EXISTS trg_evento_factura_sin_update;
+    CREATE TRIGGER trg_evento_factura_sin_update
+    BEFORE UPDATE ON EventoFactura
+    BEGIN
+        SELECT RAISE(ABORT, 'EventoFactura es de solo inserción');
+    END;
+
+    DROP TRIGGER IF EXISTS trg_evento_factura_sin_delete;
+    CREATE TRIGGER trg_evento_factura_sin_delete
+    BEFORE DELETE ON EventoFactura
+    BEGIN
+        SELECT RAISE(ABORT, 'EventoFactura es de solo inserción');
+    END;
+
+    COMMIT;
+    """)
+
+    # Facturas que ya existían antes de la bitácora: su alta queda con la fecha de emisión
+    cursor.execute(f"""
+        INSERT INTO EventoFactura (factura_id, fecha, tipo, estado_anterior, estado_nuevo, cambios)
+        SELECT id, fecha_emision, 'CREADA', NULL, estado,
+               json_object({', '.join(f"'{c}', {c}" for c in COLUMNAS)})
+        FROM Factura AS f
+        WHERE NOT EXISTS (SELECT 1 FROM EventoFactura AS e WHERE e.factura_id = f.id)
+    """)
+
+
+def tomar_snapshots(max_intentos=None):
+
+    #Foto de todas las facturas con eventos posteriores a su última foto (p. ej. en el cierre
+    #de mes). Los triggers ya las toman cada SNAPSHOT_CADA eventos; esto acorta aún más la cola.
+    #Regresa cuántas fotos se guardaron.
+
+    return _en_transaccion(lambda conn: conn.execute(SQL_TOMAR_SNAPSHOTS).rowcount, max_intentos)
+
+
+def _momento(momento):
+    if momento is None:
+        return datetime.now().isoformat(timespec="milliseconds")
+    if isinstance(momento, datetime):
+        return momento.isoformat(timespec="milliseconds")
+    return momento
+
+
+def estado_en(factura_id, momento=None, conn=None):
+    """
+    Estado de la factura en un momento pasado (datetime o texto ISO), como diccionario con
+    COLUMNAS más 'evento_id'. None si la factura no existía o ya se había eliminado.
+    """
+    conn = conn or conectar()
+    momento = _momento(momento)
+
+    foto = conn.execute(f"""
+        SELECT evento_id, {', '.join(COLUMNAS)} FROM SnapshotFactura
+        WHERE factura_id = ? AND fecha <= ?
+        ORDER BY evento_id DESC LIMIT 1
+    """, (factura_id, momento)).fetchone()
+    estado = None
+    desde = 0
+    if foto is not None:
+        desde = foto[0]
+        estado = dict(zip(COLUMNAS, foto[1:]), evento_id=desde)
+
+    # Solo la cola de eventos posteriores a la foto
+    for evento_id, tipo, cambios in conn.execute("""
+        SELECT id, tipo, cambios FROM EventoFactura
+        WHERE factura_id = ? AND id > ? AND fecha <= ?
+        ORDER BY id
+    """, (factura_id, desde, momento)):
+        if tipo == "ELIMINADA":
+            estado = None
+            continue
+        if tipo == "CREADA" or estado is None:
+            estado = dict.fromkeys(COLUMNAS)
+        estado.update(json.loads(cambios))
+        estado["evento_id"] = evento_id
+    return estado
+
+
+def historial(factura_id, conn=None):
+    """Transiciones de estado de una factura: lista de (fecha, tipo, estado_anterior, estado_nuevo)"""
+    conn = conn or conectar()
+    return conn.execute("""
+        SELECT fecha, tipo, estado_anterior, estado_nuevo FROM EventoFactura
+        WHERE factura_id = ? AND (tipo <> 'ACTUALIZADA' OR estado_anterior IS NOT estado_nuevo)
+        ORDER BY id
+    """, (factura_id,)).fetchall()
@@ -0,0 +1,348 @@
+# benchmark.py
+#
+# Mide el rendimiento de la capa de persistencia y de la conciliación sobre una
+# base temporal (nunca toca Base_datos.db) y emite los resultados en JSON.
+#
+#   python benchmark.py --salida hoy.json
+#   python benchmark.py --comparar ayer.json      # sale con código 1 si hubo regresión
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import conexion
+from conciliacion import MovimientoBancario, conciliar_movimientos
+from identificadores import nuevo_id, nuevo_id_binario
+from init_db import crear_base_datos
+from modelo import Factura, Transaccion
+from persistencia import guardar_factura, guardar_transaccion, guardar_transacciones
+
+PERCENTILES = (50, 90, 95, 99)
+METODOS_PAGO = ("EFECTIVO", "TARJETA", "TRANSFERENCIA")
+# Generadores de llave que se comparan al insertar pedidos
+GENERADORES_ID = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "uuid7": nuevo_id,
+    "uuid7_binario": nuevo_id_binario,
+}
+# Una regresión es una caída de throughput mayor a este porcentaje contra la corrida base
+TOLERANCIA_REGRESION = 10.0
+
+
+def _log(mensaje):
+    print(mensaje, file=sys.stderr, flush=True)
+
+
+def percentiles(valores):
+    """p50/p90/p95/p99 por rango más cercano, más mínimo, máximo y media"""
+    if not valores:
+        return {}
+    ordenados = sorted(valores)
+    n = len(ordenados)
+    resumen = {f"p{p}": ordenados[min(n - 1, max(0, -(-p * n // 100) - 1))] for p in PERCENTILES}
+    resumen["min"] = ordenados[0]
+    resumen["max"] = ordenados[-1]
+    resumen["media"] = sum(ordenados) / n
+    return resumen
+
+
+@contextlib.contextmanager
+def base_temporal(perfil):
+    """Crea una base vacía en un directorio temporal y apunta conexion.py hacia ella"""
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    ruta = os.path.join(directorio, "benchmark.db")
+    ruta_anterior, perfil_anterior = conexion.DB_PATH, conexion.PERFIL_ACTUAL
+    with contextlib.redirect_stdout(sys.stderr):
+        crear_base_datos(ruta)
+    conexion.configurar(ruta=ruta, perfil=perfil)
+    try:
+        yield ruta
+    finally:
+        conexion.cerrar_conexion()
+        conexion.configurar(ruta=ruta_anterior, perfil=perfil_anterior)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _con_escritores(escritores, operaciones, trabajo):
+
+    #Reparte operaciones entre varios hilos; cada uno llama trabajo(hilo, i) y mide
+    #la latencia de cada llamada. Regresa (segundos totales, latencias en ms, errores).
+
+    latencias = [[] for _ in range(escritores)]
+    errores = [0] * escritores
+    barrera = threading.Barrier(escritores + 1)
+
+    def ejecutar(hilo):
+        medidas = latencias[hilo]
+        barrera.wait()
+        try:
+            for i in range(hilo, operaciones, escritores):
+                inicio = time.perf_counter()
+                try:
+                    trabajo(hilo, i)
+                except sqlite3.Error:
+                    errores[hilo] += 1
+                    continue
+                medidas.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            conexion.cerrar_conexion()
+
+    hilos = [threading.Thread(target=ejecutar, args=(h,)) for h in range(escritores)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    return segundos, [m for medidas in latencias for m in medidas], sum(errores)
+
+
+def _resultado(operaciones, segundos, latencias, errores):
+    return {
+        "operaciones": operaciones,
+        "segundos": round(segundos, 4),
+        "por_segundo": round((operaciones - errores) / segundos, 1) if segundos else None,
+        "errores": errores,
+        "latencia_ms": {k: round(v, 3) for k, v in percentiles(latencias).items()},
+    }
+
+
+def medir_facturas(escritores, operaciones, perfil):
+    with base_temporal(perfil):
+        def trabajo(hilo, i):
+            guardar_factura(Factura.nueva(f"PED-{i:08d}", 100 + i % 5000, f"CLI-{i % 1000:04d}"))
+
+        return _resultado(operaciones, *_con_escritores(escritores, operaciones, trabajo))
+
+
+def medir_transacciones(escritores, operaciones, perfil):
+    with base_temporal(perfil):
+        # Los pagos apuntan a un conjunto fijo de facturas ya creadas
+        facturas = [Factura.nueva(f"PED-{i:08d}", 1000000, "CLI-0000") for i in range(100)]
+        for factura in facturas:
+            guardar_factura(factura)
+
+        def trabajo(hilo, i):
+            guardar_transaccion(Transaccion.nueva(
+                10 + i % 900, METODOS_PAGO[i % len(METODOS_PAGO)], facturas[i % 100].id, f"REF-{i:08d}"
+            ))
+
+        return _resultado(operaciones, *_con_escritores(escritores, operaciones, trabajo))
+
+
+def medir_conciliacion(transacciones, repeticiones, perfil, semilla):
+
+    #Concilia un estado de cuenta contra transacciones pendientes. Cada repetición usa
+    #una base nueva; el 90% de las líneas coincide, el resto no tiene referencia o difiere en monto.
+
+    aleatorio = random.Random(semilla)
+    montos = [aleatorio.randint(100, 500000) for _ in range(transacciones)]
+    movimientos = []
+    for i, monto in enumerate(montos):
+        caso = aleatorio.random()
+        if caso < 0.90:
+            movimientos.append(MovimientoBancario(f"REF-{i:08d}", monto))
+        elif caso < 0.95:
+            movimientos.append(MovimientoBancario(f"SIN-{i:08d}", monto))
+        else:
+            movimientos.append(MovimientoBancario(f"REF-{i:08d}", monto + 1))
+    aleatorio.shuffle(movimientos)
+
+    duraciones = []
+    lineas_por_segundo = []
+    resultado = None
+    for _ in range(repeticiones):
+        with base_temporal(perfil):
+            factura = Factura.nueva("PED-00000000", 1000000, "CLI-0000")
+            guardar_factura(factura)
+            guardar_transacciones(
+                Transaccion.nueva(monto / 100, METODOS_PAGO[i % len(METODOS_PAGO)], factura.id, f"REF-{i:08d}")
+                for i, monto in enumerate(montos)
+            )
+            inicio = time.perf_counter()
+            resultado = conciliar_movimientos(movimientos)
+            segundos = time.perf_counter() - inicio
+        duraciones.append(segundos)
+        lineas_por_segundo.append(len(movimientos) / segundos)
+
+    return {
+        "lineas": len(movimientos),
+        "repeticiones": repeticiones,
+        "conciliados": resultado.conciliados,
+        "sin_referencia": resultado.sin_referencia,
+        "diferencia_monto": resultado.diferencia_monto,
+        "segundos": {k: round(v, 4) for k, v in percentiles(duraciones).items()},
+        "por_segundo": {k: round(v, 1) for k, v in percentiles(lineas_por_segundo).items()},
+    }
+
+
+def medir_identificadores(pedidos, perfil, lote=1000):
+
+    #Inserta pedidos, con dos partidas cada uno, usando cada generador de GENERADORES_ID en
+    #una base nueva. Mide pedidos por segundo y el tamaño de Pedido y de los índices que
+    #llevan la llave (dbstat), con el porcentaje de llenado de sus páginas.
+
+    resultados = {}
+    for nombre, generar in GENERADORES_ID.items():
+        with base_temporal(perfil):
+            conn = conexion.conectar()
+            inicio = time.perf_counter()
+            for desde in range(0, pedidos, lote):
+                ids = [generar() for _ in range(desde, min(desde + lote, pedidos))]
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO Pedido (id, cliente_id, fecha, estado) VALUES (?, 'CLI-0000', date('now'), 'PENDIENTE')",
+                    ((id_pedido,) for id_pedido in ids)
+                )
+                conn.executemany(
+                    "INSERT INTO Pedido_Producto (pedido_id, producto_id, cantidad) VALUES (?, ?, 1)",
+                    ((id_pedido, producto) for id_pedido in ids for producto in ("PROD-001", "PROD-002"))
+                )
+                conn.commit()
+            segundos = time.perf_counter() - inicio
+
+            tamanos = {}
+            for tabla, paginas, bytes_usados, bytes_pagina in conn.execute("""
+                SELECT d.name, COUNT(*), SUM(d.pgsize - d.unused), SUM(d.pgsize)
+                FROM dbstat AS d
+                JOIN sqlite_master AS m ON m.name = d.name
+                WHERE m.tbl_name IN ('Pedido', 'Pedido_Producto')
+                GROUP BY d.name
+            """):
+                tamanos[tabla] = {
+                    "paginas": paginas,
+                    "kib": round(bytes_pagina / 1024, 1),
+                    "llenado_pct": round(bytes_usados / bytes_pagina * 100, 1),
+                }
+        resultados[nombre] = {
+            "pedidos": pedidos,
+            "segundos": round(segundos, 4),
+            "por_segundo": round(pedidos / segundos, 1) if segundos else None,
+            "tamanos": tamanos,
+        }
+    return resultados
+
+
+def ejecutar(escritores=(1, 4, 16), operaciones=2000, transacciones_conciliacion=100000,
+             repeticiones=3, perfil="normal", semilla=42, pedidos_ids=100000):
+    """Corre todas las mediciones y regresa un diccionario listo para json.dump"""
+    reporte = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entorno": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {
+            "escritores": list(escritores),
+            "operaciones": operaciones,
+            "transacciones_conciliacion": transacciones_conciliacion,
+            "repeticiones": repeticiones,
+            "pedidos_ids": pedidos_ids,
+            "perfil": perfil,
+            "semilla": semilla,
+        },
+        "facturas": {},
+        "transacciones": {},
+    }
+    for n in escritores:
+        _log(f"guardar_factura con {n} escritor(es)...")
+        reporte["facturas"][str(n)] = medir_facturas(n, operaciones, perfil)
+        _log(f"guardar_transaccion con {n} escritor(es)...")
+        reporte["transacciones"][str(n)] = medir_transacciones(n, operaciones, perfil)
+    _log("Conciliación...")
+    reporte["conciliacion"] = medir_conciliacion(transacciones_conciliacion, repeticiones, perfil, semilla)
+    if pedidos_ids:
+        _log("Llaves uuid4 contra uuid7...")
+        reporte["identificadores"] = medir_identificadores(pedidos_ids, perfil)
+    return reporte
+
+
+def _metricas(reporte):
+    # Throughput de cada escenario: es lo que se compara entre corridas
+    metricas = {}
+    for seccion in ("facturas", "transacciones"):
+        for escritores, datos in reporte.get(seccion, {}).items():
+            metricas[f"{seccion}[{escritores}]"] = datos["por_segundo"]
+    if "conciliacion" in reporte:
+        metricas["conciliacion"] = reporte["conciliacion"]["por_segundo"]["p50"]
+    for generador, datos in reporte.get("identificadores", {}).items():
+        metricas[f"identificadores[{generador}]"] = datos["por_segundo"]
+    return metricas
+
+
+def comparar(base, actual, tolerancia=TOLERANCIA_REGRESION):
+    """Lista de (métrica, antes, después, cambio %) que cayeron más de la tolerancia"""
+    anteriores = _metricas(base)
+    regresiones = []
+    for nombre, valor in _metricas(actual).items():
+        antes = anteriores.get(nombre)
+        if not antes or valor is None:
+            continue
+        cambio = (valor - antes) / antes * 100
+        if cambio < -tolerancia:
+            regresiones.append((nombre, antes, valor, round(cambio, 1)))
+    return regresiones
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark de guardado y conciliación sobre una base temporal")
+    parser.add_argument("--escritores", default="1,4,16", help="Hilos escritores separados por coma")
+    parser.add_argument("--operaciones", type=int, default=2000, help="Guardados por escenario")
+    parser.add_argument("--conciliacion", type=int, default=100000, help="Líneas del estado de cuenta")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones de la conciliación")
+    parser.add_argument("--pedidos-ids", type=int, default=100000,
+                        help="Pedidos insertados con cada generador de llave (0 = no medir)")
+    parser.add_argument("--perfil", default="normal", choices=sorted(conexion.PERFILES))
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Archivo JSON (por defecto, la salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESION,
+                        help="Caída máxima de throughput permitida, en porcentaje")
+    args = parser.parse_args(argumentos)
+
+    reporte = ejecutar(
+        escritores=[int(n) for n in args.escritores.split(",") if n.strip()],
+        operaciones=args.operaciones,
+        transacciones_conciliacion=args.conciliacion,
+        repeticiones=args.repeticiones,
+        perfil=args.perfil,
+        semilla=args.semilla,
+        pedidos_ids=args.pedidos_ids,
+    )
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            regresiones = comparar(json.load(archivo), reporte, args.tolerancia)
+        reporte["regresiones"] = [
+            {"metrica": m, "antes": a, "despues": d, "cambio_pct": c} for m, a, d, c in regresiones
+        ]
+
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+
+    if reporte.get("regresiones"):
+        for regresion in reporte["regresiones"]:
+            _log(f"REGRESIÓN {regresion['metrica']}: {regresion['antes']} -> {regresion['despues']} "
+                 f"({regresion['cambio_pct']}%)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+# conciliacion.py
+import csv
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from functools import lru_cache
+
+from conexion import conectar
+from modelo import a_centavos
+from persistencia import _guardar_en_lotes
+
+# Transacciones que se marcan como conciliadas por cada COMMIT
+TAMANO_LOTE_CONCILIACION = 5000
+
+SQL_MARCAR_CONCILIADA = """
+    UPDATE Transaccion SET
+        estado = 'CONCILIADA',
+        conciliado = 1,
+        fecha_conciliacion = ?,
+        timestamp_fin = ?
+    WHERE id = ? AND conciliado = 0
+"""
+
+# Misma actualización para un lote de ids (arreglo JSON) en una sola sentencia. Con el trigger
+# del histograma, cada UPDATE dentro de un SAVEPOINT abre su propio journal de sentencia;
+# una sentencia por lote en lugar de una por fila lo evita.
+SQL_MARCAR_CONCILIADAS = """
+    UPDATE Transaccion SET
+        estado = 'CONCILIADA',
+        conciliado = 1,
+        fecha_conciliacion = ?,
+        timestamp_fin = ?
+    WHERE id IN (SELECT value FROM json_each(?)) AND conciliado = 0
+"""
+
+
+class MovimientoBancario:
+    """Una línea del estado de cuenta del banco"""
+    __slots__ = ("referencia", "monto_centavos", "fecha", "descripcion", "linea")
+
+    def __init__(self, referencia, monto_centavos, fecha=None, descripcion=None, linea=None):
+        self.referencia = referencia
+        self.monto_centavos = monto_centavos
+        self.fecha = fecha
+        self.descripcion = descripcion
+        self.linea = linea
+
+    @property
+    def monto(self):
+        return self.monto_centavos / 100
+
+    def __repr__(self):
+        return f"MovimientoBancario({self.referencia!r}, {self.monto:.2f}, {self.fecha})"
+
+
+class ResultadoConciliacion:
+    def __init__(self):
+        self.leidos = 0
+        self.conciliados = 0
+        self.sin_referencia = 0      # La referencia no está entre las transacciones pendientes
+        self.diferencia_monto = 0    # La referencia existe pero el monto no coincide
+        self.ignorados = 0           # Cargos (montos negativos) y líneas sin monto
+
+    def __repr__(self):
+        return (f"ResultadoConciliacion(leidos={self.leidos}, conciliados={self.conciliados}, "
+                f"sin_referencia={self.sin_referencia}, diferencia_monto={self.diferencia_monto}, "
+                f"ignorados={self.ignorados})")
+
+
+@lru_cache(maxsize=4096)
+def _a_fecha(texto):
+    # Un estado de cuenta repite pocas fechas distintas: la caché evita volver a interpretarlas
+    if not texto:
+        return None
+    texto = texto.strip()
+    try:
+        if len(texto) >= 10 and texto[4] == "-":
+            return date.fromisoformat(texto[:10])
+        if len(texto) >= 8 and texto[:8].isdigit():
+            return date(int(texto[:4]), int(texto[4:6]), int(texto[6:8]))
+        if len(texto) >= 10 and texto[2] == "/" and texto[5] == "/":
+            return date(int(texto[6:10]), int(texto[3:5]), int(texto[:2]))
+    except ValueError:
+        pass
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Lectores de estados de cuenta. Todos son generadores: leen línea por línea
+# para que la memoria no dependa del tamaño del archivo.
+# ---------------------------------------------------------------------------
+
+# Nombres de columna aceptados en los CSV (en minúsculas)
+COLUMNAS_CSV = {
+    "referencia": ("referencia", "referencia_bancaria", "reference", "ref"),
+    "monto": ("monto", "importe", "amount", "abono"),
+    "fecha": ("fecha", "date", "fecha_operacion"),
+    "descripcion": ("descripcion", "concepto", "description"),
+}
+
+
+def posiciones_csv(encabezado, ruta=""):
+    """Posición de cada campo de COLUMNAS_CSV en el encabezado (lista de nombres de columna)"""
+    encabezado = [c.strip().lower() for c in encabezado]
+    posiciones = {}
+    for campo, alias in COLUMNAS_CSV.items():
+        for nombre in alias:
+            if nombre in encabezado:
+                posiciones[campo] = encabezado.index(nombre)
+                break
+    if "referencia" not in posiciones or "monto" not in posiciones:
+        raise ValueError(f"El CSV {ruta} debe tener columnas de referencia y monto")
+    return posiciones
+
+
+def leer_csv(ruta, delimitador=","):
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        lector = csv.reader(archivo, delimiter=delimitador)
+        posiciones = posiciones_csv(next(lector, []), ruta)
+
+        pos_referencia = posiciones["referencia"]
+        pos_monto = posiciones["monto"]
+        pos_fecha = posiciones.get("fecha")
+        pos_descripcion = posiciones.get("descripcion")
+        minimo = max(posiciones.values()) + 1
+
+        for numero, fila in enumerate(lector, start=2):
+            if not fila:
+                continue
+            if len(fila) < minimo:
+                fila = fila + [None] * (minimo - len(fila))
+            yield MovimientoBancario(
+                (fila[pos_referencia] or "").strip(),
+                a_centavos(fila[pos_monto]),
+                _a_fecha(fila[pos_fecha]) if pos_fecha is not None else None,
+                fila[pos_descripcion] if pos_descripcion is not None else None,
+                numero
+            )
+
+
+_ETIQUETA_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def leer_ofx(ruta):
+    # OFX 1.x es SGML (etiquetas sin cerrar) y 2.x es XML; basta con leer las etiquetas en orden
+    with open(ruta, encoding="latin-1") as archivo:
+        actual = None
+        for numero, linea in enumerate(archivo, start=1):
+            for cierre, etiqueta, valor in _ETIQUETA_OFX.findall(linea):
+                etiqueta = etiqueta.upper()
+                if etiqueta == "STMTTRN":
+                    if cierre and actual is not None:
+                        yield MovimientoBancario(
+                            (actual.get("REFNUM") or actual.get("FITID") or "").strip(),
+                            a_centavos(actual.get("TRNAMT")),
+                            _a_fecha(actual.get("DTPOSTED")),
+                            actual.get("MEMO") or actual.get("NAME"),
+                            actual["_linea"]
+                        )
+                        actual = None
+                    elif not cierre:
+                        actual = {"_linea": numero}
+                elif actual is not None and not cierre:
+                    actual[etiqueta] = valor.strip()
+
+
+def _sin_espacio_nombres(etiqueta):
+    return etiqueta.rsplit("}", 1)[-1]
+
+
+def _buscar(elemento, *ruta):
+    # Búsqueda por nombre local, ignorando el namespace del estándar ISO 20022
+    actual = [elemento]
+    for nombre in ruta:
+        actual = [h for e in actual for h in e if _sin_espacio_nombres(h.tag) == nombre]
+        if not actual:
+            return None
+    return actual[0]
+
+
+def _texto(elemento, *ruta):
+    encontrado = _buscar(elemento, *ruta)
+    return encontrado.text.strip() if encontrado is not None and encontrado.text else None
+
+
+def leer_camt(ruta):
+    # CAMT.053: cada <Ntry> es un movimiento. Al terminar de procesarlo se vacía y se quita de
+    # su padre (<Stmt>); si solo se vaciara, el árbol seguiría guardando un elemento por
+    # movimiento y la memoria crecería con el archivo.
+    numero = 0
+    abiertos = []
+    for evento, elemento in ET.iterparse(ruta, events=("start", "end")):
+        if evento == "start":
+            abiertos.append(elemento)
+            continue
+        abiertos.pop()
+        if _sin_espacio_nombres(elemento.tag) != "Ntry":
+            continue
+        numero += 1
+
+        monto = a_centavos(_texto(elemento, "Amt"))
+        if monto is not None and _texto(elemento, "CdtDbtInd") == "DBIT":
+            monto = -monto
+
+        referencia = (
+            _texto(elemento, "NtryDtls", "TxDtls", "Refs", "EndToEndId")
+            or _texto(elemento, "AcctSvcrRef")
+            or _texto(elemento, "NtryRef")
+            or ""
+        )
+        fecha = _texto(elemento, "BookgDt", "Dt") or _texto(elemento, "BookgDt", "DtTm")
+        yield MovimientoBancario(
+            referencia,
+            monto,
+            _a_fecha(fecha),
+            _texto(elemento, "NtryDtls", "TxDtls", "RmtInf", "Ustrd") or _texto(elemento, "AddtlNtryInf"),
+            numero
+        )
+        elemento.clear()
+        if abiertos:
+            abiertos[-1].remove(elemento)
+
+
+LECTORES = {
+    "csv": leer_csv,
+    "ofx": leer_ofx,
+    "camt": leer_camt,
+}
+
+
+def leer_estado_cuenta(ruta, formato=None):
+    """Regresa un generador de MovimientoBancario; el formato se deduce de la extensión si no se indica"""
+    if formato is None:
+        extension = os.path.splitext(ruta)[1].lower().lstrip(".")
+        formato = {"qfx": "ofx", "xml": "camt", "txt": "csv"}.get(extension, extension)
+    if formato not in LECTORES:
+        raise ValueError(f"Formato de estado de cuenta no soportado: {formato}")
+    return LECTORES[formato](ruta)
+
+
+# ---------------------------------------------------------------------------
+# Conciliación
+# ---------------------------------------------------------------------------
+
+def cargar_pendientes(conn=None):
+    """
+    Índice en memoria de las transacciones sin conciliar:
+    referencia_bancaria -> lista de (id, monto en centavos)
+    """
+    conn = conn or conectar()
+    indice = {}
+    cursor = conn.execute(
+        "SELECT id, referencia_bancaria, monto FROM Transaccion WHERE conciliado = 0"
+    )
+    for id_transaccion, referencia, monto in cursor:
+        indice.setdefault(referencia, []).append((id_transaccion, a_centavos(monto)))
+    return indice
+
+
+def marcar_conciliadas(ids, tamano_lote=TAMANO_LOTE_CONCILIACION, momento=None):
+    """
+    Marca como conciliadas las transacciones indicadas, un UPDATE por cada tamano_lote ids.
+    momento (epoch) es el instante de conciliación a guardar; por defecto, ahora.
+    Regresa cuántas cambiaron: las que ya estaban conciliadas no cuentan.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    ahora = time.time() if momento is None else momento
+    fecha = datetime.fromtimestamp(ahora).isoformat()
+    filas = [(fecha, ahora, json.dumps(ids[i:i + tamano_lote])) for i in range(0, len(ids), tamano_lote)]
+    return _guardar_en_lotes([(SQL_MARCAR_CONCILIADAS, filas)], 1)
+
+
+def _tomar_coincidencia(candidatas, monto_centavos, tolerancia_centavos):
+    for posicion, (id_transaccion, monto) in enumerate(candidatas):
+        if abs(monto - monto_centavos) <= tolerancia_centavos:
+            candidatas.pop(posicion)
+            return id_transaccion
+    return None
+
+
+def conciliar_movimientos(movimientos, tolerancia_centavos=0, al_no_conciliar=None,
+                          tamano_lote=TAMANO_LOTE_CONCILIACION, pendientes=None):
+    """
+    Empareja un flujo de movimientos bancarios con las transacciones pendientes
+    por referencia_bancaria y marca las coincidencias en lotes.
+
+    Es O(n + m): un diccionario con las m transacciones pendientes y una sola
+    pasada sobre los n movimientos. Solo se guardan en memoria el índice y el
+    lote de actualizaciones en curso.
+
+    al_no_conciliar(movimiento, motivo) se llama por cada movimiento sin pareja,
+    con motivo 'sin_referencia' o 'diferencia_monto'.
+    """
+    indice = pendientes if pendientes is not None else cargar_pendientes()
+    resultado = ResultadoConciliacion()
+    lote = []
+
+    def vaciar_lote():
+        if lote:
+            resultado.conciliados += marcar_conciliadas(lote, tamano_lote)
+            lote.clear()
+
+    for movimiento in movimientos:
+        resultado.leidos += 1
+        if movimiento.monto_centavos is None or movimiento.monto_centavos <= 0:
+            resultado.ignorados += 1
+            continue
+
+        candidatas = indice.get(movimiento.referencia)
+        if not candidatas:
+            resultado.sin_referencia += 1
+            if al_no_conciliar:
+                al_no_conciliar(movimiento, "sin_referencia")
+            continue
+
+        id_transaccion = _tomar_coincidencia(candidatas, movimiento.monto_centavos, tolerancia_centavos)
+        if id_transaccion is None:
+            resultado.diferencia_monto += 1
+            if al_no_conciliar:
+                al_no_conciliar(movimiento, "diferencia_monto")
+            continue
+        if not candidatas:
+            del indice[movimiento.referencia]
+
+        lote.append(id_transaccion)
+        if len(lote) >= tamano_lote:
+            vaciar_lote()
+
+    vaciar_lote()
+    return resultado
+
+
+def conciliar_estado_cuenta(ruta, formato=None, tolerancia_centavos=0, al_no_conciliar=None,
+                            tamano_lote=TAMANO_LOTE_CONCILIACION):
+    """Lee un estado de cuenta (CSV, OFX o CAMT.053) y concilia sus movimientos contra la base"""
+    return conciliar_movimientos(
+        leer_estado_cuenta(ruta, formato),
+        tolerancia_centavos=tolerancia_centavos,
+        al_no_conciliar=al_no_conciliar,
+        tamano_lote=tamano_lote
+    )
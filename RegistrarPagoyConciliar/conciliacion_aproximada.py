@@ -0,0 +1,226 @@
+# conciliacion_aproximada.py
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from conexion import conectar
+from conciliacion import marcar_conciliadas
+from modelo import a_centavos
+
+# Valores por defecto del segundo paso de conciliación
+TOLERANCIA_CENTAVOS = 100      # ±1.00 en el monto
+VENTANA_DIAS = 3               # ±3 días entre la fecha del banco y la de la transacción
+MAX_CANDIDATOS = 5
+
+# Peso de cada criterio en la confianza (suman 1.0 junto con el bono por método)
+PESO_MONTO = 0.6
+PESO_FECHA = 0.3
+BONO_METODO = 0.1
+
+# Palabras en la descripción del banco que delatan el método de pago
+PISTAS_METODO = {
+    "TRANSFERENCIA": ("SPEI", "TRANSF", "TRASPASO"),
+    "TARJETA": ("TPV", "TARJETA", "POS", "VISA", "MASTERCARD", "AMEX"),
+    "EFECTIVO": ("EFECTIVO", "DEPOSITO", "VENTANILLA"),
+    "CHEQUE": ("CHEQUE", "CHQ"),
+}
+
+
+class Candidato:
+    """Posible pareja entre un movimiento bancario y una transacción abierta"""
+    __slots__ = ("movimiento", "id_transaccion", "confianza", "diferencia_centavos", "diferencia_dias")
+
+    def __init__(self, movimiento, id_transaccion, confianza, diferencia_centavos, diferencia_dias):
+        self.movimiento = movimiento
+        self.id_transaccion = id_transaccion
+        self.confianza = confianza
+        self.diferencia_centavos = diferencia_centavos
+        self.diferencia_dias = diferencia_dias
+
+    def __repr__(self):
+        return (f"Candidato({self.movimiento.referencia!r} -> {self.id_transaccion!r}, "
+                f"confianza={self.confianza:.2f})")
+
+
+def _ordinal(fecha):
+    if fecha is None:
+        return None
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha[:10])
+    elif isinstance(fecha, datetime):
+        fecha = fecha.date()
+    return fecha.toordinal()
+
+
+def metodo_probable(descripcion):
+    if not descripcion:
+        return None
+    descripcion = descripcion.upper()
+    for metodo, pistas in PISTAS_METODO.items():
+        if any(pista in descripcion for pista in pistas):
+            return metodo
+    return None
+
+
+# Cada clave del índice es monto_centavos * 2**BITS_DIA + día ordinal: una lista de enteros
+# ordenada por (monto, fecha) donde bisect trabaja a velocidad de C
+BITS_DIA = 20
+MASCARA_DIA = (1 << BITS_DIA) - 1
+# Acotar fechas cuesta unas tres bisecciones por monto distinto; si el rango de montos
+# tiene menos de ESCANEO_LINEAL transacciones por monto posible, es más barato recorrerlo
+ESCANEO_LINEAL = 3
+
+
+class IndiceTransaccionesAbiertas:
+    """
+    Transacciones sin conciliar ordenadas por (monto en centavos, día).
+
+    Buscar un movimiento cuesta O(log m + k): se acota con bisección el rango
+    de montos dentro de la tolerancia y, si es grande, el rango de fechas de
+    cada monto, en lugar de comparar contra todas las transacciones abiertas.
+    """
+
+    def __init__(self, filas):
+        # filas: iterable de (id, monto, fecha, metodo_pago)
+        registros = sorted(
+            ((a_centavos(monto) << BITS_DIA) + _ordinal(fecha), id_transaccion, metodo_pago)
+            for id_transaccion, monto, fecha, metodo_pago in filas
+        )
+        self._claves = [r[0] for r in registros]
+        self._ids = [r[1] for r in registros]
+        self._metodos = [r[2] for r in registros]
+
+    @classmethod
+    def desde_base(cls, conn=None):
+        conn = conn or conectar()
+        return cls(conn.execute(
+            "SELECT id, monto, fecha, metodo_pago FROM Transaccion WHERE conciliado = 0"
+        ))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _posiciones(self, monto, dia, tolerancia_centavos, ventana_dias):
+        claves = self._claves
+        inicio = bisect_left(claves, (monto - tolerancia_centavos) << BITS_DIA)
+        fin = bisect_left(claves, (monto + tolerancia_centavos + 1) << BITS_DIA, inicio)
+
+        if fin - inicio <= ESCANEO_LINEAL * (2 * tolerancia_centavos + 1):
+            return [i for i in range(inicio, fin) if abs((claves[i] & MASCARA_DIA) - dia) <= ventana_dias]
+
+        return self._posiciones_densas(claves, inicio, fin, dia, ventana_dias)
+
+    @staticmethod
+    def _posiciones_densas(claves, inicio, fin, dia, ventana_dias):
+        # Rango denso (muchos montos repetidos): por cada monto distinto se acota la ventana de fechas
+        posicion = inicio
+        while posicion < fin:
+            base = claves[posicion] >> BITS_DIA << BITS_DIA
+            desde = bisect_left(claves, base + dia - ventana_dias, posicion, fin)
+            hasta = bisect_right(claves, base + dia + ventana_dias, desde, fin)
+            yield from range(desde, hasta)
+            posicion = bisect_left(claves, base + (1 << BITS_DIA), hasta, fin)
+
+    def buscar(self, movimiento, tolerancia_centavos=TOLERANCIA_CENTAVOS, ventana_dias=VENTANA_DIAS,
+               max_candidatos=MAX_CANDIDATOS):
+        """Candidatos para un movimiento, del más al menos probable"""
+        monto = movimiento.monto_centavos
+        dia = _ordinal(movimiento.fecha)
+        if monto is None or dia is None:
+            return []
+
+        metodo = metodo_probable(movimiento.descripcion)
+        candidatos = []
+        for i in self._posiciones(monto, dia, tolerancia_centavos, ventana_dias):
+            clave = self._claves[i]
+            diferencia_centavos = abs((clave >> BITS_DIA) - monto)
+            diferencia_dias = abs((clave & MASCARA_DIA) - dia)
+            confianza = (
+                PESO_MONTO * (1 - diferencia_centavos / (tolerancia_centavos + 1))
+                + PESO_FECHA * (1 - diferencia_dias / (ventana_dias + 1))
+            )
+            if metodo is not None and metodo == self._metodos[i]:
+                confianza += BONO_METODO
+            candidatos.append(Candidato(movimiento, self._ids[i], round(confianza, 4),
+                                        diferencia_centavos, diferencia_dias))
+
+        candidatos.sort(key=lambda c: (-c.confianza, c.diferencia_centavos, c.diferencia_dias))
+        return candidatos[:max_candidatos]
+
+
+def buscar_candidatos(movimientos, indice=None, tolerancia_centavos=TOLERANCIA_CENTAVOS,
+                      ventana_dias=VENTANA_DIAS, max_candidatos=MAX_CANDIDATOS):
+    """Regresa [(movimiento, [Candidato, ...]), ...] para los movimientos que tienen al menos un candidato"""
+    if indice is None:
+        indice = IndiceTransaccionesAbiertas.desde_base()
+    resultado = []
+    for movimiento in movimientos:
+        candidatos = indice.buscar(movimiento, tolerancia_centavos, ventana_dias, max_candidatos)
+        if candidatos:
+            resultado.append((movimiento, candidatos))
+    return resultado
+
+
+def _empatados(parejas, llave):
+    # Llaves (movimiento o transacción) cuya mejor pareja empata con la segunda;
+    # parejas viene ordenada de mayor a menor confianza
+    mejor = {}
+    empatados = set()
+    vistas = set()
+    for candidato in parejas:
+        clave = llave(candidato)
+        if clave not in mejor:
+            mejor[clave] = candidato.confianza
+        elif clave not in vistas:
+            vistas.add(clave)
+            if candidato.confianza >= mejor[clave]:
+                empatados.add(clave)
+    return empatados
+
+
+def asignar(candidatos_por_movimiento, umbral=0.0):
+    """
+    Elige a lo más una transacción por movimiento y un movimiento por transacción,
+    tomando primero las parejas de mayor confianza. Un movimiento cuyas dos mejores
+    transacciones empatan (o una transacción con dos movimientos empatados) no se
+    asigna: queda para revisión manual.
+    """
+    parejas = [c for _, candidatos in candidatos_por_movimiento for c in candidatos if c.confianza >= umbral]
+    parejas.sort(key=lambda c: -c.confianza)
+
+    usados_movimientos = _empatados(parejas, lambda c: id(c.movimiento))
+    usadas_transacciones = _empatados(parejas, lambda c: c.id_transaccion)
+    asignados = []
+    for candidato in parejas:
+        if id(candidato.movimiento) in usados_movimientos or candidato.id_transaccion in usadas_transacciones:
+            continue
+        usados_movimientos.add(id(candidato.movimiento))
+        usadas_transacciones.add(candidato.id_transaccion)
+        asignados.append(candidato)
+    return asignados
+
+
+def conciliar_aproximados(movimientos, umbral_automatico=0.9, tolerancia_centavos=TOLERANCIA_CENTAVOS,
+                          ventana_dias=VENTANA_DIAS, max_candidatos=MAX_CANDIDATOS):
+    """
+    Segundo paso para los movimientos que no coincidieron por referencia.
+    Concilia automáticamente las parejas con confianza >= umbral_automatico
+    (None para no conciliar nada) y regresa (conciliados, candidatos) para
+    que el resto se revise a mano.
+    """
+    candidatos = buscar_candidatos(movimientos, None, tolerancia_centavos, ventana_dias, max_candidatos)
+    if umbral_automatico is None:
+        return [], candidatos
+
+    conciliados = asignar(candidatos, umbral_automatico)
+    marcar_conciliadas(c.id_transaccion for c in conciliados)
+
+    movimientos_usados = {id(c.movimiento) for c in conciliados}
+    transacciones_usadas = {c.id_transaccion for c in conciliados}
+    restantes = []
+    for movimiento, opciones in candidatos:
+        if id(movimiento) in movimientos_usados:
+            continue
+        opciones = [c for c in opciones if c.id_transaccion not in transacciones_usadas]
+        if opciones:
+            restantes.append((movimiento, opciones))
+    return conciliados, restantes
@@ -0,0 +1,221 @@
+# conciliacion_paralela.py
+#
+# Conciliación en varios procesos para los estados de cuenta de fin de mes.
+# Los movimientos se reparten en particiones por un hash de la referencia (crc32,
+# igual en todos los procesos), así cada referencia cae en una sola partición; cada
+# proceso lee de la base solo las transacciones pendientes con las referencias de la
+# suya, y las particiones se concilian de forma independiente.
+# Los procesos solo leen; el proceso principal es el único que escribe.
+import csv
+import io
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import quote
+from zlib import crc32
+
+import conexion
+from conciliacion import (
+    MovimientoBancario, ResultadoConciliacion, TAMANO_LOTE_CONCILIACION,
+    _tomar_coincidencia, conciliar_estado_cuenta, conciliar_movimientos, leer_estado_cuenta,
+    marcar_conciliadas, posiciones_csv
+)
+from modelo import a_centavos
+
+
+def particion_de(referencia, particiones):
+    return crc32(referencia.encode()) % particiones
+
+
+def _particiones_vacias(particiones):
+    # Por partición: (referencias, montos en centavos)
+    return [([], []) for _ in range(particiones)]
+
+
+# ---------------------------------------------------------------------------
+# Trabajo de cada proceso
+# ---------------------------------------------------------------------------
+
+def _leer_rango_csv(ruta, inicio, fin, posiciones, delimitador, particiones):
+
+    #Lee las líneas del CSV entre los bytes inicio y fin (alineados a saltos de línea)
+    #y las reparte por partición. Regresa (particiones, leidos, ignorados).
+
+    with open(ruta, "rb") as archivo:
+        archivo.seek(inicio)
+        texto = archivo.read(fin - inicio).decode("utf-8")
+
+    pos_referencia, pos_monto = posiciones["referencia"], posiciones["monto"]
+    minimo = max(pos_referencia, pos_monto) + 1
+    destino = _particiones_vacias(particiones)
+    leidos = ignorados = 0
+    for fila in csv.reader(io.StringIO(texto, newline=""), delimiter=delimitador):
+        if not fila:
+            continue
+        leidos += 1
+        if len(fila) < minimo:
+            fila = fila + [None] * (minimo - len(fila))
+        monto = a_centavos(fila[pos_monto])
+        if monto is None or monto <= 0:
+            ignorados += 1
+            continue
+        referencia = (fila[pos_referencia] or "").strip()
+        referencias, montos = destino[crc32(referencia.encode()) % particiones]
+        referencias.append(referencia)
+        montos.append(monto)
+    return destino, leidos, ignorados
+
+
+def _conciliar_particion(ruta_base, referencias, montos, tolerancia_centavos, detalle):
+
+    #Carga de la base (solo lectura) las transacciones pendientes con las referencias de esta
+    #partición y las empareja con sus movimientos. Regresa (ids conciliados, sin_referencia,
+    #diferencia_monto); los dos últimos son listas de (referencia, monto) si detalle, o solo conteos.
+
+    #El filtro va en el SQL (idx_transaccion_pendiente lo resuelve): cada proceso lee solo
+    #sus filas, no todas las pendientes para descartar las de otras particiones.
+    conn = sqlite3.connect(f"file:{quote(ruta_base)}?mode=ro", uri=True)
+    try:
+        indice = {}
+        for id_transaccion, referencia, monto in conn.execute(
+            "SELECT id, referencia_bancaria, monto FROM Transaccion"
+            " WHERE conciliado = 0 AND referencia_bancaria IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(set(referencias))),)
+        ):
+            indice.setdefault(referencia, []).append((id_transaccion, a_centavos(monto)))
+    finally:
+        conn.close()
+
+    conciliados = []
+    sin_referencia = []
+    diferencia_monto = []
+    for referencia, monto in zip(referencias, montos):
+        candidatas = indice.get(referencia)
+        if not candidatas:
+            sin_referencia.append((referencia, monto))
+            continue
+        id_transaccion = _tomar_coincidencia(candidatas, monto, tolerancia_centavos)
+        if id_transaccion is None:
+            diferencia_monto.append((referencia, monto))
+            continue
+        if not candidatas:
+            del indice[referencia]
+        conciliados.append(id_transaccion)
+
+    if not detalle:
+        return conciliados, len(sin_referencia), len(diferencia_monto)
+    return conciliados, sin_referencia, diferencia_monto
+
+
+# ---------------------------------------------------------------------------
+# Coordinación (proceso principal)
+# ---------------------------------------------------------------------------
+
+def _rangos_csv(ruta, partes):
+    # Divide el archivo en partes de tamaño parecido que empiezan y terminan en un salto de línea
+    tamano = os.path.getsize(ruta)
+    with open(ruta, "rb") as archivo:
+        archivo.readline()  # Encabezado
+        inicio_datos = archivo.tell()
+        cortes = [inicio_datos]
+        for k in range(1, partes):
+            archivo.seek(max(cortes[-1], inicio_datos + k * (tamano - inicio_datos) // partes))
+            archivo.readline()
+            cortes.append(archivo.tell())
+        cortes.append(tamano)
+    return [(a, b) for a, b in zip(cortes, cortes[1:]) if b > a]
+
+
+def _conciliar_particionados(ejecutor, particionados, resultado, tolerancia_centavos,
+                             al_no_conciliar, tamano_lote):
+    ruta_base = os.path.abspath(conexion.DB_PATH)
+    futuros = [
+        ejecutor.submit(_conciliar_particion, ruta_base, referencias, montos,
+                        tolerancia_centavos, al_no_conciliar is not None)
+        for referencias, montos in particionados
+    ]
+    # Escritor único: cada partición se guarda en cuanto termina, mientras las demás siguen
+    for futuro in as_completed(futuros):
+        conciliados, sin_referencia, diferencia_monto = futuro.result()
+        resultado.conciliados += marcar_conciliadas(conciliados, tamano_lote)
+        if al_no_conciliar is None:
+            resultado.sin_referencia += sin_referencia
+            resultado.diferencia_monto += diferencia_monto
+            continue
+        resultado.sin_referencia += len(sin_referencia)
+        resultado.diferencia_monto += len(diferencia_monto)
+        for referencia, monto in sin_referencia:
+            al_no_conciliar(MovimientoBancario(referencia, monto), "sin_referencia")
+        for referencia, monto in diferencia_monto:
+            al_no_conciliar(MovimientoBancario(referencia, monto), "diferencia_monto")
+    return resultado
+
+
+def conciliar_en_paralelo(movimientos, procesos=None, tolerancia_centavos=0, al_no_conciliar=None,
+                          tamano_lote=TAMANO_LOTE_CONCILIACION):
+    """
+    Como conciliacion.conciliar_movimientos pero emparejando en `procesos` procesos.
+    Los movimientos se reparten aquí; a al_no_conciliar le llegan con solo referencia y monto.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        return conciliar_movimientos(movimientos, tolerancia_centavos, al_no_conciliar, tamano_lote)
+
+    resultado = ResultadoConciliacion()
+    particionados = _particiones_vacias(procesos)
+    for movimiento in movimientos:
+        resultado.leidos += 1
+        if movimiento.monto_centavos is None or movimiento.monto_centavos <= 0:
+            resultado.ignorados += 1
+            continue
+        referencias, montos = particionados[particion_de(movimiento.referencia, procesos)]
+        referencias.append(movimiento.referencia)
+        montos.append(movimiento.monto_centavos)
+
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        return _conciliar_particionados(ejecutor, particionados, resultado, tolerancia_centavos,
+                                        al_no_conciliar, tamano_lote)
+
+
+def conciliar_estado_cuenta_en_paralelo(ruta, formato=None, procesos=None, tolerancia_centavos=0,
+                                        al_no_conciliar=None, tamano_lote=TAMANO_LOTE_CONCILIACION,
+                                        delimitador=","):
+    """
+    Concilia un estado de cuenta usando varios procesos.
+
+    Un CSV también se lee en paralelo, por rangos de bytes (supone un registro por
+    línea, sin saltos de línea dentro de campos entre comillas). OFX y CAMT se leen
+    en el proceso principal y solo el emparejamiento es paralelo. Con un solo
+    proceso es igual a conciliacion.conciliar_estado_cuenta.
+    """
+    if formato is None:
+        formato = "csv" if ruta.lower().endswith((".csv", ".txt")) else None
+    if formato != "csv":
+        return conciliar_en_paralelo(leer_estado_cuenta(ruta, formato), procesos, tolerancia_centavos,
+                                     al_no_conciliar, tamano_lote)
+
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        return conciliar_estado_cuenta(ruta, formato, tolerancia_centavos, al_no_conciliar, tamano_lote)
+
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        posiciones = posiciones_csv(next(csv.reader(archivo, delimiter=delimitador), []), ruta)
+
+    resultado = ResultadoConciliacion()
+    particionados = _particiones_vacias(procesos)
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        lecturas = [
+            ejecutor.submit(_leer_rango_csv, ruta, inicio, fin, posiciones, delimitador, procesos)
+            for inicio, fin in _rangos_csv(ruta, procesos)
+        ]
+        for lectura in lecturas:
+            partes, leidos, ignorados = lectura.result()
+            resultado.leidos += leidos
+            resultado.ignorados += ignorados
+            for (referencias, montos), (nuevas, nuevos) in zip(particionados, partes):
+                referencias.extend(nuevas)
+                montos.extend(nuevos)
+
+        return _conciliar_particionados(ejecutor, particionados, resultado, tolerancia_centavos,
+                                        al_no_conciliar, tamano_lote)
@@ -1,8 +1,104 @@
 # conexion.py
 import sqlite3
+import threading
 from sqlite3 import Connection
 
+DB_PATH = "Base_datos.db"
+
+# Perfiles de ajuste de SQLite. cache_size negativo = KiB; mmap_size en bytes.
+PERFILES = {
+    # Uso normal de las cajas: WAL con synchronous=NORMAL no pierde integridad
+    "normal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+        "cached_statements": 256,
+    },
+    # Cada commit llega al disco antes de regresar (cierre de caja, conciliación)
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+        "cached_statements": 256,
+    },
+    # Cargas masivas (archivos de pagos de fin de día): prioriza velocidad
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+        "cached_statements": 512,
+    },
+}
+
+PERFIL_ACTUAL = "normal"
+
+_local = threading.local()
+# Cambia cada vez que se reconfigura, para que cada hilo reabra su conexión
+_version = 0
+_candado = threading.Lock()
+
+
+def configurar(ruta=None, perfil=None):
+    """Cambia la base de datos y/o el perfil; aplica a la siguiente llamada de conectar() en cada hilo"""
+    global DB_PATH, PERFIL_ACTUAL, _version
+    if perfil is not None and perfil not in PERFILES:
+        raise ValueError(f"Perfil desconocido: {perfil}")
+    with _candado:
+        if ruta is not None:
+            DB_PATH = ruta
+        if perfil is not None:
+            PERFIL_ACTUAL = perfil
+        _version += 1
+
+
+def _abrir(ruta, perfil) -> Connection:
+    ajustes = PERFILES[perfil]
+    conn = sqlite3.connect(
+        ruta,
+        timeout=ajustes["busy_timeout"] / 1000,
+        cached_statements=ajustes["cached_statements"]
+    )
+    conn.execute(f"PRAGMA journal_mode={ajustes['journal_mode']}")  # Mejor manejo de concurrencia
+    conn.execute(f"PRAGMA synchronous={ajustes['synchronous']}")
+    conn.execute(f"PRAGMA cache_size={int(ajustes['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size={int(ajustes['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store={ajustes['temp_store']}")
+    conn.execute(f"PRAGMA busy_timeout={int(ajustes['busy_timeout'])}")
+    return conn
+
+
 def conectar() -> Connection:
-    conn = sqlite3.connect("Base_datos.db", timeout=10)
-    conn.execute("PRAGMA journal_mode=WAL")  # Mejor manejo de concurrencia
+    # Una conexión por hilo, configurada una sola vez y reutilizada en cada guardado
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.version == _version:
+        return conn
+
+    cerrar_conexion()
+    with _candado:
+        ruta, perfil, version = DB_PATH, PERFIL_ACTUAL, _version
+    conn = _abrir(ruta, perfil)
+    _local.conn = conn
+    _local.version = version
     return conn
+
+
+def cerrar_conexion():
+    """Cierra la conexión guardada del hilo actual (si existe)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        try:
+            # Actualiza las estadísticas del planificador si las tablas cambiaron mucho
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        conn.close()
@@ -0,0 +1,137 @@
+# escritor_diferido.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from conexion import cerrar_conexion
+from persistencia import (
+    SQL_GUARDAR_FACTURA, SQL_GUARDAR_TRANSACCION, TAMANO_LOTE,
+    _fila_factura, _fila_transaccion, _guardar_en_lotes, _escribir
+)
+
+# Marca para detener el hilo escritor
+_FIN = object()
+
+
+class EscritorDiferido:
+    """
+    Hilo único que recibe escrituras de Factura y Transaccion por una cola
+    y las agrupa en un solo COMMIT cada intervalo_ms milisegundos o cada
+    max_filas filas (lo que ocurra primero).
+
+    Como solo este hilo escribe, las cajas ya no compiten por el candado de
+    SQLite. Cada guardado regresa un Future que se resuelve cuando el grupo
+    que lo contiene quedó confirmado en la base:
+
+        with EscritorDiferido() as escritor:
+            futuro = escritor.guardar_transaccion(transaccion)
+            futuro.result()  # Espera a que sea durable
+    """
+
+    def __init__(self, intervalo_ms=20, max_filas=TAMANO_LOTE, max_pendientes=10000):
+        if intervalo_ms < 0 or max_filas < 1:
+            raise ValueError("Parámetros de agrupación inválidos")
+        self.intervalo = intervalo_ms / 1000
+        self.max_filas = max_filas
+        # Cola acotada: si el disco no da abasto, quien guarda espera (contrapresión)
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._cerrado = False
+        self._candado = threading.Lock()
+
+        # Estadísticas
+        self.grupos_escritos = 0
+        self.filas_escritas = 0
+
+        self._hilo = threading.Thread(target=self._ejecutar, name="EscritorDiferido", daemon=True)
+        self._hilo.start()
+
+    def _encolar(self, sql, fila):
+        futuro = Future()
+        with self._candado:
+            if self._cerrado:
+                raise RuntimeError("El escritor diferido ya fue cerrado")
+            # La fila se arma al encolar: cambios posteriores al objeto no afectan lo guardado
+            self._cola.put((sql, fila, futuro))
+        return futuro
+
+    def guardar_factura(self, factura) -> Future:
+        return self._encolar(SQL_GUARDAR_FACTURA, _fila_factura(factura))
+
+    def guardar_transaccion(self, transaccion) -> Future:
+        return self._encolar(SQL_GUARDAR_TRANSACCION, _fila_transaccion(transaccion))
+
+    def _ejecutar(self):
+        try:
+            terminar = False
+            while not terminar:
+                primero = self._cola.get()
+                if primero is _FIN:
+                    break
+
+                grupo = [primero]
+                limite = time.monotonic() + self.intervalo
+                while len(grupo) < self.max_filas:
+                    restante = limite - time.monotonic()
+                    try:
+                        if restante > 0:
+                            elemento = self._cola.get(timeout=restante)
+                        else:
+                            elemento = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if elemento is _FIN:
+                        terminar = True
+                        break
+                    grupo.append(elemento)
+
+                self._escribir_grupo(grupo)
+        finally:
+            cerrar_conexion()
+
+    def _escribir_grupo(self, grupo):
+        grupo = [e for e in grupo if e[2].set_running_or_notify_cancel()]
+        if not grupo:
+            return
+
+        # Facturas primero para que las transacciones encuentren a su factura
+        facturas = [fila for sql, fila, _ in grupo if sql is SQL_GUARDAR_FACTURA]
+        transacciones = [fila for sql, fila, _ in grupo if sql is SQL_GUARDAR_TRANSACCION]
+        try:
+            _guardar_en_lotes(
+                [(SQL_GUARDAR_FACTURA, facturas), (SQL_GUARDAR_TRANSACCION, transacciones)],
+                self.max_filas
+            )
+        except Exception as error:
+            if len(grupo) == 1:
+                grupo[0][2].set_exception(error)
+                return
+            # Una fila inválida no debe tumbar al resto del grupo: se escriben una por una
+            for sql, fila, futuro in grupo:
+                try:
+                    _escribir(sql, fila)
+                    futuro.set_result(True)
+                except Exception as error_fila:
+                    futuro.set_exception(error_fila)
+            return
+
+        self.grupos_escritos += 1
+        self.filas_escritas += len(grupo)
+        for _, _, futuro in grupo:
+            futuro.set_result(True)
+
+    def cerrar(self, esperar=True):
+        """Deja de aceptar escrituras; las pendientes se confirman antes de terminar"""
+        with self._candado:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            self._cola.put(_FIN)
+        if esperar:
+            self._hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
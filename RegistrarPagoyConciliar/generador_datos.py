@@ -0,0 +1,491 @@
+# generador_datos.py
+#
+# Genera datos sintéticos con integridad referencial para pruebas de carga,
+# en la base SQLite de este módulo o en el esquema PostgreSQL de Alexis/crear_bd.sql.
+# Con la misma semilla y escala siempre se generan exactamente los mismos datos.
+#
+#   python generador_datos.py --escala media --ruta carga.db
+#   python generador_datos.py --destino postgres --escala completa --dsn "dbname=tienda2 user=postgres"
+import argparse
+import io
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from auditoria import TRIGGERS as TRIGGERS_AUDITORIA, crear_tablas as crear_auditoria_facturas
+from init_db import INDICES_RECOMENDADOS, actualizar_estadisticas, crear_base_datos, crear_indices
+from latencias import crear_tablas as crear_histograma_conciliacion, reconstruir_histograma
+
+# Cantidades por escala. partidas = renglones de Pedido_Producto; facturas <= pedidos
+# porque cada pedido tiene a lo más una factura.
+ESCALAS = {
+    "prueba": {"clientes": 1000, "productos": 200, "pedidos": 5000,
+               "partidas": 10000, "facturas": 5000, "transacciones": 5000},
+    "media": {"clientes": 100000, "productos": 5000, "pedidos": 500000,
+              "partidas": 1000000, "facturas": 500000, "transacciones": 500000},
+    "completa": {"clientes": 1000000, "productos": 50000, "pedidos": 5000000,
+                 "partidas": 10000000, "facturas": 5000000, "transacciones": 5000000},
+}
+
+# Pedidos que se generan y escriben por cada lote
+PEDIDOS_POR_LOTE = 20000
+
+# Los datos cubren DIAS días hasta FECHA_FINAL (fija para que la salida sea reproducible)
+FECHA_FINAL = date(2025, 6, 30)
+DIAS = 365
+
+IVA = 0.16
+METODOS_PAGO = ("EFECTIVO", "TARJETA", "TRANSFERENCIA", "CHEQUE")
+ESTADOS_PEDIDO = ("ENTREGADO",) * 8 + ("EN_RUTA", "EN_PROCESO")
+PROPORCION_PAGO_TOTAL = 0.85       # Facturas con pagos cuyo último pago liquida el saldo
+PROPORCION_CONCILIADA = 0.80       # Transacciones ya conciliadas
+LATENCIA_MEDIA_CONCILIACION = 86400.0
+
+NOMBRES = ("Juan", "María", "José", "Ana", "Luis", "Carmen", "Carlos", "Laura", "Jorge", "Sofía",
+           "Miguel", "Lucía", "Pedro", "Elena", "Ricardo", "Patricia", "Fernando", "Gabriela")
+APELLIDOS = ("Pérez", "García", "López", "Martínez", "Hernández", "González", "Rodríguez", "Sánchez",
+             "Ramírez", "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Cruz", "Morales")
+CALLES = ("Av. Reforma", "Calle Juárez", "Blvd. Ávila Camacho", "Av. Insurgentes", "Calle Hidalgo",
+          "Av. Universidad", "Calle Morelos", "Av. Revolución")
+CIUDADES = ("CDMX", "GDL", "MTY", "PUE", "QRO", "MER")
+ARTICULOS = ("Laptop", "Monitor", "Teclado", "Mouse", "Impresora", "Audífonos", "Cámara", "Tableta",
+             "Disco SSD", "Memoria USB", "Router", "Bocina")
+MARCAS = ("HP", "Dell", "Lenovo", "Logitech", "Samsung", "Acer", "Epson", "Sony")
+
+# Columnas que se llenan en cada esquema, en orden de carga (padres antes que hijos)
+COLUMNAS_SQLITE = {
+    "Cliente": ("id", "nombre", "direccion"),
+    "Producto": ("id", "nombre", "precio", "stock", "estado"),
+    "Pedido": ("id", "cliente_id", "fecha", "estado"),
+    "Pedido_Producto": ("pedido_id", "producto_id", "cantidad"),
+    "Factura": ("id", "pedido_id", "fecha_emision", "total", "saldo_pendiente", "cliente", "estado",
+                "fecha_pago", "comprobante_pago"),
+    "Transaccion": ("id", "monto", "metodo_pago", "factura_id", "referencia_bancaria", "fecha", "estado",
+                    "fecha_conciliacion", "conciliado", "timestamp_inicio", "timestamp_fin"),
+}
+
+COLUMNAS_POSTGRES = {
+    "Cliente": ("id", "nombre", "direccion", "rfc", "regimen_fiscal", "direccion_fiscal"),
+    "Producto": ("id", "nombre", "precio", "stock", "estado"),
+    "Pedido": ("id", "cliente_id", "fecha", "estado"),
+    "Pedido_Producto": ("pedido_id", "producto_id", "cantidad"),
+    "Factura": ("id", "pedido_id", "fecha_emision", "subtotal", "iva", "total", "estatus"),
+    "CuentaPorCobrar": ("factura_id", "cliente_id", "fecha_emision", "monto", "estatus"),
+}
+
+# Libro de pagos (init_db, QUINTO) a partir de las Transaccion cargadas: un Pago por transacción
+# con el saldo que dejó y el SaldoFactura de cada factura con pagos. Solo las facturas que aún
+# no tienen libro, por si se carga sobre una base con datos.
+SQL_LIBRO_PAGOS = (
+    """
+    INSERT INTO Pago (factura_id, transaccion_id, monto_centavos, saldo_resultante_centavos, fecha)
+    SELECT t.factura_id, t.id, t.centavos,
+           CAST(ROUND(f.total * 100) AS INTEGER)
+             - SUM(t.centavos) OVER (PARTITION BY t.factura_id ORDER BY t.fecha, t.id),
+           t.fecha
+    FROM (SELECT id, factura_id, fecha, CAST(ROUND(monto * 100) AS INTEGER) AS centavos FROM Transaccion) AS t
+    JOIN Factura AS f ON f.id = t.factura_id
+    WHERE NOT EXISTS (SELECT 1 FROM SaldoFactura AS s WHERE s.factura_id = t.factura_id)
+    ORDER BY t.factura_id, t.fecha, t.id
+    """,
+    """
+    INSERT INTO SaldoFactura (factura_id, total_centavos, pagado_centavos, saldo_centavos, num_pagos, ultimo_pago)
+    SELECT f.id, CAST(ROUND(f.total * 100) AS INTEGER), SUM(p.monto_centavos),
+           CAST(ROUND(f.saldo_pendiente * 100) AS INTEGER), COUNT(*), MAX(p.fecha)
+    FROM Factura AS f
+    JOIN Pago AS p ON p.factura_id = f.id
+    WHERE NOT EXISTS (SELECT 1 FROM SaldoFactura AS s WHERE s.factura_id = f.id)
+    GROUP BY f.id
+    """,
+)
+
+
+def _id_cliente(i):
+    return f"CLI-{i:07d}"
+
+
+def _id_producto(i):
+    return f"PROD-{i:06d}"
+
+
+def _enteros(aleatorio):
+    # int(random() * n) en lugar de randrange(n): varias veces más rápido y igual de reproducible
+    azar = aleatorio.random
+    return lambda n: int(azar() * n)
+
+
+def _repartir(indice, total, partes):
+    # Cuántos elementos de `total` le tocan a la posición `indice` de `partes`: suma exactamente total
+    return (indice + 1) * total // partes - indice * total // partes
+
+
+class _Calendario:
+    """Fechas precalculadas: formatear millones de datetime es más caro que generar los datos"""
+
+    def __init__(self, fecha_final=FECHA_FINAL, dias=DIAS):
+        inicio = fecha_final - timedelta(days=dias - 1)
+        self.dias = dias
+        self.iso = [(inicio + timedelta(days=d)).isoformat() for d in range(dias + 60)]
+        # Epoch en UTC: sin la zona local no hay días de 23 o 25 horas ni resultados que
+        # cambien según la máquina; las horas de pago se leen como UTC en _filas_sqlite
+        medianoche = datetime(inicio.year, inicio.month, inicio.day, tzinfo=timezone.utc)
+        self.epoch = [(medianoche + timedelta(days=d)).timestamp() for d in range(dias + 60)]
+        self.horas = [f"T{m // 60:02d}:{m % 60:02d}:00" for m in range(1440)]
+
+
+# ---------------------------------------------------------------------------
+# Generación. Cada entidad usa su propio generador aleatorio para que cambiar
+# una cantidad no altere los datos de las demás tablas.
+# ---------------------------------------------------------------------------
+
+def generar_clientes(n, semilla):
+    """(id, nombre, direccion, rfc, regimen_fiscal)"""
+    aleatorio = random.Random(f"{semilla}-clientes")
+    entero = _enteros(aleatorio)
+
+    def elegir(opciones):
+        return opciones[entero(len(opciones))]
+
+    for i in range(n):
+        nombre = f"{elegir(NOMBRES)} {elegir(APELLIDOS)} {elegir(APELLIDOS)}"
+        direccion = f"{elegir(CALLES)} {1 + entero(1999)}, {elegir(CIUDADES)}"
+        moral = entero(4) == 0
+        rfc = f"{'XAX' if moral else 'XAXX'}{entero(10 ** 6):06d}{entero(1000):03d}"
+        yield _id_cliente(i), nombre, direccion, rfc, "Persona Moral" if moral else "Persona Física"
+
+
+def generar_productos(n, semilla):
+    """(id, nombre, precio_centavos, stock, estado)"""
+    aleatorio = random.Random(f"{semilla}-productos")
+    for i in range(n):
+        nombre = f"{aleatorio.choice(ARTICULOS)} {aleatorio.choice(MARCAS)} {i}"
+        precio = aleatorio.randrange(5000, 3000000)
+        yield _id_producto(i), nombre, precio, aleatorio.randrange(0, 500), "ACTIVO"
+
+
+def generar_pedidos(escala, semilla, precios, calendario):
+
+    #Genera cada pedido junto con sus partidas, su factura y los pagos de la factura,
+    #para que totales, saldos y fechas queden consistentes entre tablas.
+    #Produce tuplas (pedido, partidas, factura, pagos) con montos en centavos; factura y
+    #pagos pueden ser None / vacíos.
+
+    aleatorio = random.Random(f"{semilla}-pedidos")
+    azar, entero = aleatorio.random, _enteros(aleatorio)
+    pedidos, facturas = escala["pedidos"], escala["facturas"]
+    clientes, productos = escala["clientes"], len(precios)
+    transacciones = escala["transacciones"]
+    # Partidas por pedido entre 1 y 2*promedio-1 para que el promedio sea partidas/pedidos
+    promedio = escala["partidas"] / pedidos
+    maximo_partidas = max(1, min(productos, round(2 * promedio - 1)))
+    sobrantes = escala["partidas"]
+
+    numero_factura = 0
+    numero_transaccion = 0
+    for i in range(pedidos):
+        dia = entero(calendario.dias)
+        id_pedido = f"PED-{i:08d}"
+        cliente = _id_cliente(entero(clientes))
+        pedido = (id_pedido, cliente, calendario.iso[dia], ESTADOS_PEDIDO[entero(len(ESTADOS_PEDIDO))])
+
+        # Al acercarse al final se acota para que el total de partidas sea exacto
+        restantes = pedidos - i - 1
+        cuantas = 1 + entero(maximo_partidas)
+        cuantas = max(cuantas, sobrantes - restantes * maximo_partidas)
+        cuantas = min(cuantas, sobrantes - restantes, productos)
+        sobrantes -= cuantas
+        elegidos = set()
+        while len(elegidos) < cuantas:
+            elegidos.add(entero(productos))
+        partidas = []
+        subtotal = 0
+        for producto in elegidos:
+            cantidad = 1 + entero(5)
+            subtotal += precios[producto] * cantidad
+            partidas.append((id_pedido, _id_producto(producto), cantidad))
+
+        factura = None
+        pagos = []
+        if _repartir(i, facturas, pedidos):
+            iva = round(subtotal * IVA)
+            total = subtotal + iva
+            id_factura = f"FAC-{numero_factura:08d}"
+            numero_pagos = _repartir(numero_factura, transacciones, facturas)
+            numero_factura += 1
+
+            # Si no se liquida, el último pago deja entre 10% y 90% pendiente
+            liquidada = numero_pagos > 0 and azar() < PROPORCION_PAGO_TOTAL
+            por_pagar = total if liquidada else total * (10 + entero(81)) // 100
+            dia_pago = dia
+            for k in range(numero_pagos):
+                monto = por_pagar // (numero_pagos - k) if k < numero_pagos - 1 else por_pagar
+                if monto <= 0:
+                    continue
+                por_pagar -= monto
+                dia_pago = min(dia_pago + entero(15), len(calendario.iso) - 1)
+                minuto = entero(1440)
+                inicio = calendario.epoch[dia_pago] + minuto * 60
+                conciliada = azar() < PROPORCION_CONCILIADA
+                fin = inicio + aleatorio.expovariate(1 / LATENCIA_MEDIA_CONCILIACION) if conciliada else None
+                pagos.append((f"TRX-{numero_transaccion:08d}", monto, METODOS_PAGO[entero(len(METODOS_PAGO))],
+                              f"REF{numero_transaccion:010d}", calendario.iso[dia_pago] + calendario.horas[minuto],
+                              inicio, fin))
+                numero_transaccion += 1
+
+            pagado = sum(p[1] for p in pagos)
+            factura = (id_factura, id_pedido, calendario.iso[dia], subtotal, iva, total, total - pagado,
+                       cliente, calendario.iso[dia_pago] if pagos else None)
+
+        yield pedido, partidas, factura, pagos
+
+
+def _a_pesos(centavos):
+    return centavos / 100
+
+
+def _filas_sqlite(lote):
+    tablas = {"Pedido": [], "Pedido_Producto": [], "Factura": [], "Transaccion": []}
+    for pedido, partidas, factura, pagos in lote:
+        tablas["Pedido"].append(pedido)
+        tablas["Pedido_Producto"].extend(partidas)
+        if factura is None:
+            continue
+        id_factura, id_pedido, fecha, _, _, total, saldo, cliente, fecha_pago = factura
+        if saldo == 0:
+            estado = "PAGADA"
+        elif saldo < total:
+            estado = "PAGADA_PARCIAL"
+        else:
+            estado = "PENDIENTE"
+        tablas["Factura"].append((id_factura, id_pedido, fecha, _a_pesos(total), _a_pesos(saldo), cliente,
+                                  estado, fecha_pago, None))
+        for id_transaccion, monto, metodo, referencia, fecha_trx, inicio, fin in pagos:
+            conciliada = fin is not None
+            tablas["Transaccion"].append((
+                id_transaccion, _a_pesos(monto), metodo, id_factura, referencia, fecha_trx,
+                "CONCILIADA" if conciliada else "PENDIENTE",
+                datetime.fromtimestamp(fin, timezone.utc).replace(tzinfo=None).isoformat() if conciliada else None,
+                int(conciliada), inicio, fin
+            ))
+    return tablas
+
+
+def _filas_postgres(lote, fecha_final=FECHA_FINAL):
+    # El esquema PostgreSQL no tiene Transaccion: lo que falta por cobrar va a CuentaPorCobrar
+    vencimiento = (fecha_final - timedelta(days=30)).isoformat()
+    tablas = {"Pedido": [], "Pedido_Producto": [], "Factura": [], "CuentaPorCobrar": []}
+    for pedido, partidas, factura, _ in lote:
+        tablas["Pedido"].append(pedido)
+        tablas["Pedido_Producto"].extend(partidas)
+        if factura is None:
+            continue
+        id_factura, id_pedido, fecha, subtotal, iva, total, saldo, cliente, _ = factura
+        tablas["Factura"].append((id_factura, id_pedido, fecha, _centavos_pg(subtotal), _centavos_pg(iva),
+                                  _centavos_pg(total), "EMITIDA"))
+        if saldo > 0:
+            tablas["CuentaPorCobrar"].append((id_factura, cliente, fecha, _centavos_pg(saldo),
+                                              "VENCIDA" if fecha < vencimiento else "PENDIENTE"))
+    return tablas
+
+
+def _centavos_pg(centavos):
+    # NUMERIC(10,2) exacto, sin pasar por float
+    return f"{centavos // 100}.{centavos % 100:02d}"
+
+
+# ---------------------------------------------------------------------------
+# Destinos
+# ---------------------------------------------------------------------------
+
+class DestinoSQLite:
+    """Carga con executemany en una sola transacción; el libro de pagos se llena al final con SQL,
+    y los índices y triggers se reconstruyen después del COMMIT"""
+
+    columnas = COLUMNAS_SQLITE
+
+    def __init__(self, ruta):
+        if not os.path.exists(ruta):
+            crear_base_datos(ruta)
+        self.conn = sqlite3.connect(ruta, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA cache_size=-262144")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA foreign_keys=OFF")
+        self._sql = {
+            tabla: f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})"
+            for tabla, columnas in self.columnas.items()
+        }
+
+    def iniciar(self):
+        # Los DROP van dentro de la transacción de carga: si la carga falla, el ROLLBACK
+        # devuelve índices y triggers (incluidos los que protegen EventoFactura)
+        self.conn.execute("BEGIN")
+        # Mantener índices y el histograma fila por fila cuesta más que reconstruirlos una vez
+        for nombre in INDICES_RECOMENDADOS:
+            self.conn.execute(f"DROP INDEX IF EXISTS {nombre}")
+        self.conn.execute("DROP TRIGGER IF EXISTS trg_histograma_insert")
+        self.conn.execute("DROP TRIGGER IF EXISTS trg_histograma_update")
+        # Las facturas sintéticas entran a la bitácora al final, como altas con su fecha de emisión
+        for nombre in TRIGGERS_AUDITORIA:
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+    def filas(self, lote):
+        return _filas_sqlite(lote)
+
+    def escribir(self, tabla, filas):
+        if tabla == "Cliente":
+            filas = (f[:3] for f in filas)
+        elif tabla == "Producto":
+            filas = ((i, n, _a_pesos(p), s, e) for i, n, p, s, e in filas)
+        self.conn.executemany(self._sql[tabla], filas)
+
+    def terminar(self):
+        # El libro de pagos entra en la misma transacción que las facturas que describe
+        for sql in SQL_LIBRO_PAGOS:
+            self.conn.execute(sql)
+        self.conn.execute("COMMIT")
+        cursor = self.conn.cursor()
+        crear_indices(cursor)
+        crear_histograma_conciliacion(cursor)
+        reconstruir_histograma(self.conn)
+        crear_auditoria_facturas(cursor)
+        actualizar_estadisticas(self.conn)
+        self.conn.close()
+
+    def abortar(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+
+class DestinoPostgres:
+    """Carga con COPY ... FROM STDIN en una sola transacción, padres antes que hijos"""
+
+    columnas = COLUMNAS_POSTGRES
+
+    def __init__(self, dsn):
+        import psycopg2  # Solo se necesita para este destino
+        self.conn = psycopg2.connect(dsn)
+        self.cursor = self.conn.cursor()
+
+    def iniciar(self):
+        # Las llaves foráneas de crear_bd.sql no son DEFERRABLE, así que esto solo aplaza las que
+        # lo sean; el orden de carga (padres primero) garantiza que las demás se cumplan
+        self.cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        self.cursor.execute("SET synchronous_commit = OFF")
+
+    def filas(self, lote):
+        return _filas_postgres(lote)
+
+    def escribir(self, tabla, filas):
+        if tabla == "Cliente":
+            filas = ((i, n, d, rfc, regimen, d) for i, n, d, rfc, regimen in filas)
+        elif tabla == "Producto":
+            filas = ((i, n, _centavos_pg(p), s, e) for i, n, p, s, e in filas)
+        buffer = io.StringIO()
+        for fila in filas:
+            buffer.write("\t".join("\\N" if v is None else str(v) for v in fila))
+            buffer.write("\n")
+        buffer.seek(0)
+        self.cursor.copy_expert(f"COPY {tabla} ({', '.join(self.columnas[tabla])}) FROM STDIN", buffer)
+
+    def terminar(self):
+        self.conn.commit()
+        self.conn.autocommit = True
+        self.cursor.execute("ANALYZE")
+        self.conn.close()
+
+    def abortar(self):
+        self.conn.rollback()
+        self.conn.close()
+
+
+def _en_lotes(iterable, tamano):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def generar(destino, escala, semilla=42, pedidos_por_lote=PEDIDOS_POR_LOTE, progreso=None):
+    """Genera y carga todos los datos en el destino; regresa {tabla: filas escritas}"""
+    if escala["facturas"] > escala["pedidos"]:
+        raise ValueError("No puede haber más facturas que pedidos (una factura por pedido)")
+    if escala["partidas"] < escala["pedidos"]:
+        raise ValueError("Cada pedido necesita al menos una partida")
+    if escala["partidas"] > escala["pedidos"] * escala["productos"]:
+        raise ValueError("Hay más partidas que combinaciones de pedido y producto")
+
+    calendario = _Calendario()
+    conteos = {}
+
+    def escribir(tabla, filas):
+        filas = list(filas)
+        if filas:
+            destino.escribir(tabla, filas)
+            conteos[tabla] = conteos.get(tabla, 0) + len(filas)
+
+    destino.iniciar()
+    try:
+        for lote in _en_lotes(generar_clientes(escala["clientes"], semilla), pedidos_por_lote * 5):
+            escribir("Cliente", lote)
+
+        productos = list(generar_productos(escala["productos"], semilla))
+        precios = [p[2] for p in productos]
+        escribir("Producto", productos)
+
+        for lote in _en_lotes(generar_pedidos(escala, semilla, precios, calendario), pedidos_por_lote):
+            for tabla, filas in destino.filas(lote).items():
+                escribir(tabla, filas)
+            if progreso:
+                progreso(conteos)
+    except BaseException:
+        destino.abortar()
+        raise
+    destino.terminar()
+    return conteos
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Generador reproducible de datos sintéticos")
+    parser.add_argument("--destino", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--ruta", default="datos_sinteticos.db", help="Base SQLite (se crea si no existe)")
+    parser.add_argument("--dsn", default="dbname=tienda2 user=postgres host=localhost port=5432",
+                        help="Cadena de conexión de PostgreSQL")
+    parser.add_argument("--escala", choices=sorted(ESCALAS), default="prueba")
+    for campo in ESCALAS["prueba"]:
+        parser.add_argument(f"--{campo}", type=int, help=f"Sustituye la cantidad de {campo} de la escala")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=PEDIDOS_POR_LOTE, help="Pedidos por lote")
+    args = parser.parse_args(argumentos)
+
+    escala = dict(ESCALAS[args.escala])
+    for campo in escala:
+        if getattr(args, campo) is not None:
+            escala[campo] = getattr(args, campo)
+
+    destino = DestinoSQLite(args.ruta) if args.destino == "sqlite" else DestinoPostgres(args.dsn)
+    inicio = time.perf_counter()
+
+    def progreso(conteos):
+        print(f"\r{conteos.get('Pedido', 0):,} / {escala['pedidos']:,} pedidos", end="", file=sys.stderr)
+
+    conteos = generar(destino, escala, args.semilla, args.lote, progreso)
+    segundos = time.perf_counter() - inicio
+    print(file=sys.stderr)
+    total = sum(conteos.values())
+    for tabla, filas in conteos.items():
+        print(f"{tabla:<16} {filas:>12,}")
+    print(f"{total:,} filas en {segundos:.1f} s ({total / segundos:,.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# ingesta.py
+#
+# Carga idempotente de pagos (archivos del banco que se vuelven a importar).
+# guardar_transaccion sobrescribe por id; aquí una transacción cuya llave
+# (referencia_bancaria, monto, fecha) ya existe se descarta como duplicada y una
+# con un id ya usado por otro pago se reporta como conflicto, sin tocar la fila.
+# La fecha de la llave es la del banco: una Transaccion creada sin fecha lleva la
+# hora de creación (con microsegundos) y nunca se repetiría, así que se rechaza.
+#
+# Al crear la IngestaTransacciones se cargan en memoria los hashes de las llaves y
+# de los ids existentes. Una transacción que no aparece en ninguno es nueva sin
+# preguntarle a la base; solo las que coinciden se confirman, con una consulta por lote.
+# Si otro proceso escribió después de cargar el prefiltro, el INSERT ... DO NOTHING
+# inserta menos filas de las esperadas y el lote se vuelve a clasificar completo.
+import json
+from itertools import islice
+
+from conexion import conectar
+from init_db import indice_pago_unico
+from modelo import a_centavos
+from persistencia import TAMANO_LOTE, _en_transaccion, _fila_transaccion
+
+# Una fila que choca con el id o con idx_transaccion_unica no rompe el lote: no se inserta
+# y el rowcount lo delata
+SQL_INSERTAR_TRANSACCION = """
+    INSERT INTO Transaccion (
+        id, monto, metodo_pago, factura_id, referencia_bancaria, fecha,
+        estado, fecha_conciliacion, conciliado, timestamp_inicio, timestamp_fin
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+SQL_BUSCAR_LLAVES = """
+    SELECT t.referencia_bancaria, t.monto, t.fecha
+    FROM json_each(?) AS j
+    JOIN Transaccion AS t
+      ON t.referencia_bancaria = json_extract(j.value, '$[0]')
+     AND t.monto = json_extract(j.value, '$[1]')
+     AND t.fecha = json_extract(j.value, '$[2]')
+"""
+
+SQL_BUSCAR_IDS = "SELECT id FROM Transaccion WHERE id IN (SELECT value FROM json_each(?))"
+
+
+def _llave(referencia, monto, fecha):
+    return referencia, a_centavos(monto), fecha
+
+
+class ResultadoIngesta:
+    def __init__(self):
+        self.leidos = 0
+        self.insertados = 0
+        self.duplicados = 0     # La misma llave ya estaba en la base o antes en el archivo
+        self.conflictos = 0     # El id ya existe con otra llave: no se sobrescribe
+        self.sin_fecha = 0      # Sin la fecha del banco no hay llave con que reconocerla
+
+    def __repr__(self):
+        return (f"ResultadoIngesta(leidos={self.leidos}, insertados={self.insertados}, "
+                f"duplicados={self.duplicados}, conflictos={self.conflictos}, sin_fecha={self.sin_fecha})")
+
+
+class IngestaTransacciones:
+    """
+    Prefiltro en memoria para cargar transacciones sin duplicarlas. Se puede
+    reutilizar en varias cargas seguidas: lo insertado se agrega al prefiltro.
+    """
+
+    def __init__(self, conn=None):
+        conn = conn or conectar()
+        self.llaves = set()
+        self.ids = set()
+        # Sin el índice único (base con pagos repetidos, ver init_db) el DO NOTHING no detecta
+        # llaves repetidas: cada lote se confirma completo contra la base
+        self.revisar_todo = not indice_pago_unico(conn)
+        # Solo hashes (enteros): un millón de filas ocupa decenas de MB en lugar de cientos
+        for id_transaccion, referencia, monto, fecha in conn.execute(
+            "SELECT id, referencia_bancaria, monto, fecha FROM Transaccion"
+        ):
+            self.llaves.add(hash(_llave(referencia, monto, fecha)))
+            self.ids.add(hash(id_transaccion))
+
+    def _clasificar(self, conn, filas, todas=False):
+
+        #Regresa (nuevas, duplicadas, conflictos) como listas de posiciones dentro de filas.
+        #Solo las filas que pasan el prefiltro se confirman contra la base, o todas si todas.
+
+        llaves = [_llave(f[4], f[1], f[5]) for f in filas]
+        sospechosas = [
+            i for i, (fila, llave) in enumerate(zip(filas, llaves))
+            if todas or self.revisar_todo or hash(llave) in self.llaves or hash(fila[0]) in self.ids
+        ]
+
+        llaves_en_base = set()
+        ids_en_base = set()
+        if sospechosas:
+            consulta = json.dumps([[filas[i][4], filas[i][1], filas[i][5]] for i in sospechosas])
+            llaves_en_base = {_llave(*fila) for fila in conn.execute(SQL_BUSCAR_LLAVES, (consulta,))}
+            consulta = json.dumps([filas[i][0] for i in sospechosas])
+            ids_en_base = {fila[0] for fila in conn.execute(SQL_BUSCAR_IDS, (consulta,))}
+
+        nuevas, duplicadas, conflictos = [], [], []
+        vistas = set()
+        vistos = set()
+        for i, (fila, llave) in enumerate(zip(filas, llaves)):
+            if llave in llaves_en_base or llave in vistas:
+                duplicadas.append(i)
+            elif fila[0] in ids_en_base or fila[0] in vistos:
+                conflictos.append(i)
+            else:
+                nuevas.append(i)
+                vistas.add(llave)
+                vistos.add(fila[0])
+        return nuevas, duplicadas, conflictos
+
+    def ingestar(self, transacciones, tamano_lote=TAMANO_LOTE, al_rechazar=None, max_intentos=None):
+        """
+        Inserta solo las transacciones nuevas, una transacción de escritura por lote.
+
+        Cada transacción debe traer la fecha del banco (Transaccion(..., fecha=...)).
+        al_rechazar(transaccion, motivo) se llama por cada una que no se insertó,
+        con motivo 'duplicado', 'conflicto' o 'sin_fecha'.
+        """
+        resultado = ResultadoIngesta()
+        transacciones = iter(transacciones)
+        while True:
+            lote = list(islice(transacciones, tamano_lote))
+            if not lote:
+                break
+            resultado.leidos += len(lote)
+            sin_fecha = [t for t in lote if not getattr(t, "fecha_banco", False)]
+            if sin_fecha:
+                lote = [t for t in lote if getattr(t, "fecha_banco", False)]
+                resultado.sin_fecha += len(sin_fecha)
+                if al_rechazar:
+                    for transaccion in sin_fecha:
+                        al_rechazar(transaccion, "sin_fecha")
+            filas = [_fila_transaccion(t) for t in lote]
+
+            def operacion(conn):
+                nuevas, duplicadas, conflictos = self._clasificar(conn, filas)
+                if not nuevas:
+                    return nuevas, duplicadas, conflictos, 0
+                conn.execute("SAVEPOINT ingesta")
+                insertadas = conn.executemany(SQL_INSERTAR_TRANSACCION, [filas[i] for i in nuevas]).rowcount
+                if insertadas < len(nuevas):
+                    # El prefiltro no conocía alguna fila: se deshace y se revisa el lote completo.
+                    # La transacción es de escritura, así que la segunda clasificación es exacta.
+                    conn.execute("ROLLBACK TO ingesta")
+                    nuevas, duplicadas, conflictos = self._clasificar(conn, filas, todas=True)
+                    insertadas = conn.executemany(SQL_INSERTAR_TRANSACCION, [filas[i] for i in nuevas]).rowcount
+                conn.execute("RELEASE ingesta")
+                return nuevas, duplicadas, conflictos, insertadas
+
+            # El prefiltro se actualiza hasta que el lote quedó confirmado
+            nuevas, duplicadas, conflictos, insertadas = _en_transaccion(operacion, max_intentos)
+            for i in nuevas:
+                fila = filas[i]
+                self.llaves.add(hash(_llave(fila[4], fila[1], fila[5])))
+                self.ids.add(hash(fila[0]))
+
+            resultado.insertados += insertadas
+            resultado.duplicados += len(duplicadas)
+            resultado.conflictos += len(conflictos)
+            if al_rechazar:
+                for i in duplicadas:
+                    al_rechazar(lote[i], "duplicado")
+                for i in conflictos:
+                    al_rechazar(lote[i], "conflicto")
+        return resultado
+
+
+def ingestar_transacciones(transacciones, tamano_lote=TAMANO_LOTE, al_rechazar=None, max_intentos=None):
+    """Carga idempotente de una sola vez (crea el prefiltro y lo descarta al terminar)"""
+    return IngestaTransacciones().ingestar(transacciones, tamano_lote, al_rechazar, max_intentos)
@@ -1,8 +1,106 @@
 import sqlite3
 from datetime import datetime
 
-def crear_base_datos():
-    conn = sqlite3.connect('Base_datos.db')
+from archivo import crear_tablas as crear_catalogo_archivo
+from auditoria import crear_tablas as crear_auditoria_facturas
+from latencias import crear_tablas as crear_histograma_conciliacion
+
+# Índices para las consultas frecuentes: nombre -> (tabla, columnas, condición del índice parcial)
+INDICES_RECOMENDADOS = {
+    # Pagos de una factura
+    "idx_transaccion_factura": ("Transaccion", ("factura_id",), None),
+    # La búsqueda por referencia del banco usa el índice único idx_transaccion_unica (ver el esquema)
+    # Transacciones sin conciliar: cubre la carga de pendientes sin leer la tabla
+    # (conciliado va como columna porque SQLite no da por cubiertas las de la condición)
+    "idx_transaccion_pendiente": ("Transaccion", ("referencia_bancaria", "monto", "id", "conciliado"), "conciliado = 0"),
+    # Facturas con saldo (cuentas por cobrar abiertas) por cliente
+    "idx_factura_abierta": ("Factura", ("cliente", "fecha_emision"), "saldo_pendiente > 0"),
+    # Pedidos de un cliente, del más reciente al más antiguo
+    "idx_pedido_cliente_fecha": ("Pedido", ("cliente_id", "fecha"), None),
+}
+
+
+def _sql_indice(nombre, tabla, columnas, condicion):
+    sql = f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla}({', '.join(columnas)})"
+    if condicion:
+        sql += f" WHERE {condicion}"
+    return sql
+
+
+def crear_indices(cursor):
+    for nombre, (tabla, columnas, condicion) in INDICES_RECOMENDADOS.items():
+        cursor.execute(_sql_indice(nombre, tabla, columnas, condicion))
+
+
+def actualizar_estadisticas(conn):
+    # ANALYZE llena sqlite_stat1 para que el planificador elija bien entre índices;
+    # PRAGMA optimize lo repite después solo en las tablas que cambiaron lo suficiente
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+
+def pagos_repetidos(cursor):
+    """Grupos de Transaccion con la misma (referencia_bancaria, monto, fecha) y cuántas filas tiene cada uno"""
+    return cursor.execute("""
+        SELECT referencia_bancaria, monto, fecha, COUNT(*)
+        FROM Transaccion
+        GROUP BY referencia_bancaria, monto, fecha
+        HAVING COUNT(*) > 1
+    """).fetchall()
+
+
+def indice_pago_unico(cursor):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_transaccion_unica'"
+    ).fetchone() is not None
+
+
+def crear_indice_pago_unico(cursor):
+    
+    #Un mismo pago del banco no se puede registrar dos veces (ver ingesta.py).
+    #En una base que ya tiene pagos repetidos el índice único no se puede construir: se avisa
+    #y la base queda sin él hasta depurarlos (ingesta.py revisa entonces cada lote completo).
+    #Regresa True si el índice existe al terminar.
+    
+    if indice_pago_unico(cursor):
+        return True
+    repetidos = pagos_repetidos(cursor)
+    if repetidos:
+        filas = sum(n for *_, n in repetidos)
+        print(f" Aviso: {len(repetidos)} pagos repetidos ({filas} filas) en Transaccion; "
+              "no se creó idx_transaccion_unica. Revisa pagos_repetidos() y vuelve a ejecutar init_db.")
+        return False
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_transaccion_unica ON Transaccion(referencia_bancaria, monto, fecha)"
+    )
+    return True
+
+
+def indices_faltantes(ruta='Base_datos.db'):
+    
+    #Revisa una base existente y regresa {nombre: sql} de los índices recomendados que no tiene.
+    #Un índice con otro nombre cuenta si indexa las mismas columnas en el mismo orden
+    #(y es parcial cuando el recomendado lo es).
+    
+    conn = sqlite3.connect(ruta)
+    try:
+        existentes = set()
+        for tabla in {t for t, _, _ in INDICES_RECOMENDADOS.values()}:
+            for _, nombre, _, _, parcial in conn.execute(f"PRAGMA index_list({tabla})"):
+                columnas = tuple(fila[2] for fila in conn.execute(f"PRAGMA index_info({nombre})"))
+                existentes.add((tabla, columnas, bool(parcial)))
+
+        faltantes = {}
+        for nombre, (tabla, columnas, condicion) in INDICES_RECOMENDADOS.items():
+            if (tabla, columnas, condicion is not None) not in existentes:
+                faltantes[nombre] = _sql_indice(nombre, tabla, columnas, condicion)
+        return faltantes
+    finally:
+        conn.close()
+
+
+def crear_base_datos(ruta='Base_datos.db'):
+    conn = sqlite3.connect(ruta)
     cursor = conn.cursor()
 
     # PRIMERO: Crear tablas sin dependencias
@@ -103,6 +201,7 @@ def crear_base_datos():
     -- Índice para Factura
     CREATE UNIQUE INDEX IF NOT EXISTS idx_factura_pedido ON Factura(pedido_id);
     """)
+    crear_indice_pago_unico(cursor)
 
     # CUARTO: Tablas con relaciones complejas
     cursor.executescript("""
@@ -162,6 +261,92 @@ def crear_base_datos():
     );
     """)
 
+    # QUINTO: Libro de pagos (montos en centavos enteros para evitar errores de redondeo)
+    cursor.executescript("""
+    -- Tabla Pago: un renglón por cada pago parcial o total de una factura
+    CREATE TABLE IF NOT EXISTS Pago (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        factura_id TEXT NOT NULL REFERENCES Factura(id),
+        transaccion_id TEXT REFERENCES Transaccion(id),
+        monto_centavos INTEGER NOT NULL CHECK (monto_centavos > 0),
+        saldo_resultante_centavos INTEGER NOT NULL CHECK (saldo_resultante_centavos >= 0),
+        fecha TEXT NOT NULL,
+        comprobante TEXT
+    );
+
+    -- Tabla SaldoFactura: saldo corriente, se actualiza en la misma transacción que cada Pago
+    CREATE TABLE IF NOT EXISTS SaldoFactura (
+        factura_id TEXT PRIMARY KEY REFERENCES Factura(id),
+        total_centavos INTEGER NOT NULL,
+        pagado_centavos INTEGER NOT NULL DEFAULT 0,
+        saldo_centavos INTEGER NOT NULL CHECK (saldo_centavos >= 0),
+        num_pagos INTEGER NOT NULL DEFAULT 0,
+        ultimo_pago TEXT
+    );
+
+    -- Historial de pagos de una factura en orden, sin recorrer toda la tabla
+    CREATE INDEX IF NOT EXISTS idx_pago_factura ON Pago(factura_id, id);
+
+    -- Facturas con pago parcial (pagadas en parte y con saldo pendiente)
+    CREATE INDEX IF NOT EXISTS idx_saldo_parcial ON SaldoFactura(ultimo_pago)
+        WHERE pagado_centavos > 0 AND saldo_centavos > 0;
+
+    -- Un saldo de Factura escrito fuera de registrar_pago (Factura.registrar_pago y luego
+    -- guardar_factura, guardar_facturas, SQL directo) también pasa por el libro: la baja se
+    -- registra como Pago y SaldoFactura queda igual a la Factura. registrar_pago actualiza
+    -- SaldoFactura antes que la Factura, así que su propio UPDATE ya coincide y no se duplica.
+    DROP TRIGGER IF EXISTS trg_factura_saldo_libro;
+    CREATE TRIGGER trg_factura_saldo_libro
+    AFTER UPDATE OF saldo_pendiente, total ON Factura
+    WHEN (NEW.saldo_pendiente IS NOT OLD.saldo_pendiente OR NEW.total IS NOT OLD.total)
+     AND CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER)
+         IS NOT (SELECT saldo_centavos FROM SaldoFactura WHERE factura_id = NEW.id)
+    BEGIN
+        -- Primer movimiento de la factura: el libro parte del saldo anterior. Sin OR IGNORE,
+        -- porque dentro de un trigger lo reemplaza la política de conflicto del UPDATE externo.
+        INSERT INTO SaldoFactura (factura_id, total_centavos, pagado_centavos, saldo_centavos)
+        SELECT OLD.id,
+               CAST(ROUND(OLD.total * 100) AS INTEGER),
+               CAST(ROUND((OLD.total - OLD.saldo_pendiente) * 100) AS INTEGER),
+               CAST(ROUND(OLD.saldo_pendiente * 100) AS INTEGER)
+        WHERE NOT EXISTS (SELECT 1 FROM SaldoFactura WHERE factura_id = OLD.id);
+
+        INSERT INTO Pago (factura_id, monto_centavos, saldo_resultante_centavos, fecha, comprobante)
+        SELECT NEW.id,
+               s.saldo_centavos - CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER),
+               CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER),
+               strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'),
+               NEW.comprobante_pago
+        FROM SaldoFactura AS s
+        WHERE s.factura_id = NEW.id AND s.saldo_centavos > CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER);
+
+        -- Las expresiones del SET ven el saldo de antes
+        UPDATE SaldoFactura SET
+            num_pagos = num_pagos + (saldo_centavos > CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER)),
+            ultimo_pago = CASE
+                WHEN saldo_centavos > CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER)
+                THEN strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')
+                ELSE ultimo_pago
+            END,
+            total_centavos = CAST(ROUND(NEW.total * 100) AS INTEGER),
+            pagado_centavos = CAST(ROUND((NEW.total - NEW.saldo_pendiente) * 100) AS INTEGER),
+            saldo_centavos = CAST(ROUND(NEW.saldo_pendiente * 100) AS INTEGER)
+        WHERE factura_id = NEW.id;
+    END;
+    """)
+
+    # SEXTO: Histograma de tiempos de conciliación (lo llenan triggers sobre Transaccion)
+    crear_histograma_conciliacion(cursor)
+
+    # SÉPTIMO: Índices de rendimiento
+    crear_indices(cursor)
+
+    # OCTAVO: Catálogo de facturas movidas al archivo en frío
+    crear_catalogo_archivo(cursor)
+
+    # NOVENO: Bitácora de cambios de Factura con fotos periódicas (la llenan triggers)
+    crear_auditoria_facturas(cursor)
+
     # DATOS INICIALES DE PRUEBA (versión simplificada)
     fecha_actual = datetime.now().strftime('%Y-%m-%d')
 
@@ -208,6 +393,7 @@ def crear_base_datos():
     )
 
     conn.commit()
+    actualizar_estadisticas(conn)
     conn.close()
 
     print(" Base de datos creada exitosamente con todas las tablas")
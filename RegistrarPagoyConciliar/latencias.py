@@ -0,0 +1,146 @@
+# latencias.py
+from bisect import bisect_right
+
+from conexion import conectar
+
+# Límites superiores (segundos) de las cubetas del histograma de tiempo de conciliación.
+# Crecen en potencias de raíz de 2: desde 1 segundo hasta ~68 días con 46 cubetas,
+# con un error relativo máximo de ~41% antes de interpolar.
+LIMITES_CUBETAS = [round(2 ** (i / 2), 3) for i in range(46)]
+
+PERCENTILES = (50, 95, 99)
+
+
+def cubeta_de(segundos):
+    """Número de cubeta para una latencia; coincide con la expresión SQL del trigger"""
+    return bisect_right(LIMITES_CUBETAS, segundos)
+
+
+def _expresion_cubeta(columna):
+    casos = " ".join(f"WHEN {columna} < {limite} THEN {i}" for i, limite in enumerate(LIMITES_CUBETAS))
+    return f"CASE {casos} ELSE {len(LIMITES_CUBETAS)} END"
+
+
+def crear_tablas(cursor):
+
+    #Crea el histograma incremental y los triggers que lo alimentan.
+    #Cada transacción que pasa a conciliada suma 1 a su cubeta (metodo_pago, día, latencia)
+    #en la misma transacción que la marca, así los reportes nunca recorren el historial.
+
+    latencia = "(NEW.timestamp_fin - NEW.timestamp_inicio)"
+    insertar = f"""
+        INSERT INTO HistogramaConciliacion (metodo_pago, dia, cubeta, cantidad)
+        VALUES (
+            NEW.metodo_pago,
+            date(NEW.timestamp_fin, 'unixepoch', 'localtime'),
+            {_expresion_cubeta(latencia)},
+            1
+        )
+        ON CONFLICT(metodo_pago, dia, cubeta) DO UPDATE SET cantidad = cantidad + 1;
+    """
+    cursor.executescript(f"""
+    -- Tabla HistogramaConciliacion: cuántas transacciones se conciliaron por cubeta de latencia
+    CREATE TABLE IF NOT EXISTS HistogramaConciliacion (
+        metodo_pago TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        cubeta INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (metodo_pago, dia, cubeta)
+    ) WITHOUT ROWID;
+
+    -- Transacción guardada directamente como conciliada
+    CREATE TRIGGER IF NOT EXISTS trg_histograma_insert
+    AFTER INSERT ON Transaccion
+    WHEN NEW.conciliado = 1 AND NEW.timestamp_inicio IS NOT NULL AND NEW.timestamp_fin IS NOT NULL
+    BEGIN
+        {insertar}
+    END;
+
+    -- Transacción pendiente que se concilia
+    CREATE TRIGGER IF NOT EXISTS trg_histograma_update
+    AFTER UPDATE OF conciliado ON Transaccion
+    WHEN NEW.conciliado = 1 AND COALESCE(OLD.conciliado, 0) = 0
+         AND NEW.timestamp_inicio IS NOT NULL AND NEW.timestamp_fin IS NOT NULL
+    BEGIN
+        {insertar}
+    END;
+    """)
+
+
+def reconstruir_histograma(conn=None):
+    """Recalcula el histograma desde cero con las transacciones ya conciliadas (solo para migrar bases existentes)"""
+    conn = conn or conectar()
+    with conn:
+        conn.execute("DELETE FROM HistogramaConciliacion")
+        conn.execute(f"""
+            INSERT INTO HistogramaConciliacion (metodo_pago, dia, cubeta, cantidad)
+            SELECT metodo_pago,
+                   date(timestamp_fin, 'unixepoch', 'localtime') AS dia,
+                   {_expresion_cubeta('(timestamp_fin - timestamp_inicio)')} AS cubeta,
+                   COUNT(*)
+            FROM Transaccion
+            WHERE conciliado = 1 AND timestamp_inicio IS NOT NULL AND timestamp_fin IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+
+
+def _percentil(conteos, total, p):
+    # Interpolación lineal dentro de la cubeta donde cae el percentil
+    objetivo = total * p / 100
+    acumulado = 0
+    for cubeta in sorted(conteos):
+        cantidad = conteos[cubeta]
+        if acumulado + cantidad >= objetivo:
+            inferior = LIMITES_CUBETAS[cubeta - 1] if cubeta > 0 else 0.0
+            superior = LIMITES_CUBETAS[cubeta] if cubeta < len(LIMITES_CUBETAS) else inferior
+            fraccion = (objetivo - acumulado) / cantidad if cantidad else 0
+            return inferior + (superior - inferior) * fraccion
+        acumulado += cantidad
+    return None
+
+
+def percentiles_conciliacion(agrupar_por=("metodo_pago",), desde=None, hasta=None, conn=None):
+
+    #Tiempo de conciliación (segundos) p50/p95/p99 por grupo, leyendo solo el histograma.
+    #agrupar_por puede ser ("metodo_pago",), ("dia",) o ("metodo_pago", "dia").
+    #desde/hasta son fechas 'YYYY-MM-DD' inclusivas.
+
+    if not agrupar_por or any(c not in ("metodo_pago", "dia") for c in agrupar_por):
+        raise ValueError("Solo se puede agrupar por metodo_pago y/o dia")
+
+    conn = conn or conectar()
+    columnas = ", ".join(agrupar_por)
+    condiciones, parametros = [], []
+    if desde is not None:
+        condiciones.append("dia >= ?")
+        parametros.append(str(desde))
+    if hasta is not None:
+        condiciones.append("dia <= ?")
+        parametros.append(str(hasta))
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    grupos = {}
+    for fila in conn.execute(f"""
+        SELECT {columnas}, cubeta, SUM(cantidad)
+        FROM HistogramaConciliacion
+        {where}
+        GROUP BY {columnas}, cubeta
+    """, parametros):
+        clave = fila[:-2] if len(agrupar_por) > 1 else fila[0]
+        grupos.setdefault(clave, {})[fila[-2]] = fila[-1]
+
+    reporte = {}
+    for clave, conteos in sorted(grupos.items()):
+        total = sum(conteos.values())
+        reporte[clave] = {"n": total}
+        for p in PERCENTILES:
+            reporte[clave][f"p{p}"] = _percentil(conteos, total, p)
+    return reporte
+
+
+def reporte_por_metodo(desde=None, hasta=None):
+    return percentiles_conciliacion(("metodo_pago",), desde, hasta)
+
+
+def reporte_por_dia(desde=None, hasta=None):
+    return percentiles_conciliacion(("dia",), desde, hasta)
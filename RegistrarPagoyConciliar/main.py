@@ -1,12 +1,23 @@
+from conexion import conectar
+from identificadores import nuevo_id
 from modelo import Factura
 from persistencia import guardar_factura
 
+# Pedido de ejemplo: cada corrida usa uno nuevo porque un pedido solo admite una factura
+pedido_id = nuevo_id()
+conn = conectar()
+conn.execute(
+    "INSERT INTO Pedido (id, cliente_id, fecha, estado) VALUES (?, 'CLI-001', date('now'), 'ENTREGADO')",
+    (pedido_id,)
+)
+conn.commit()
+
 # Crear y guardar factura
-factura = Factura("FAC-001", "PED-001", 1500.50)
+factura = Factura.nueva(pedido_id, 1500.50, "CLI-001")
 guardar_factura(factura)
 
 # Ejemplo de pago
-factura.marcar_como_pagada()
+factura.registrar_pago(factura.total)
 guardar_factura(factura)
 
 print("Operación completada exitosamente")
\ No newline at end of file
@@ -1,8 +1,59 @@
 # modelo.py
+import re
+import time
 from enum import Enum
 from datetime import datetime
+from decimal import Decimal
 from typing import Optional
 
+from identificadores import nuevo_id
+
+def a_centavos(valor) -> Optional[int]:
+    """
+    Convierte '1,234.50', '1.234,50', '1234,5', 1234.5 o Decimal a centavos enteros.
+    Regresa None si no es un monto o si trae más de dos decimales (no se redondea).
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        try:
+            # Con dos decimales, float * 100 redondeado es exacto para cualquier monto realista
+            return int(round(valor * 100))
+        except (ValueError, OverflowError):
+            return None
+    if isinstance(valor, str):
+        valor = _normalizar_monto(valor)
+        if valor is None:
+            return None
+    try:
+        monto = Decimal(valor)
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+    if not monto.is_finite() or monto.as_tuple().exponent < -2:
+        return None
+    return int(monto * 100)
+
+# Solo comas de miles: '1,234' o '12,345,678'
+_MILES_CON_COMA = re.compile(r"[+-]?\d{1,3}(,\d{3})+")
+
+def _normalizar_monto(texto):
+    # Deja el texto con punto decimal y sin separadores de miles, o None si es ambiguo
+    texto = texto.strip().replace(" ", "")
+    if "," in texto and "." in texto:
+        # El último separador es el decimal; el otro es de miles
+        decimal, miles = (",", ".") if texto.rfind(",") > texto.rfind(".") else (".", ",")
+        entero, _, fraccion = texto.rpartition(decimal)
+        if not re.fullmatch(r"[+-]?\d{1,3}(%s\d{3})*" % re.escape(miles), entero):
+            return None
+        return entero.replace(miles, "") + "." + fraccion
+    if "," in texto:
+        if _MILES_CON_COMA.fullmatch(texto):
+            return texto.replace(",", "")
+        if texto.count(",") > 1:
+            return None
+        return texto.replace(",", ".")  # Coma decimal
+    return texto
+
 class EstadoFactura(Enum):
     PENDIENTE = 'PENDIENTE'
     PAGADA_PARCIAL = 'PAGADA_PARCIAL'
@@ -21,17 +72,24 @@ class Factura:
         self.fecha_pago = None
         self.comprobante_pago = None
 
+    @classmethod
+    def nueva(cls, pedido_id: str, total: float, cliente: str) -> "Factura":
+        """Factura con un id nuevo ordenado por tiempo"""
+        return cls(nuevo_id(), pedido_id, total, cliente)
+
     def registrar_pago(self, monto: float, comprobante: Optional[str] = None):
         if monto <= 0:
             raise ValueError("El monto debe ser positivo")
             
-        if monto > self.saldo_pendiente:
+        # Se resta en centavos para que varios pagos parciales no acumulen error de redondeo
+        saldo_centavos = a_centavos(self.saldo_pendiente) - a_centavos(monto)
+        if saldo_centavos < 0:
             raise ValueError("El pago excede el saldo pendiente")
         
-        self.saldo_pendiente -= monto
+        self.saldo_pendiente = saldo_centavos / 100
         self.comprobante_pago = comprobante
         
-        if self.saldo_pendiente == 0:
+        if saldo_centavos == 0:
             self.estado = EstadoFactura.PAGADA
         else:
             self.estado = EstadoFactura.PAGADA_PARCIAL
@@ -39,17 +97,30 @@ class Factura:
         self.fecha_pago = datetime.now().date()
 
 class Transaccion:
-    def __init__(self, id_transaccion: str, monto: float, metodo_pago: str, factura_id: str, referencia_bancaria: str):
+    def __init__(self, id_transaccion: str, monto: float, metodo_pago: str, factura_id: str, referencia_bancaria: str,
+                 fecha: Optional[datetime] = None):
         self.id = id_transaccion
         self.monto = monto
         self.metodo_pago = metodo_pago
         self.factura_id = factura_id
         self.referencia_bancaria = referencia_bancaria
-        self.fecha = datetime.now()
+        # Fecha de la operación según el banco; sin ella, el momento en que se creó el objeto
+        self.fecha = fecha if fecha is not None else datetime.now()
+        self.fecha_banco = fecha is not None
         self.estado = 'PENDIENTE'
         self.conciliado = False
+        # Segundos desde epoch: su diferencia es el tiempo que tardó en conciliarse
+        self.timestamp_inicio = time.time()
+        self.timestamp_fin = None
+
+    @classmethod
+    def nueva(cls, monto: float, metodo_pago: str, factura_id: str, referencia_bancaria: str,
+              fecha: Optional[datetime] = None) -> "Transaccion":
+        """Transacción con un id nuevo ordenado por tiempo"""
+        return cls(nuevo_id(), monto, metodo_pago, factura_id, referencia_bancaria, fecha)
 
     def conciliar(self):
         self.estado = 'CONCILIADA'
         self.conciliado = True
         self.fecha_conciliacion = datetime.now()
+        self.timestamp_fin = time.time()
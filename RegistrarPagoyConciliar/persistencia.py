@@ -1,109 +1,349 @@
 # persistencia.py
 from conexion import conectar
-from datetime import date
+from modelo import EstadoFactura, a_centavos
+from datetime import date, datetime
+from itertools import islice
+import random
 import time
 import sqlite3
 
-def guardar_factura(factura):
-    
-    #Guarda o actualiza una factura en la base de datos con manejo de reintentos.
+# Máximo número de intentos cuando la base está bloqueada
+MAX_INTENTOS = 5
+# Backoff exponencial con jitter: la espera del intento n es aleatoria en [0, min(ESPERA_MAXIMA, ESPERA_BASE * 2**n)]
+ESPERA_BASE = 0.05
+ESPERA_MAXIMA = 2.0
+
+# Filas por executemany en los guardados por lote
+TAMANO_LOTE = 500
+
+# Upsert en lugar de INSERT OR REPLACE: REPLACE borra y vuelve a insertar la fila, así que
+# no dispararía los triggers de UPDATE del histograma de conciliación (ver latencias.py)
+SQL_GUARDAR_TRANSACCION = """
+    INSERT INTO Transaccion (
+        id, monto, metodo_pago, factura_id, referencia_bancaria, fecha,
+        estado, fecha_conciliacion, conciliado, timestamp_inicio, timestamp_fin
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        monto = excluded.monto,
+        metodo_pago = excluded.metodo_pago,
+        factura_id = excluded.factura_id,
+        referencia_bancaria = excluded.referencia_bancaria,
+        fecha = excluded.fecha,
+        estado = excluded.estado,
+        fecha_conciliacion = excluded.fecha_conciliacion,
+        conciliado = excluded.conciliado,
+        timestamp_inicio = COALESCE(Transaccion.timestamp_inicio, excluded.timestamp_inicio),
+        timestamp_fin = excluded.timestamp_fin
+"""
+
+SQL_GUARDAR_FACTURA = """
+    INSERT INTO Factura (
+        id, pedido_id, fecha_emision, total, saldo_pendiente,
+        cliente, estado, fecha_pago, comprobante_pago
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        pedido_id = excluded.pedido_id,
+        fecha_emision = excluded.fecha_emision,
+        total = excluded.total,
+        saldo_pendiente = excluded.saldo_pendiente,
+        cliente = excluded.cliente,
+        estado = excluded.estado,
+        fecha_pago = excluded.fecha_pago,
+        comprobante_pago = excluded.comprobante_pago
+"""
+
+def _fila_factura(factura):
+    return (
+        factura.id,
+        factura.pedido_id,
+        factura.fecha_emision.isoformat(),  # Fecha en formato ISO
+        factura.total,
+        factura.saldo_pendiente,
+        factura.cliente,
+        factura.estado.value,  ## Valor del Enum EstadoFactura
+        factura.fecha_pago.isoformat() if factura.fecha_pago else None,
+        factura.comprobante_pago
+    )
+
+def _fila_transaccion(transaccion):
+    return (
+        transaccion.id,
+        transaccion.monto,
+        transaccion.metodo_pago,
+        transaccion.factura_id,
+        transaccion.referencia_bancaria,
+        transaccion.fecha.isoformat(),
+        transaccion.estado,
+        # Manejo condicional de fecha_conciliacion
+        transaccion.fecha_conciliacion.isoformat() if hasattr(transaccion, 'fecha_conciliacion') else None,
+        int(transaccion.conciliado),    # Convertir booleano a entero (SQLite no tiene booleano nativo)
+        getattr(transaccion, 'timestamp_inicio', None),
+        getattr(transaccion, 'timestamp_fin', None)
+    )
+
+def _es_bloqueo(error):
+    mensaje = str(error)
+    return "locked" in mensaje or "busy" in mensaje
+
+def _esperar_reintento(intento):
+    # El jitter evita que varias cajas bloqueadas reintenten al mismo tiempo
+    time.sleep(random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento)))
+
+def _iniciar_escritura(conn):
     
+    #BEGIN IMMEDIATE toma el candado de escritura desde el inicio: si hay contención
+    #falla aquí (y se reintenta) en lugar de fallar al hacer COMMIT.
+    #La conexión es compartida por hilo: si quien llama ya tiene una transacción abierta,
+    #su trabajo no se toca; la escritura va anidada en un SAVEPOINT y el COMMIT le toca a él.
+    #Regresa True si la transacción es propia (hay que confirmarla aquí).
     
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT escritura")
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    return True
+
+def _confirmar(conn, propia):
+    if propia:
+        conn.commit()
+    else:
+        conn.execute("RELEASE SAVEPOINT escritura")
+
+def _deshacer(conn, propia):
+    # Solo se deshace lo que hizo esta escritura, nunca la transacción de quien llama
+    if propia:
+        if conn.in_transaction:
+            conn.rollback()
+    elif conn.in_transaction:
+        conn.execute("ROLLBACK TO SAVEPOINT escritura")
+        conn.execute("RELEASE SAVEPOINT escritura")
+
+def _en_transaccion(operacion, max_intentos=None):
     
-    max_intentos = 3    # Máximo número de intentos
-    intento = 0         # Contador de intentos
+    #Ejecuta operacion(conn) dentro de una transacción de escritura con manejo de reintentos.
+    #Todo lo que haga operacion se confirma junto o no se confirma; regresa lo que regrese operacion.
     
+    max_intentos = max_intentos or MAX_INTENTOS
+    intento = 0
+
     while intento < max_intentos:
+        conn = conectar()
+        propia = None
         try:
-            with conectar() as conn:
-                cursor = conn.cursor()
-                
-                # Query SQL para insertar o reemplazar la factura
-                cursor.execute("SELECT id FROM Factura WHERE id = ?", (factura.id,))
-                if cursor.fetchone() is None:
-                    # Insertar nueva factura
-                    cursor.execute("""
-                        INSERT INTO Factura VALUES
-                        (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        factura.id, 
-                        factura.pedido_id,
-                        factura.fecha_emision.isoformat(),  # Fecha en formato ISO
-                        factura.total,
-                        factura.saldo_pendiente,
-                        factura.cliente,
-                        factura.estado.value,  ## Valor del Enum EstadoFactura
-                        factura.fecha_pago.isoformat() if factura.fecha_pago else None,
-                        factura.comprobante_pago
-                    ))
-                else:
-                    # Actualizar factura existente
-                    cursor.execute("""
-                        UPDATE Factura SET
-                            pedido_id = ?,
-                            fecha_emision = ?,
-                            total = ?,
-                            saldo_pendiente = ?,
-                            cliente = ?,
-                            estado = ?,
-                            fecha_pago = ?,
-                            comprobante_pago = ?
-                        WHERE id = ?
-                    """, (
-                        factura.pedido_id,
-                        factura.fecha_emision.isoformat(),
-                        factura.total,
-                        factura.saldo_pendiente,
-                        factura.cliente,
-                        factura.estado.value,
-                        factura.fecha_pago.isoformat() if factura.fecha_pago else None,
-                        factura.comprobante_pago,
-                        factura.id
-                    ))
-                conn.commit()
-                return
-                
+            propia = _iniciar_escritura(conn)
+            resultado = operacion(conn)
+            _confirmar(conn, propia)
+            return resultado
         except sqlite3.OperationalError as e:
-            if "locked" in str(e) and intento < max_intentos - 1:
-                time.sleep(0.1 * (intento + 1))
+            if propia is not None:
+                _deshacer(conn, propia)
+            if _es_bloqueo(e) and intento < max_intentos - 1:
+                _esperar_reintento(intento)
                 intento += 1
                 continue
             raise
+        except BaseException:
+            if propia is not None:
+                _deshacer(conn, propia)
+            raise
+
+def _escribir(sql, parametros, max_intentos=None):
+    
+    #Ejecuta una sola sentencia de escritura en su propia transacción con manejo de reintentos.
+    
+    _en_transaccion(lambda conn: conn.execute(sql, parametros), max_intentos)
+
+def guardar_factura(factura, max_intentos=None):
+    
+    #Guarda o actualiza una factura en la base de datos con manejo de reintentos.
+    #Un solo INSERT ... ON CONFLICT(id) DO UPDATE: sin SELECT previo ni carrera entre la consulta y la escritura.
+    
+    _escribir(SQL_GUARDAR_FACTURA, _fila_factura(factura), max_intentos)
 
-def guardar_transaccion(transaccion):
+def guardar_transaccion(transaccion, max_intentos=None):
     
     #Guarda o actualiza una transacción de pago en la base de datos con manejo de reintentos.
     
-    max_intentos = 3
-    intento = 0
+    _escribir(SQL_GUARDAR_TRANSACCION, _fila_transaccion(transaccion), max_intentos)
+
+def _guardar_en_lotes(operaciones, tamano_lote, max_intentos=None):
     
-    while intento < max_intentos:
+    #Escribe todas las filas en una sola transacción, con un executemany por lote.
+    #operaciones es una lista de (sql, filas) que se aplican en ese orden.
+    #Cada lote va dentro de un SAVEPOINT: si la base está bloqueada solo se repite ese lote.
+    #Regresa las filas que cambiaron (rowcount), no las que se enviaron.
+    
+    if tamano_lote < 1:
+        raise ValueError("El tamaño de lote debe ser positivo")
+
+    max_intentos = max_intentos or MAX_INTENTOS
+    conn = conectar()
+    total = 0
+
+    intento = 0
+    while True:
         try:
-            with conectar() as conn:
-                cursor = conn.cursor()
-                # Query para insertar o actualizar transacción
-                cursor.execute("""
-                    INSERT OR REPLACE INTO Transaccion VALUES
-                    (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    transaccion.id,
-                    transaccion.monto,
-                    transaccion.metodo_pago,
-                    transaccion.factura_id,
-                    transaccion.referencia_bancaria,
-                    transaccion.fecha.isoformat(),
-                    transaccion.estado,
-                    # Manejo condicional de fecha_conciliacion
-                    transaccion.fecha_conciliacion.isoformat() if hasattr(transaccion, 'fecha_conciliacion') else None,
-                    int(transaccion.conciliado),    # Convertir booleano a entero (SQLite no tiene booleano nativo)
-                    None,  # timestamp_inicio
-                    None   # timestamp_fin
-                ))
-                conn.commit()
-                return
+            propia = _iniciar_escritura(conn)
+            break
         except sqlite3.OperationalError as e:
-            if "locked" in str(e) and intento < max_intentos - 1:
-                time.sleep(0.1 * (intento + 1))
+            if _es_bloqueo(e) and intento < max_intentos - 1:
+                _esperar_reintento(intento)
                 intento += 1
                 continue
             raise
+
+    try:
+        for sql, filas in operaciones:
+            filas = iter(filas)
+            while True:
+                lote = list(islice(filas, tamano_lote))
+                if not lote:
+                    break
+
+                intento = 0
+                while True:
+                    conn.execute("SAVEPOINT lote")
+                    try:
+                        cambiadas = conn.executemany(sql, lote).rowcount
+                        conn.execute("RELEASE SAVEPOINT lote")
+                        break
+                    except sqlite3.OperationalError as e:
+                        conn.execute("ROLLBACK TO SAVEPOINT lote")
+                        conn.execute("RELEASE SAVEPOINT lote")
+                        if _es_bloqueo(e) and intento < max_intentos - 1:
+                            _esperar_reintento(intento)
+                            intento += 1
+                            continue
+                        raise
+                total += cambiadas
+
+        if not propia:
+            _confirmar(conn, propia)
+            return total
+
+        # El COMMIT también puede encontrar la base ocupada; la transacción sigue abierta y se reintenta
+        intento = 0
+        while True:
+            try:
+                conn.commit()
+                return total
+            except sqlite3.OperationalError as e:
+                if _es_bloqueo(e) and intento < max_intentos - 1:
+                    _esperar_reintento(intento)
+                    intento += 1
+                    continue
+                raise
+    except BaseException:
+        _deshacer(conn, propia)
+        raise
+
+def guardar_facturas(facturas, tamano_lote=TAMANO_LOTE, max_intentos=None):
+    """Guarda o actualiza muchas facturas en una sola transacción. Regresa cuántas se escribieron."""
+    return _guardar_en_lotes([(SQL_GUARDAR_FACTURA, (_fila_factura(f) for f in facturas))], tamano_lote, max_intentos)
+
+def guardar_transacciones(transacciones, tamano_lote=TAMANO_LOTE, max_intentos=None):
+    """Guarda o actualiza muchas transacciones en una sola transacción. Regresa cuántas se escribieron."""
+    return _guardar_en_lotes([(SQL_GUARDAR_TRANSACCION, (_fila_transaccion(t) for t in transacciones))], tamano_lote, max_intentos)
+
+
+# ---------------------------------------------------------------------------
+# Libro de pagos: cada pago parcial queda en la tabla Pago y el saldo corriente
+# en SaldoFactura, ambos en centavos y en la misma transacción. Un saldo guardado con
+# guardar_factura después de Factura.registrar_pago llega al libro por el trigger
+# trg_factura_saldo_libro (init_db.py).
+# ---------------------------------------------------------------------------
+
+def _abrir_saldo(conn, factura_id):
+    # La primera vez que se paga una factura su saldo parte de lo que ya tenía la tabla Factura
+    conn.execute("""
+        INSERT OR IGNORE INTO SaldoFactura (factura_id, total_centavos, pagado_centavos, saldo_centavos)
+        SELECT id,
+               CAST(ROUND(total * 100) AS INTEGER),
+               CAST(ROUND((total - saldo_pendiente) * 100) AS INTEGER),
+               CAST(ROUND(saldo_pendiente * 100) AS INTEGER)
+        FROM Factura WHERE id = ?
+    """, (factura_id,))
+
+def registrar_pago(factura, monto, comprobante=None, transaccion_id=None, max_intentos=None):
+    
+    #Registra un pago (parcial o total) de la factura en el libro de pagos.
+    #Inserta el Pago, descuenta el saldo corriente y actualiza la Factura en una sola transacción,
+    #de modo que el historial de pagos parciales ya no se pierde al sobrescribir comprobante_pago.
+    #Actualiza también el objeto factura y regresa el id del Pago.
+    
+    monto_centavos = a_centavos(monto)
+    if monto_centavos is None or monto_centavos <= 0:
+        raise ValueError("El monto debe ser positivo")
+
+    def operacion(conn):
+        _abrir_saldo(conn, factura.id)
+        ahora = datetime.now()
+
+        # Solo descuenta si alcanza el saldo: la validación y la escritura son atómicas
+        cursor = conn.execute("""
+            UPDATE SaldoFactura SET
+                pagado_centavos = pagado_centavos + ?,
+                saldo_centavos = saldo_centavos - ?,
+                num_pagos = num_pagos + 1,
+                ultimo_pago = ?
+            WHERE factura_id = ? AND saldo_centavos >= ?
+        """, (monto_centavos, monto_centavos, ahora.isoformat(), factura.id, monto_centavos))
+        if cursor.rowcount == 0:
+            existe = conn.execute("SELECT 1 FROM SaldoFactura WHERE factura_id = ?", (factura.id,)).fetchone()
+            if existe is None:
+                raise ValueError(f"La factura {factura.id} no existe")
+            raise ValueError("El pago excede el saldo pendiente")
+
+        saldo_centavos, = conn.execute(
+            "SELECT saldo_centavos FROM SaldoFactura WHERE factura_id = ?", (factura.id,)
+        ).fetchone()
+
+        pago_id = conn.execute("""
+            INSERT INTO Pago (factura_id, transaccion_id, monto_centavos, saldo_resultante_centavos, fecha, comprobante)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (factura.id, transaccion_id, monto_centavos, saldo_centavos, ahora.isoformat(), comprobante)).lastrowid
+
+        estado = EstadoFactura.PAGADA if saldo_centavos == 0 else EstadoFactura.PAGADA_PARCIAL
+        conn.execute("""
+            UPDATE Factura SET saldo_pendiente = ?, estado = ?, fecha_pago = ?, comprobante_pago = ?
+            WHERE id = ?
+        """, (saldo_centavos / 100, estado.value, ahora.date().isoformat(), comprobante, factura.id))
+        return pago_id, saldo_centavos, estado, ahora
+
+    pago_id, saldo_centavos, estado, ahora = _en_transaccion(operacion, max_intentos)
+
+    factura.saldo_pendiente = saldo_centavos / 100
+    factura.estado = estado
+    factura.fecha_pago = ahora.date()
+    factura.comprobante_pago = comprobante
+    return pago_id
+
+def saldo_factura(factura_id):
+    
+    #Saldo corriente de una factura en centavos: búsqueda directa por llave primaria.
+    #Regresa None si la factura todavía no tiene pagos en el libro.
+    
+    fila = conectar().execute("""
+        SELECT total_centavos, pagado_centavos, saldo_centavos, num_pagos, ultimo_pago
+        FROM SaldoFactura WHERE factura_id = ?
+    """, (factura_id,)).fetchone()
+    if fila is None:
+        return None
+    return dict(zip(("total_centavos", "pagado_centavos", "saldo_centavos", "num_pagos", "ultimo_pago"), fila))
+
+def pagos_factura(factura_id):
+    """Historial de pagos de una factura en el orden en que se registraron"""
+    return conectar().execute("""
+        SELECT id, transaccion_id, monto_centavos, saldo_resultante_centavos, fecha, comprobante
+        FROM Pago WHERE factura_id = ? ORDER BY id
+    """, (factura_id,)).fetchall()
+
+def facturas_con_pago_parcial(limite=100):
+    """Facturas pagadas en parte, de la más reciente a la más antigua (usa idx_saldo_parcial)"""
+    return conectar().execute("""
+        SELECT factura_id, total_centavos, pagado_centavos, saldo_centavos, num_pagos, ultimo_pago
+        FROM SaldoFactura
+        WHERE pagado_centavos > 0 AND saldo_centavos > 0
+        ORDER BY ultimo_pago DESC
+        LIMIT ?
+    """, (limite,)).fetchall()
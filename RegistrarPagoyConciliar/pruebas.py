@@ -24,6 +24,18 @@ def mostrar_estructura_tablas():
         if conn:
             conn.close()
 
+def limpiar_pedido(conn, pedido_id):
+
+    #Borra la factura de una corrida anterior (y sus pagos): los ids son nuevos en cada
+    #corrida, así que se busca por pedido, que solo puede tener una factura.
+
+    cursor = conn.cursor()
+    facturas = "SELECT id FROM Factura WHERE pedido_id = ?"
+    for tabla in ("Transaccion", "Pago", "SaldoFactura"):
+        cursor.execute(f"DELETE FROM {tabla} WHERE factura_id IN ({facturas})", (pedido_id,))
+    cursor.execute("DELETE FROM Factura WHERE pedido_id = ?", (pedido_id,))
+    conn.commit()
+
 def configurar_datos_iniciales(conn):
     
     #Configura datos básicos necesarios para las pruebas:
@@ -52,15 +64,12 @@ def test_flujo_completo():
     try:
         #Configuración inicial
         conn = sqlite3.connect('Base_datos.db', timeout=10)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Factura WHERE id = 'FAC-001'")
-        cursor.execute("DELETE FROM Transaccion WHERE factura_id = 'FAC-001'")
-        conn.commit()
+        limpiar_pedido(conn, 'PED-001')
         
         configurar_datos_iniciales(conn)
         
         # 1. Crear factura
-        factura = Factura("FAC-001", "PED-001", 1500.50, "CLI-001")
+        factura = Factura.nueva("PED-001", 1500.50, "CLI-001")
         guardar_factura(factura)
         
         # 2. Registrar pago completo(igual al monto total)
@@ -68,7 +77,7 @@ def test_flujo_completo():
         guardar_factura(factura)
         
         # 3. Crear transacción asociada al pago
-        transaccion = Transaccion("TRX-001", 1500.50, "TRANSFERENCIA", "FAC-001", "REF-001")
+        transaccion = Transaccion.nueva(1500.50, "TRANSFERENCIA", factura.id, "REF-001")
         guardar_transaccion(transaccion)
         
         # 4. Conciliar la transacción(marcar como verificada)
@@ -83,8 +92,8 @@ def test_flujo_completo():
                    t.estado, t.conciliado, t.referencia_bancaria
             FROM Factura f
             JOIN Transaccion t ON f.id = t.factura_id
-            WHERE f.id = 'FAC-001'
-        """)
+            WHERE f.id = ?
+        """, (factura.id,))
         res = cursor.fetchone()
         
         #Mostrar resultados de la prueba
@@ -114,9 +123,7 @@ def test_pago_parcial():
         cursor = conn.cursor()
         
         # Limpiar datos de pruebas anteriores
-        cursor.execute("DELETE FROM Factura WHERE id = 'FAC-002'")
-        cursor.execute("DELETE FROM Transaccion WHERE factura_id = 'FAC-002'")
-        conn.commit()
+        limpiar_pedido(conn, 'PED-002')
         
         # Configurar datos iniciales (cliente y nuevo pedido específico para esta prueba)
         cursor.execute("INSERT OR IGNORE INTO Cliente (id, nombre) VALUES ('CLI-001', 'Cliente Demo')")
@@ -126,14 +133,14 @@ def test_pago_parcial():
         """)
         conn.commit()
         
-        # 2. Crear factura con nuevo pedido_id para evitar conflicto con FAC-001
-        factura = Factura("FAC-002", "PED-002", 3000.00, "CLI-001")
+        # 2. Crear factura con nuevo pedido_id para evitar conflicto con la de PED-001
+        factura = Factura.nueva("PED-002", 3000.00, "CLI-001")
         guardar_factura(factura)
         
         # 3. Primer pago parcial (1000 de 3000)
         factura.registrar_pago(1000.00, "comprobantes/pago_parcial1.pdf")
         guardar_factura(factura)
-        trans1 = Transaccion("TRX-002", 1000.00, "TARJETA", "FAC-002", "REF-002")
+        trans1 = Transaccion.nueva(1000.00, "TARJETA", factura.id, "REF-002")
         guardar_transaccion(trans1)
         
         # Pequeña pausa para evitar bloqueos
@@ -142,7 +149,7 @@ def test_pago_parcial():
         # 4. Segundo pago parcial (1500 de 2000 restante)
         factura.registrar_pago(1500.00, "comprobantes/pago_parcial2.pdf")
         guardar_factura(factura)
-        trans2 = Transaccion("TRX-003", 1500.00, "EFECTIVO", "FAC-002", "REF-003")
+        trans2 = Transaccion.nueva(1500.00, "EFECTIVO", factura.id, "REF-003")
         guardar_transaccion(trans2)
         
         # Pequeña pausa
@@ -151,7 +158,7 @@ def test_pago_parcial():
         # 5. Tercer pago (completa el saldo de 500)
         factura.registrar_pago(500.00, "comprobantes/pago_parcial3.pdf")
         guardar_factura(factura)
-        trans3 = Transaccion("TRX-004", 500.00, "TRANSFERENCIA", "FAC-002", "REF-004")
+        trans3 = Transaccion.nueva(500.00, "TRANSFERENCIA", factura.id, "REF-004")
         guardar_transaccion(trans3)
         
         # 6. Conciliar todas las transacciones
@@ -165,20 +172,20 @@ def test_pago_parcial():
         # 7. Verificación final
         cursor = conn.cursor()
         # Consultar estado final de la factura
-        cursor.execute("SELECT estado, saldo_pendiente FROM Factura WHERE id = 'FAC-002'")
+        cursor.execute("SELECT estado, saldo_pendiente FROM Factura WHERE id = ?", (factura.id,))
         estado, saldo = cursor.fetchone()
         print(f"\nEstado final: {estado} | Saldo: {saldo}")
         
         # Contar transacciones asociadas a esta factura
-        cursor.execute("SELECT COUNT(*) FROM Transaccion WHERE factura_id = 'FAC-002'")
+        cursor.execute("SELECT COUNT(*) FROM Transaccion WHERE factura_id = ?", (factura.id,))
         print(f"Transacciones registradas: {cursor.fetchone()[0]}")
         
         # Mostrar detalles de las transacciones para verificación
         cursor.execute("""
             SELECT id, monto, metodo_pago, estado, referencia_bancaria 
             FROM Transaccion 
-            WHERE factura_id = 'FAC-002'
-        """)
+            WHERE factura_id = ?
+        """, (factura.id,))
         print("\nDetalles de transacciones:")
         for trx in cursor.fetchall():
             print(f"- {trx[0]}: ${trx[1]} ({trx[2]}) - {trx[3]} (Ref: {trx[4]})")
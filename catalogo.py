@@ -0,0 +1,164 @@
+# catalogo.py
+#
+# Caché del catálogo de productos compartido por todas las ventanas e hilos del proceso.
+# Las lecturas (productos, activos, obtener) son búsquedas en memoria; la base solo se
+# consulta cuando vence el TTL del catálogo completo o cuando se invalidan productos,
+# y entonces solo se releen los productos invalidados.
+#
+# Quien escribe en Producto (descuento de stock, actualizar_producto) invalida los ids
+# que tocó. En PostgreSQL además se puede escuchar el canal catalogo_productos: el trigger
+# trg_producto_notificar (Alexis/crear_bd.sql) avisa ahí de los cambios de otros procesos.
+import select
+import threading
+import time
+
+# Segundos que dura el catálogo completo antes de recargarlo
+CATALOGO_TTL = 300
+
+# Canal de LISTEN/NOTIFY; cada aviso trae el id del producto que cambió
+CANAL_CATALOGO = "catalogo_productos"
+
+
+class CatalogoProductos:
+    """
+    Productos en memoria por id. cargar(ids) regresa filas (id, nombre, precio, stock, estado)
+    de esos ids, o de todos los productos si ids es None.
+    """
+
+    def __init__(self, cargar, ttl=CATALOGO_TTL):
+        self.cargar = cargar
+        self.ttl = ttl
+        self._candado = threading.Lock()
+        self._productos = {}        # id -> fila
+        self._ordenados = None      # Filas ordenadas por id; None si hay que rehacerlas
+        self._vence = 0.0           # Instante en que vence el catálogo completo
+        self._pendientes = set()    # Ids invalidados que se releen en la siguiente lectura
+        self._suscriptores = []
+        self._detener = threading.Event()
+        self._escucha = None
+
+    def _al_dia(self):
+        # Se llama con el candado tomado. Mientras un hilo recarga, los demás esperan
+        # en lugar de ir todos a la base.
+        if time.monotonic() >= self._vence:
+            self._pendientes.clear()
+            anteriores = self._productos
+            filas = self.cargar(None)
+            self._productos = {fila[0]: fila for fila in filas}
+            eliminados = [id_producto for id_producto in anteriores if id_producto not in self._productos]
+            self._vence = time.monotonic() + self.ttl
+        elif self._pendientes:
+            ids = sorted(self._pendientes)
+            filas = self.cargar(ids)
+            self._pendientes.clear()
+            for id_producto in ids:
+                self._productos.pop(id_producto, None)
+            self._productos.update((fila[0], fila) for fila in filas)
+            # Un id que ya no regresa es un producto eliminado
+            eliminados = [id_producto for id_producto in ids if id_producto not in self._productos]
+        else:
+            return
+        self._ordenados = None
+        for funcion in self._suscriptores:
+            funcion(filas, eliminados)
+
+    def _lista(self):
+        self._al_dia()
+        if self._ordenados is None:
+            self._ordenados = [self._productos[id_producto] for id_producto in sorted(self._productos)]
+        return self._ordenados
+
+    def productos(self):
+        """Todas las filas, ordenadas por id"""
+        with self._candado:
+            return list(self._lista())
+
+    def activos(self):
+        with self._candado:
+            return [fila for fila in self._lista() if fila[4] == "ACTIVO"]
+
+    def obtener(self, id_producto):
+        """Fila del producto o None si no existe"""
+        with self._candado:
+            self._al_dia()
+            return self._productos.get(id_producto)
+
+    def refrescar(self):
+        """Aplica lo vencido o invalidado (y avisa a los suscriptores) sin copiar el catálogo"""
+        with self._candado:
+            self._al_dia()
+
+    def suscribir(self, funcion):
+        """
+        funcion(filas, eliminados) recibe las filas releídas y los ids que ya no existen
+        cada vez que el catálogo se recarga; al suscribirse recibe el catálogo completo.
+        Se llama con el candado del catálogo tomado: no debe volver a leer el catálogo.
+        """
+        with self._candado:
+            funcion(list(self._lista()), [])
+            self._suscriptores.append(funcion)
+
+    def invalidar(self, ids=None):
+        """Los ids indicados se releen en la siguiente lectura; sin ids, todo el catálogo"""
+        with self._candado:
+            if ids is None:
+                self._vence = 0.0
+            else:
+                self._pendientes.update(ids)
+
+    # -----------------------------------------------------------------------
+    # Invalidación por LISTEN/NOTIFY (solo PostgreSQL)
+    # -----------------------------------------------------------------------
+
+    def escuchar(self, conectar, canal=CANAL_CATALOGO, espera=5.0):
+        """
+        Arranca un hilo que invalida los productos avisados en el canal. conectar() debe
+        regresar una conexión psycopg2 propia (no del pool: se queda ocupada escuchando).
+        """
+        if self._escucha is not None:
+            return
+        self._detener.clear()
+        self._escucha = threading.Thread(
+            target=self._escuchar, args=(conectar, canal, espera), daemon=True
+        )
+        self._escucha.start()
+
+    def _escuchar(self, conectar, canal, espera):
+        import psycopg2
+
+        conn = None
+        while not self._detener.is_set():
+            try:
+                if conn is None:
+                    conn = conectar()
+                    conn.autocommit = True
+                    conn.cursor().execute(f'LISTEN "{canal}"')
+                    # Los avisos de mientras no se escuchaba se perdieron: se recarga todo
+                    self.invalidar()
+
+                if not select.select([conn], [], [], espera)[0]:
+                    continue
+                conn.poll()
+                ids = set()
+                while conn.notifies:
+                    ids.add(conn.notifies.pop(0).payload)
+                if "" in ids:
+                    self.invalidar()
+                elif ids:
+                    self.invalidar(ids)
+            except (psycopg2.Error, OSError):
+                # Sin conexión solo queda el TTL; se reintenta después de la espera
+                if conn is not None and not conn.closed:
+                    conn.close()
+                conn = None
+                self._detener.wait(espera)
+
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    def dejar_de_escuchar(self):
+        if self._escucha is None:
+            return
+        self._detener.set()
+        self._escucha.join()
+        self._escucha = None
@@ -1,10 +1,286 @@
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
+
+DB_CONFIG = {
+    "dbname": "tienda_base_datos",
+    "user": "tu_usuario",
+    "password": "nontraseña",
+    "host": "localhost",
+    "port": "5432"
+}
+
+# Tamaño del pool (se puede cambiar con configurar_pool antes del primer uso)
+POOL_MIN = 1
+POOL_MAX = 10
+# Tiempo máximo (segundos) que se espera por una conexión libre
+POOL_TIMEOUT = 30
+# Conexiones inactivas más de este tiempo se verifican con SELECT 1 al prestarlas
+VERIFICAR_DESPUES = 30
+
+
+class PoolAgotadoError(Exception):
+    pass
+
+
+class PoolConexiones:
+    """Pool de conexiones PostgreSQL compartido por todos los hilos del proceso"""
+
+    def __init__(self, minimo=POOL_MIN, maximo=POOL_MAX, timeout=POOL_TIMEOUT,
+                 verificar_despues=VERIFICAR_DESPUES, **params):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamaño de pool inválido")
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_despues = verificar_despues
+        self.params = params or dict(DB_CONFIG)
+
+        self._condicion = threading.Condition()
+        self._libres = []       # Lista de (conexion, instante en que se devolvió)
+        self._en_uso = set()
+        self._reservadas = 0    # Lugares apartados mientras se conecta o verifica
+        self._cerrado = False
+
+        # Estadísticas
+        self._prestamos = 0
+        self._esperas = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+        self._creadas = 0
+        self._descartadas = 0
+
+        for _ in range(minimo):
+            self._libres.append((self._nueva_conexion(), time.monotonic()))
+
+    def _nueva_conexion(self):
+        conn = psycopg2.connect(**self.params)
+        with self._condicion:
+            self._creadas += 1
+        return conn
+
+    def _tamano(self):
+        return len(self._libres) + len(self._en_uso) + self._reservadas
+
+    def _esta_sana(self, conn, inactiva_desde):
+        if conn.closed:
+            return False
+        if time.monotonic() - inactiva_desde < self.verificar_despues:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _descartar(self, conn):
+        with self._condicion:
+            self._descartadas += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def obtener(self):
+        """Presta una conexión; espera si el pool está al máximo"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        esperada = False
+
+        while True:
+            candidata = None
+            with self._condicion:
+                while True:
+                    if self._cerrado:
+                        raise PoolAgotadoError("El pool de conexiones está cerrado")
+                    if self._libres:
+                        candidata = self._libres.pop()
+                        break
+                    if self._tamano() < self.maximo:
+                        break
+
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolAgotadoError(
+                            f"No hubo conexiones libres en {self.timeout} segundos"
+                        )
+                    esperada = True
+                    self._condicion.wait(restante)
+                # Se reserva el lugar antes de soltar el candado para no rebasar el máximo
+                self._reservadas += 1
+
+            # La verificación y la conexión nueva se hacen fuera del candado
+            # para no bloquear a los demás hilos durante el viaje al servidor
+            try:
+                if candidata is None:
+                    conn = self._nueva_conexion()
+                else:
+                    conn, inactiva_desde = candidata
+                    if not self._esta_sana(conn, inactiva_desde):
+                        self._descartar(conn)
+                        conn = None
+            except Exception:
+                with self._condicion:
+                    self._reservadas -= 1
+                    self._condicion.notify()
+                raise
+
+            with self._condicion:
+                self._reservadas -= 1
+                if conn is not None:
+                    self._registrar_prestamo(conn, inicio, esperada)
+                    return conn
+                self._condicion.notify()
+
+    def _registrar_prestamo(self, conn, inicio, esperada):
+        espera = time.monotonic() - inicio
+        self._en_uso.add(conn)
+        self._prestamos += 1
+        if esperada:
+            self._esperas += 1
+        self._tiempo_espera_total += espera
+        self._tiempo_espera_max = max(self._tiempo_espera_max, espera)
+
+    def devolver(self, conn):
+        """Regresa una conexión al pool, descartándola si quedó en mal estado"""
+        with self._condicion:
+            if conn not in self._en_uso:
+                return
+            self._en_uso.discard(conn)
+            self._reservadas += 1
+
+        sana = not self._cerrado and not conn.closed
+        if sana:
+            try:
+                # Una transacción abierta no debe pasar al siguiente usuario
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                sana = False
+        if not sana:
+            self._descartar(conn)
+
+        with self._condicion:
+            self._reservadas -= 1
+            if sana:
+                self._libres.append((conn, time.monotonic()))
+            self._condicion.notify()
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión: confirma al salir sin errores y revierte si hay excepción"""
+        conn = self.obtener()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.devolver(conn)
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                "tamano": self._tamano(),
+                "en_uso": len(self._en_uso),
+                "libres": len(self._libres),
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "prestamos": self._prestamos,
+                "esperas": self._esperas,
+                "tiempo_espera_total": self._tiempo_espera_total,
+                "tiempo_espera_promedio": (
+                    self._tiempo_espera_total / self._prestamos if self._prestamos else 0.0
+                ),
+                "tiempo_espera_max": self._tiempo_espera_max,
+                "conexiones_creadas": self._creadas,
+                "conexiones_descartadas": self._descartadas,
+            }
+
+    def cerrar(self):
+        with self._condicion:
+            self._cerrado = True
+            for conn, _ in self._libres:
+                conn.close()
+            self._libres.clear()
+            self._condicion.notify_all()
+
+
+class ConexionPrestada:
+    """Envoltura devuelta por conectar(): close() regresa la conexión al pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("La conexión ya fue devuelta al pool")
+        return getattr(self._conn, nombre)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.devolver(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+
+
+_pool = None
+_candado_pool = threading.Lock()
+
+
+def configurar_pool(minimo=POOL_MIN, maximo=POOL_MAX, timeout=POOL_TIMEOUT, **params):
+    """Crea (o reemplaza) el pool del proceso con el tamaño y parámetros indicados"""
+    global _pool
+    with _candado_pool:
+        anterior = _pool
+        _pool = PoolConexiones(minimo, maximo, timeout, **params)
+    if anterior is not None:
+        anterior.cerrar()
+    return _pool
+
+
+def obtener_pool():
+    global _pool
+    if _pool is None:
+        with _candado_pool:
+            if _pool is None:
+                _pool = PoolConexiones()
+    return _pool
+
+
+def obtener_conexion():
+    """Context manager: with obtener_conexion() as conn: ..."""
+    return obtener_pool().conexion()
+
+
+def conexion_dedicada():
+    """Conexión propia, fuera del pool, con los mismos parámetros (p. ej. para LISTEN)"""
+    return psycopg2.connect(**obtener_pool().params)
+
+
+def estadisticas_pool():
+    return obtener_pool().estadisticas()
+
 
 def conectar():
-    return psycopg2.connect(
-        dbname="tienda_base_datos",
-        user="tu_usuario",
-        password="nontraseña",
-        host="localhost",
-        port="5432"
-    )
+    # Compatibilidad: quien llame conn.close() devuelve la conexión al pool
+    pool = obtener_pool()
+    return ConexionPrestada(pool, pool.obtener())
@@ -0,0 +1,130 @@
+# estados_pedido.py
+#
+# Máquina de estados de Pedido.estado y cambios de estado en bloque:
+#
+#   PENDIENTE -> EN_PROCESO -> EN_RUTA -> ENTREGADO
+#   PENDIENTE, EN_PROCESO -> CANCELADO
+#
+# Cada cambio es una sola sentencia para todos los pedidos: UPDATE ... WHERE id = ANY(...)
+# AND estado = <estado esperado>. Un pedido que otro proceso movió antes ya no cumple el
+# estado esperado y sale rechazado en lugar de saltarse un paso. La cancelación no
+# devuelve stock.
+#
+#   python estados_pedido.py despachar 3 4 5          # pedidos de esas rutas a EN_RUTA
+#   python estados_pedido.py mover ENTREGADO < ids.txt
+import argparse
+import sys
+
+from conexion import obtener_conexion
+
+# Estado -> estados a los que puede pasar
+TRANSICIONES = {
+    "PENDIENTE": ("EN_PROCESO", "CANCELADO"),
+    "EN_PROCESO": ("EN_RUTA", "CANCELADO"),
+    "EN_RUTA": ("ENTREGADO",),
+    "ENTREGADO": (),
+    "CANCELADO": (),
+}
+
+# {objetivo} es la consulta con los ids de los pedidos a mover. El SELECT final ve los
+# estados de antes del UPDATE: para un rechazado dice en qué estado estaba (NULL si no existe).
+SQL_TRANSICION = """
+    WITH objetivo AS ({objetivo}),
+    movidos AS (
+        UPDATE Pedido AS p SET estado = %(destino)s
+        FROM objetivo AS o
+        WHERE p.id = o.id AND p.estado = ANY(%(origenes)s)
+        RETURNING p.id
+    )
+    SELECT o.id, m.id IS NOT NULL AS movido, p.estado
+    FROM objetivo AS o
+    LEFT JOIN movidos AS m ON m.id = o.id
+    LEFT JOIN Pedido AS p ON p.id = o.id
+"""
+
+OBJETIVO_IDS = "SELECT DISTINCT unnest(%(ids)s::varchar[]) AS id"
+
+OBJETIVO_RUTAS = "SELECT DISTINCT pedido_id AS id FROM RutaEntrega_Pedido WHERE ruta_id = ANY(%(rutas)s::int[])"
+
+
+class ResultadoTransicion:
+    def __init__(self, destino):
+        self.destino = destino
+        self.movidos = []
+        self.rechazados = []    # (pedido_id, estado actual o None si no existe)
+
+    def __repr__(self):
+        return (f"ResultadoTransicion(destino={self.destino}, movidos={len(self.movidos)}, "
+                f"rechazados={len(self.rechazados)})")
+
+
+def origenes_de(destino, desde=None):
+    """Estados desde los que se puede llegar a destino; con desde, valida esa transición"""
+    if destino not in TRANSICIONES:
+        raise ValueError(f"Estado desconocido: {destino}")
+    if desde is not None:
+        if desde not in TRANSICIONES:
+            raise ValueError(f"Estado desconocido: {desde}")
+        if destino not in TRANSICIONES[desde]:
+            raise ValueError(f"Un pedido {desde} no puede pasar a {destino}")
+        return [desde]
+    origenes = [estado for estado, siguientes in TRANSICIONES.items() if destino in siguientes]
+    if not origenes:
+        raise ValueError(f"Ningún pedido puede pasar a {destino}")
+    return origenes
+
+
+def _transicion(objetivo, parametros, destino, desde):
+    parametros = dict(parametros, destino=destino, origenes=origenes_de(destino, desde))
+    resultado = ResultadoTransicion(destino)
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_TRANSICION.format(objetivo=objetivo), parametros)
+        for pedido_id, movido, estado in cur:
+            if movido:
+                resultado.movidos.append(pedido_id)
+            else:
+                resultado.rechazados.append((pedido_id, estado))
+    return resultado
+
+
+def mover_pedidos(ids, destino, desde=None):
+    """
+    Pasa los pedidos a destino en una sola sentencia. Sin desde, cada pedido debe estar
+    en algún estado que permita llegar a destino; con desde, exactamente en ese.
+    """
+    return _transicion(OBJETIVO_IDS, {"ids": list(ids)}, destino, desde)
+
+
+def despachar_rutas(ruta_ids):
+    """Pasa a EN_RUTA los pedidos EN_PROCESO de las rutas indicadas"""
+    return _transicion(OBJETIVO_RUTAS, {"rutas": [int(r) for r in ruta_ids]}, "EN_RUTA", "EN_PROCESO")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Cambios de estado de pedidos en bloque")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    mover = comandos.add_parser("mover", help="Mover pedidos (ids como argumentos o uno por línea en la entrada)")
+    mover.add_argument("destino", choices=sorted(TRANSICIONES))
+    mover.add_argument("ids", nargs="*")
+    mover.add_argument("--desde", choices=sorted(TRANSICIONES), help="Estado en que deben estar")
+
+    despachar = comandos.add_parser("despachar", help="Pasar a EN_RUTA los pedidos de las rutas")
+    despachar.add_argument("rutas", nargs="+", type=int)
+    args = parser.parse_args(argumentos)
+
+    if args.comando == "despachar":
+        resultado = despachar_rutas(args.rutas)
+    else:
+        ids = args.ids or [linea.strip() for linea in sys.stdin if linea.strip()]
+        resultado = mover_pedidos(ids, args.destino, args.desde)
+
+    print(f"{len(resultado.movidos)} pedidos pasaron a {resultado.destino}")
+    for pedido_id, estado in resultado.rechazados:
+        print(f"{pedido_id}: {estado or 'no existe'}", file=sys.stderr)
+    return 1 if resultado.rechazados else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
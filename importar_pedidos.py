@@ -0,0 +1,447 @@
+# importar_pedidos.py
+#
+# Carga masiva de pedidos de clientes corporativos (archivos EDI exportados como CSV o
+# JSON-lines), en lugar de capturarlos uno por uno en interfaz_cliente.py.
+#
+#   python importar_pedidos.py pedidos.csv
+#   python importar_pedidos.py pedidos.jsonl --sqlite Base_datos.db
+#
+# CSV: un renglón por partida, con encabezado referencia,cliente_id,producto_id,cantidad[,fecha].
+# JSON-lines: un pedido por línea,
+#   {"referencia": ..., "cliente_id": ..., "fecha": ..., "productos": [{"producto_id": ..., "cantidad": ...}]}
+# Las partidas con la misma referencia forman un solo pedido; sin fecha se usa la de hoy.
+#
+# El archivo se lee en streaming y cada línea se valida contra los ids de Cliente y de los
+# productos ACTIVO, leídos una sola vez al empezar. Una línea rechazada va al reporte de
+# errores y rechaza su pedido completo (todas las líneas con esa referencia); el resto del
+# archivo sigue. Las partidas válidas pasan a una tabla temporal (COPY en PostgreSQL,
+# executemany por lotes en SQLite). Al terminar el archivo se quitan de ahí los pedidos
+# rechazados y los que ya se habían importado, y el resto pasa a Pedido/Pedido_Producto.
+# El archivo entra en una sola transacción.
+#
+# PedidoImportado guarda (cliente_id, referencia) -> pedido_id con llave primaria: volver a
+# importar el mismo archivo (o uno que repite órdenes de compra) no duplica pedidos.
+#
+# Los pedidos quedan PENDIENTE y, a diferencia del carrito, no apartan stock.
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import date
+from itertools import islice
+
+from identificadores import nuevo_id
+
+# Partidas por executemany en SQLite
+TAMANO_LOTE = 5000
+
+COLUMNAS_CSV = ("referencia", "cliente_id", "producto_id", "cantidad")
+
+# Órdenes de compra ya importadas (también en Alexis/crear_bd.sql); sirve igual en SQLite
+SQL_CREAR_IMPORTADOS = """
+    CREATE TABLE IF NOT EXISTS PedidoImportado (
+        cliente_id VARCHAR NOT NULL REFERENCES Cliente(id),
+        referencia VARCHAR NOT NULL,
+        pedido_id VARCHAR NOT NULL UNIQUE REFERENCES Pedido(id) ON DELETE CASCADE,
+        fecha_importacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (cliente_id, referencia)
+    )
+"""
+
+# Staging: una fila por partida válida, en el orden en que las da Validador.partidas
+_COLUMNAS_STAGING = """
+        referencia VARCHAR NOT NULL,
+        pedido_id VARCHAR NOT NULL,
+        cliente_id VARCHAR NOT NULL,
+        fecha DATE NOT NULL,
+        producto_id VARCHAR NOT NULL,
+        cantidad INTEGER NOT NULL
+"""
+
+# En PostgreSQL se borra sola al terminar la transacción
+SQL_CREAR_STAGING = f"CREATE TEMP TABLE importacion_partida ({_COLUMNAS_STAGING}) ON COMMIT DROP"
+
+SQL_CREAR_STAGING_SQLITE = f"CREATE TEMP TABLE IF NOT EXISTS importacion_partida ({_COLUMNAS_STAGING})"
+
+SQL_COPY_STAGING = "COPY importacion_partida FROM STDIN WITH (FORMAT csv)"
+
+SQL_INSERTAR_STAGING_SQLITE = "INSERT INTO importacion_partida VALUES (?, ?, ?, ?, ?, ?)"
+
+SQL_YA_IMPORTADOS = """
+    SELECT DISTINCT i.referencia
+    FROM importacion_partida AS i
+    JOIN PedidoImportado AS p ON p.cliente_id = i.cliente_id AND p.referencia = i.referencia
+"""
+
+SQL_QUITAR_IMPORTADOS = """
+    DELETE FROM importacion_partida
+    WHERE EXISTS (
+        SELECT 1 FROM PedidoImportado AS p
+        WHERE p.cliente_id = importacion_partida.cliente_id AND p.referencia = importacion_partida.referencia
+    )
+"""
+
+# Pedidos, referencias y partidas de todo el archivo en una sentencia; un producto repetido
+# en el mismo pedido se junta en una partida
+SQL_CARGAR_STAGING = """
+    WITH pedidos AS (
+        INSERT INTO Pedido (id, cliente_id, fecha, estado)
+        SELECT DISTINCT pedido_id, cliente_id, fecha, 'PENDIENTE' FROM importacion_partida
+        RETURNING id
+    ), importados AS (
+        INSERT INTO PedidoImportado (cliente_id, referencia, pedido_id)
+        SELECT DISTINCT i.cliente_id, i.referencia, i.pedido_id
+        FROM importacion_partida AS i
+        JOIN pedidos AS p ON p.id = i.pedido_id
+    )
+    INSERT INTO Pedido_Producto (pedido_id, producto_id, cantidad)
+    SELECT i.pedido_id, i.producto_id, SUM(i.cantidad)
+    FROM importacion_partida AS i
+    JOIN pedidos AS p ON p.id = i.pedido_id
+    GROUP BY i.pedido_id, i.producto_id
+"""
+
+# SQLite no tiene INSERT dentro de WITH: las mismas tres escrituras por separado
+SQL_CARGAR_STAGING_SQLITE = (
+    """
+    INSERT INTO Pedido (id, cliente_id, fecha, estado)
+    SELECT DISTINCT pedido_id, cliente_id, fecha, 'PENDIENTE' FROM importacion_partida
+    """,
+    """
+    INSERT INTO PedidoImportado (cliente_id, referencia, pedido_id)
+    SELECT DISTINCT cliente_id, referencia, pedido_id FROM importacion_partida
+    """,
+    """
+    INSERT INTO Pedido_Producto (pedido_id, producto_id, cantidad)
+    SELECT pedido_id, producto_id, SUM(cantidad) FROM importacion_partida
+    GROUP BY pedido_id, producto_id
+    """,
+)
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.lineas = 0
+        self.partidas = 0
+        self.rechazadas = 0             # Líneas con error (van al reporte)
+        self.pedidos = {}               # referencia -> (pedido_id, cliente_id, fecha), solo los importados
+        self.pedidos_rechazados = set() # Referencias con alguna línea rechazada: no entra ninguna partida
+        self.ya_importados = set()      # Referencias que una importación anterior ya cargó
+
+    def __repr__(self):
+        return (f"ResultadoImportacion(lineas={self.lineas}, pedidos={len(self.pedidos)}, "
+                f"partidas={self.partidas}, rechazadas={self.rechazadas}, "
+                f"pedidos_rechazados={len(self.pedidos_rechazados)}, ya_importados={len(self.ya_importados)})")
+
+
+# -----------------------------------------------------------------------
+# Lectura del archivo
+# -----------------------------------------------------------------------
+
+def _leer_csv(archivo):
+    lector = csv.reader(archivo)
+    encabezado = [columna.strip().lower() for columna in next(lector, [])]
+    faltantes = [columna for columna in COLUMNAS_CSV if columna not in encabezado]
+    if faltantes:
+        raise ValueError(f"Al CSV le faltan las columnas: {', '.join(faltantes)}")
+    posicion = {columna: i for i, columna in enumerate(encabezado)}
+
+    for valores in lector:
+        if not any(valor.strip() for valor in valores):
+            continue
+        contenido = ",".join(valores)
+        if len(valores) != len(encabezado):
+            # La referencia, si se alcanza a leer, sirve para rechazar el pedido completo
+            parcial = None
+            if posicion["referencia"] < len(valores):
+                parcial = {"referencia": valores[posicion["referencia"]].strip()}
+            yield lector.line_num, contenido, parcial, f"Se esperaban {len(encabezado)} columnas"
+            continue
+        fila = {columna: valores[i].strip() for columna, i in posicion.items()}
+        registro = {
+            "referencia": fila["referencia"],
+            "cliente_id": fila["cliente_id"],
+            "fecha": fila.get("fecha") or None,
+            "productos": [(fila["producto_id"], fila["cantidad"])],
+        }
+        yield lector.line_num, contenido, registro, None
+
+
+def _leer_jsonl(archivo):
+    for numero, linea in enumerate(archivo, start=1):
+        contenido = linea.strip()
+        if not contenido:
+            continue
+        datos = None
+        try:
+            datos = json.loads(contenido)
+            registro = {
+                "referencia": str(datos["referencia"]).strip(),
+                "cliente_id": str(datos["cliente_id"]).strip(),
+                "fecha": datos.get("fecha"),
+                "productos": [(str(p["producto_id"]).strip(), p["cantidad"]) for p in datos["productos"]],
+            }
+        except json.JSONDecodeError:
+            yield numero, contenido, None, "JSON inválido"
+        except (KeyError, TypeError, AttributeError):
+            parcial = None
+            if isinstance(datos, dict) and datos.get("referencia") is not None:
+                parcial = {"referencia": str(datos["referencia"]).strip()}
+            yield numero, contenido, parcial, "Faltan referencia, cliente_id o productos (producto_id, cantidad)"
+        else:
+            yield numero, contenido, registro, None
+
+
+LECTORES = {"csv": _leer_csv, "jsonl": _leer_jsonl}
+
+
+def detectar_formato(ruta):
+    return "jsonl" if ruta.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+# -----------------------------------------------------------------------
+# Validación
+# -----------------------------------------------------------------------
+
+class Validador:
+    """
+    Convierte las líneas leídas en partidas (referencia, pedido_id, cliente_id, fecha, producto_id,
+    cantidad). Las líneas con algún error se escriben en el reporte y su referencia queda en
+    resultado.pedidos_rechazados: las partidas que ya salieron de ese pedido se quitan al cargar
+    y las que vengan después ya no salen.
+    """
+
+    def __init__(self, clientes, productos, reporte, resultado):
+        self.clientes = clientes
+        self.productos = productos
+        self.reporte = reporte
+        self.resultado = resultado
+        self.hoy = date.today()
+
+    def _revisar(self, registro):
+        # Regresa (pedido_id, cliente_id, fecha, [(producto_id, cantidad)]) o lanza ValueError
+        referencia = registro["referencia"]
+        cliente_id = registro["cliente_id"]
+        if not referencia:
+            raise ValueError("Falta la referencia del pedido")
+        if cliente_id not in self.clientes:
+            raise ValueError(f"El cliente {cliente_id} no existe")
+        try:
+            fecha = date.fromisoformat(registro["fecha"]) if registro["fecha"] else self.hoy
+        except (TypeError, ValueError):
+            raise ValueError(f"Fecha inválida: {registro['fecha']}") from None
+
+        anterior = self.resultado.pedidos.get(referencia)
+        if anterior is not None and anterior[1:] != (cliente_id, fecha):
+            raise ValueError(f"La referencia {referencia} ya se usó con el cliente {anterior[1]} y fecha {anterior[2]}")
+
+        partidas = []
+        if not registro["productos"]:
+            raise ValueError("El pedido no tiene productos")
+        for producto_id, cantidad in registro["productos"]:
+            if producto_id not in self.productos:
+                raise ValueError(f"El producto {producto_id} no existe o no está activo")
+            try:
+                cantidad = int(cantidad)
+            except (TypeError, ValueError):
+                cantidad = 0
+            if cantidad <= 0:
+                raise ValueError(f"Cantidad inválida para {producto_id}")
+            partidas.append((producto_id, cantidad))
+
+        pedido_id = anterior[0] if anterior is not None else nuevo_id()
+        return pedido_id, cliente_id, fecha, partidas
+
+    def partidas(self, lineas):
+        rechazados = self.resultado.pedidos_rechazados
+        for numero, contenido, registro, motivo in lineas:
+            self.resultado.lineas += 1
+            referencia = registro.get("referencia") if registro else None
+            if motivo is None:
+                try:
+                    pedido_id, cliente_id, fecha, partidas = self._revisar(registro)
+                except ValueError as error:
+                    motivo = str(error)
+            if motivo is not None:
+                self.resultado.rechazadas += 1
+                self.reporte.rechazar(numero, motivo, contenido)
+                if referencia:
+                    rechazados.add(referencia)
+                continue
+            if referencia in rechazados:
+                continue
+
+            self.resultado.pedidos.setdefault(referencia, (pedido_id, cliente_id, fecha))
+            for producto_id, cantidad in partidas:
+                yield referencia, pedido_id, cliente_id, fecha, producto_id, cantidad
+
+
+class ReporteErrores:
+    """CSV con (linea, motivo, contenido); el archivo se crea hasta el primer rechazo"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = None
+        self._escritor = None
+
+    def rechazar(self, numero, motivo, contenido):
+        if self._archivo is None:
+            self._archivo = open(self.ruta, "w", encoding="utf-8", newline="")
+            self._escritor = csv.writer(self._archivo)
+            self._escritor.writerow(("linea", "motivo", "contenido"))
+        self._escritor.writerow((numero, motivo, contenido))
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+# -----------------------------------------------------------------------
+# Carga
+# -----------------------------------------------------------------------
+
+def _campo_csv(valor):
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+class _FlujoCopy:
+    """Archivo de solo lectura sobre un iterador de renglones, para copy_expert"""
+
+    def __init__(self, renglones):
+        self._renglones = iter(renglones)
+        self._sobrante = ""
+
+    def read(self, tamano=-1):
+        partes = [self._sobrante]
+        total = len(self._sobrante)
+        while tamano < 0 or total < tamano:
+            renglon = next(self._renglones, None)
+            if renglon is None:
+                break
+            partes.append(renglon)
+            total += len(renglon)
+        texto = "".join(partes)
+        if tamano < 0:
+            self._sobrante = ""
+            return texto
+        self._sobrante = texto[tamano:]
+        return texto[:tamano]
+
+
+def _cargar_postgres(partidas, resultado):
+    # Import tardío: la carga a SQLite no necesita psycopg2
+    from conexion import obtener_conexion
+
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM Cliente")
+        clientes = {fila[0] for fila in cur.fetchall()}
+        cur.execute("SELECT id FROM Producto WHERE estado = 'ACTIVO'")
+        productos = {fila[0] for fila in cur.fetchall()}
+
+        cur.execute(SQL_CREAR_IMPORTADOS)
+        cur.execute(SQL_CREAR_STAGING)
+        renglones = (",".join(map(_campo_csv, partida)) + "\n" for partida in partidas(clientes, productos))
+        cur.copy_expert(SQL_COPY_STAGING, _FlujoCopy(renglones))
+
+        # El archivo ya se leyó completo: se conocen todos los pedidos rechazados
+        cur.execute("DELETE FROM importacion_partida WHERE referencia = ANY(%s)",
+                    (sorted(resultado.pedidos_rechazados),))
+        cur.execute(SQL_YA_IMPORTADOS)
+        resultado.ya_importados.update(fila[0] for fila in cur.fetchall())
+        cur.execute(SQL_QUITAR_IMPORTADOS)
+        cur.execute(SQL_CARGAR_STAGING)
+        # Filas de Pedido_Producto (la sentencia principal), ya con los productos repetidos juntos
+        resultado.partidas = cur.rowcount
+
+
+def _cargar_sqlite(partidas, resultado, ruta_db):
+    conn = sqlite3.connect(ruta_db)
+    try:
+        with conn:
+            clientes = {fila[0] for fila in conn.execute("SELECT id FROM Cliente")}
+            productos = {fila[0] for fila in conn.execute("SELECT id FROM Producto WHERE estado = 'ACTIVO'")}
+
+            conn.execute(SQL_CREAR_IMPORTADOS)
+            conn.execute(SQL_CREAR_STAGING_SQLITE)
+            conn.execute("DELETE FROM importacion_partida")
+            iterador = partidas(clientes, productos)
+            while True:
+                lote = list(islice(iterador, TAMANO_LOTE))
+                if not lote:
+                    break
+                conn.executemany(SQL_INSERTAR_STAGING_SQLITE, (
+                    (referencia, pedido_id, cliente_id, fecha.isoformat(), producto_id, cantidad)
+                    for referencia, pedido_id, cliente_id, fecha, producto_id, cantidad in lote
+                ))
+
+            conn.execute("DELETE FROM importacion_partida WHERE referencia IN (SELECT value FROM json_each(?))",
+                         (json.dumps(sorted(resultado.pedidos_rechazados)),))
+            resultado.ya_importados.update(fila[0] for fila in conn.execute(SQL_YA_IMPORTADOS))
+            conn.execute(SQL_QUITAR_IMPORTADOS)
+            for sql in SQL_CARGAR_STAGING_SQLITE:
+                cursor = conn.execute(sql)
+            # La última escritura es la de Pedido_Producto
+            resultado.partidas = cursor.rowcount
+            conn.execute("DROP TABLE importacion_partida")
+    finally:
+        conn.close()
+
+
+def importar_pedidos(ruta, formato=None, errores=None, sqlite=None):
+    """
+    Importa el archivo y regresa un ResultadoImportacion. Con sqlite=ruta de la base se carga
+    a SQLite; si no, a PostgreSQL. Los rechazos van a errores (por defecto <ruta>.errores.csv).
+    """
+    formato = formato or detectar_formato(ruta)
+    reporte = ReporteErrores(errores or f"{ruta}.errores.csv")
+    resultado = ResultadoImportacion()
+
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        def partidas(clientes, productos):
+            return Validador(clientes, productos, reporte, resultado).partidas(LECTORES[formato](archivo))
+
+        try:
+            if sqlite:
+                _cargar_sqlite(partidas, resultado, sqlite)
+            else:
+                _cargar_postgres(partidas, resultado)
+        finally:
+            reporte.cerrar()
+    # En pedidos solo quedan los que sí entraron
+    for referencia in resultado.pedidos_rechazados | resultado.ya_importados:
+        resultado.pedidos.pop(referencia, None)
+    return resultado
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Importación masiva de pedidos desde CSV o JSON-lines")
+    parser.add_argument("archivo", help="Archivo de pedidos")
+    parser.add_argument("--formato", choices=sorted(LECTORES), help="Por defecto, según la extensión")
+    parser.add_argument("--errores", help="Reporte de líneas rechazadas (por defecto <archivo>.errores.csv)")
+    parser.add_argument("--sqlite", help="Cargar a esta base SQLite en lugar de PostgreSQL")
+    parser.add_argument("--ids", help="CSV con el pedido_id asignado a cada referencia")
+    args = parser.parse_args(argumentos)
+
+    errores = args.errores or f"{args.archivo}.errores.csv"
+    resultado = importar_pedidos(args.archivo, args.formato, errores, args.sqlite)
+
+    if args.ids:
+        with open(args.ids, "w", encoding="utf-8", newline="") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(("referencia", "pedido_id"))
+            escritor.writerows((referencia, datos[0]) for referencia, datos in resultado.pedidos.items())
+
+    print(f"{resultado.lineas} líneas, {len(resultado.pedidos)} pedidos, {resultado.partidas} partidas importadas")
+    if resultado.ya_importados:
+        print(f"{len(resultado.ya_importados)} pedidos ya estaban importados y se omitieron")
+    if resultado.rechazadas:
+        print(f"{resultado.rechazadas} líneas rechazadas ({len(resultado.pedidos_rechazados)} pedidos completos "
+              f"sin importar): ver {errores}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
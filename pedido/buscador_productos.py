@@ -0,0 +1,64 @@
+# buscador_productos.py
+#
+# Caja de búsqueda de productos para las ventanas de Tk, sobre el índice de busqueda.py.
+# Va aparte para que busqueda.py se pueda importar sin tkinter (servicio_http.py).
+import tkinter as tk
+
+from busqueda import MAX_RESULTADOS
+
+
+class BuscadorProductos(tk.Frame):
+    """
+    Caja de texto con la lista de resultados debajo. Al elegir un producto, variable
+    (StringVar) queda con el texto "id - nombre - $precio".
+    """
+
+    def __init__(self, padre, indice, variable, limite=MAX_RESULTADOS, alto=6):
+        super().__init__(padre)
+        self.indice = indice
+        self.variable = variable
+        self.limite = limite
+        self._resultados = []
+
+        self.entrada = tk.Entry(self)
+        self.entrada.pack(fill=tk.X)
+        self.lista = tk.Listbox(self, height=alto, exportselection=False)
+        self.lista.pack(fill=tk.BOTH, expand=True)
+
+        self.entrada.bind("<KeyRelease>", self._al_escribir)
+        self.entrada.bind("<Down>", lambda evento: self._mover(1))
+        self.entrada.bind("<Up>", lambda evento: self._mover(-1))
+        self.entrada.bind("<Return>", lambda evento: self._elegir())
+        self.lista.bind("<<ListboxSelect>>", lambda evento: self._elegir())
+
+    @staticmethod
+    def texto(fila):
+        return f"{fila[0]} - {fila[1]} - ${fila[2]}"
+
+    def _al_escribir(self, evento):
+        if evento.keysym in ("Up", "Down", "Return"):
+            return
+        self._resultados = self.indice.buscar(self.entrada.get(), self.limite)
+        self.lista.delete(0, tk.END)
+        for fila in self._resultados:
+            self.lista.insert(tk.END, self.texto(fila))
+        self.variable.set("")
+        if self._resultados:
+            # El primer resultado queda elegido; las flechas cambian la elección
+            self.lista.selection_set(0)
+            self._elegir()
+
+    def _mover(self, paso):
+        if not self._resultados:
+            return
+        actual = self.lista.curselection()
+        posicion = min(max((actual[0] if actual else -1) + paso, 0), len(self._resultados) - 1)
+        self.lista.selection_clear(0, tk.END)
+        self.lista.selection_set(posicion)
+        self.lista.see(posicion)
+        self._elegir()
+
+    def _elegir(self):
+        actual = self.lista.curselection()
+        if actual:
+            self.variable.set(self.texto(self._resultados[actual[0]]))
@@ -0,0 +1,304 @@
+# busqueda.py
+#
+# Búsqueda de productos mientras se escribe, para capturar pedidos con decenas de miles
+# de productos. El índice guarda en memoria los tokens del id y del nombre: cada término
+# de la consulta debe ser el prefijo de algún token del producto ("lap 15" encuentra
+# "Laptop HP 15"). Los tokens están ordenados, así los que empiezan con un prefijo son un
+# rango contiguo que se encuentra con bisect; los prefijos muy cortos, que abarcan casi
+# todo el catálogo, tienen sus productos ya reunidos.
+#
+# Cada token guarda sus productos en un conjunto y ordenados por nombre, que es el orden
+# de los resultados: los candidatos salen de intersectar conjuntos, y cuando son muchos
+# basta recorrer la lista en orden hasta juntar los que se muestran, sin ordenarlos todos.
+#
+# El índice se arma una vez desde el catálogo (catalogo.py) y se actualiza con las filas
+# que el catálogo relee, sin reconstruirse. No depende de Tk, así lo usa también
+# servicio_http.py; la caja de búsqueda para la ventana está en buscador_productos.py.
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import unicodedata
+
+# Resultados que se muestran como máximo
+MAX_RESULTADOS = 20
+
+# Prefijos de hasta esta longitud tienen sus productos reunidos
+LONGITUD_CORTA = 2
+
+# Con más filas que esto, actualizar agrega sin orden y ordena las listas una sola vez al final
+LOTE_MASIVO = 64
+
+
+def normalizar(texto):
+    # Minúsculas y sin acentos: "Audífonos" y "audifonos" se escriben igual
+    texto = str(texto).lower()
+    if texto.isascii():
+        return texto.strip()
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).strip()
+
+
+def separar_tokens(texto):
+    return re.findall(r"[0-9a-z]+", texto)
+
+
+def _prefijos_cortos(tokens):
+    return {token[:largo] for token in tokens for largo in range(1, LONGITUD_CORTA + 1) if largo <= len(token)}
+
+
+class _Posteo:
+    """Productos de un token o prefijo: conjunto para preguntar y lista de (nombre, id) en orden"""
+
+    __slots__ = ("ids", "orden")
+
+    def __init__(self):
+        self.ids = set()
+        self.orden = []
+
+    def agregar(self, clave, masivo):
+        self.ids.add(clave[1])
+        if masivo:
+            self.orden.append(clave)
+        else:
+            bisect.insort(self.orden, clave)
+
+    def quitar(self, clave):
+        self.ids.discard(clave[1])
+        _quitar_ordenado(self.orden, clave)
+
+
+class IndiceProductos:
+    """
+    Índice de prefijos y tokens sobre (id, nombre) de filas (id, nombre, precio, ...).
+    incluir(fila) decide qué filas entran (p. ej. solo las activas).
+    """
+
+    def __init__(self, filas=(), incluir=None):
+        self.incluir = incluir
+        self._candado = threading.Lock()
+        self._productos = {}    # id -> (fila, id normalizado, (nombre normalizado, id), tokens)
+        self._tokens = {}       # token -> _Posteo
+        self._ordenados = []    # Tokens en orden, para buscar por prefijo
+        self._cortos = {}       # Prefijo de hasta LONGITUD_CORTA letras -> _Posteo
+        self._por_id = []       # (id normalizado, id) en orden
+        self._por_nombre = []   # (nombre normalizado, id) en orden
+        self._catalogo = None
+        self.actualizar(filas, [])
+
+    @classmethod
+    def desde_catalogo(cls, catalogo, incluir=None):
+        """Índice que sigue al catálogo: cada búsqueda aplica primero sus cambios pendientes"""
+        indice = cls(incluir=incluir)
+        indice._catalogo = catalogo
+        catalogo.suscribir(indice.actualizar)
+        return indice
+
+    def __len__(self):
+        return len(self._productos)
+
+    # -----------------------------------------------------------------------
+    # Actualización incremental
+    # -----------------------------------------------------------------------
+
+    def actualizar(self, filas, eliminados):
+        """Agrega o reemplaza las filas y quita los ids eliminados"""
+        with self._candado:
+            for id_producto in eliminados:
+                self._quitar(id_producto)
+
+            nuevas = []
+            # Si un id viene repetido, vale su última fila
+            for fila in {fila[0]: fila for fila in filas}.values():
+                anterior = self._productos.get(fila[0])
+                incluida = self.incluir is None or self.incluir(fila)
+                if anterior is not None:
+                    if anterior[0] == fila:
+                        continue
+                    # Cambio de precio o stock: el nombre y los tokens siguen igual
+                    if incluida and anterior[2][0] == normalizar(fila[1]):
+                        self._productos[fila[0]] = (fila,) + anterior[1:]
+                        continue
+                    self._quitar(fila[0])
+                if incluida:
+                    nuevas.append(fila)
+
+            masivo = len(nuevas) > LOTE_MASIVO
+            for fila in nuevas:
+                self._agregar(fila, masivo)
+            if masivo:
+                self._por_id.sort()
+                self._por_nombre.sort()
+                self._ordenados.sort()
+                for posteo in list(self._tokens.values()) + list(self._cortos.values()):
+                    posteo.orden.sort()
+
+    def _agregar(self, fila, masivo):
+        # En una carga masiva solo se agrega al final; actualizar ordena después
+        agregar = list.append if masivo else bisect.insort
+        id_producto = fila[0]
+        id_normal = normalizar(id_producto)
+        clave = (normalizar(fila[1]), id_producto)
+        tokens = set(separar_tokens(id_normal)) | set(separar_tokens(clave[0]))
+        self._productos[id_producto] = (fila, id_normal, clave, tokens)
+        agregar(self._por_id, (id_normal, id_producto))
+        agregar(self._por_nombre, clave)
+        for token in tokens:
+            posteo = self._tokens.get(token)
+            if posteo is None:
+                posteo = self._tokens[token] = _Posteo()
+                agregar(self._ordenados, token)
+            posteo.agregar(clave, masivo)
+        for prefijo in _prefijos_cortos(tokens):
+            posteo = self._cortos.get(prefijo)
+            if posteo is None:
+                posteo = self._cortos[prefijo] = _Posteo()
+            posteo.agregar(clave, masivo)
+
+    def _quitar(self, id_producto):
+        datos = self._productos.pop(id_producto, None)
+        if datos is None:
+            return
+        _, id_normal, clave, tokens = datos
+        _quitar_ordenado(self._por_id, (id_normal, id_producto))
+        _quitar_ordenado(self._por_nombre, clave)
+        for token in tokens:
+            posteo = self._tokens[token]
+            posteo.quitar(clave)
+            if not posteo.ids:
+                del self._tokens[token]
+                _quitar_ordenado(self._ordenados, token)
+        for prefijo in _prefijos_cortos(tokens):
+            posteo = self._cortos[prefijo]
+            posteo.quitar(clave)
+            if not posteo.ids:
+                del self._cortos[prefijo]
+
+    # -----------------------------------------------------------------------
+    # Consulta
+    # -----------------------------------------------------------------------
+
+    def _posteos(self, termino):
+        # Posteos de los productos con algún token que empieza con termino
+        if len(termino) <= LONGITUD_CORTA:
+            posteo = self._cortos.get(termino)
+            return [posteo] if posteo else []
+        inicio = bisect.bisect_left(self._ordenados, termino)
+        # "{" va justo después de "z": el rango cubre todos los tokens que empiezan con termino
+        fin = bisect.bisect_left(self._ordenados, termino + "{", inicio)
+        return [self._tokens[token] for token in self._ordenados[inicio:fin]]
+
+    def _empiezan_con(self, ordenados, consulta, limite):
+        # Hasta limite ids cuyo texto (id o nombre normalizado) empieza con la consulta, en orden.
+        # Todos coinciden con la consulta: cada término es prefijo del token en la misma posición.
+        encontrados = []
+        posicion = bisect.bisect_left(ordenados, (consulta,))
+        while posicion < len(ordenados) and len(encontrados) < limite:
+            texto, id_producto = ordenados[posicion]
+            if not texto.startswith(consulta):
+                break
+            encontrados.append(id_producto)
+            posicion += 1
+        return encontrados
+
+    def _coincide(self, id_producto, otros):
+        # ¿El producto tiene, para cada término, un token que empieza con él?
+        for termino, lista in otros:
+            if len(lista) <= 4:
+                if not any(id_producto in p.ids for p in lista):
+                    return False
+            elif not any(token.startswith(termino) for token in self._productos[id_producto][3]):
+                return False
+        return True
+
+    def _por_terminos(self, terminos, vistos, cuantos):
+        # Los primeros productos (por nombre) que coinciden con todos los términos
+        por_termino = sorted(
+            ((sum(len(p.ids) for p in lista), termino, lista)
+             for termino, lista in ((t, self._posteos(t)) for t in terminos)),
+            key=lambda elemento: elemento[0]
+        )
+        tamano_guia, _, guia = por_termino[0]
+        if tamano_guia == 0:
+            return []
+        otros = [(termino, lista) for _, termino, lista in por_termino[1:]]
+
+        def recorrido():
+            # Productos del término guía en orden de nombre (un producto puede repetirse)
+            if len(guia) == 1:
+                return iter(guia[0].orden)
+            return heapq.merge(*(p.orden for p in guia))
+
+        # Primer intento: recorrer un tramo corto de la guía revisando los demás términos.
+        # Cuando coinciden muchos productos se juntan ahí sin calcular la intersección.
+        encontrados = []
+        revisados = set(vistos)
+        for _, id_producto in itertools.islice(recorrido(), 10 * cuantos):
+            if id_producto in revisados:
+                continue
+            revisados.add(id_producto)
+            if self._coincide(id_producto, otros):
+                encontrados.append(id_producto)
+                if len(encontrados) == cuantos:
+                    return encontrados
+
+        # Intersección empezando por el término con menos productos. De un término con varios
+        # tokens se intersecta cada token y se unen los resultados: cada intersección recorre
+        # el conjunto menor, así nunca se arma la unión completa de tokens como "prod".
+        candidatos = guia[0].ids if len(guia) == 1 else set().union(*(p.ids for p in guia))
+        for _, lista in otros:
+            candidatos = set().union(*(candidatos & p.ids for p in lista))
+            if not candidatos:
+                return []
+
+        # Muchos candidatos: aparecen pronto al recorrer la guía, que ya está por nombre.
+        # Se pone un tope por si se juntan al final, y si no, se toman los menores.
+        if len(candidatos) ** 2 > cuantos * tamano_guia:
+            tope = 4 * cuantos * tamano_guia // len(candidatos)
+            encontrados = []
+            revisados = set(vistos)
+            for _, id_producto in itertools.islice(recorrido(), tope):
+                if id_producto in candidatos and id_producto not in revisados:
+                    revisados.add(id_producto)
+                    encontrados.append(id_producto)
+                    if len(encontrados) == cuantos:
+                        return encontrados
+        return [id_producto for _, id_producto in heapq.nsmallest(
+            cuantos, (self._productos[i][2] for i in candidatos if i not in vistos)
+        )]
+
+    def buscar(self, consulta, limite=MAX_RESULTADOS):
+        """
+        Filas que coinciden con la consulta, a lo más limite, en este orden: id que empieza
+        con la consulta (por id), nombre que empieza con la consulta y el resto (por nombre).
+        """
+        if self._catalogo is not None:
+            self._catalogo.refrescar()
+
+        consulta = normalizar(consulta)
+        terminos = set(separar_tokens(consulta))
+        if not terminos or limite <= 0:
+            return []
+
+        with self._candado:
+            elegidos = self._empiezan_con(self._por_id, consulta, limite)
+            vistos = set(elegidos)
+            for id_producto in self._empiezan_con(self._por_nombre, consulta, limite):
+                if len(elegidos) == limite:
+                    break
+                if id_producto not in vistos:
+                    elegidos.append(id_producto)
+                    vistos.add(id_producto)
+
+            # Si los que empiezan con la consulta no alcanzan, se buscan los demás por token
+            if len(elegidos) < limite:
+                elegidos += self._por_terminos(terminos, vistos, limite - len(elegidos))
+
+            return [self._productos[id_producto][0] for id_producto in elegidos]
+
+
+def _quitar_ordenado(lista, valor):
+    posicion = bisect.bisect_left(lista, valor)
+    if posicion < len(lista) and lista[posicion] == valor:
+        del lista[posicion]
@@ -1,119 +1,342 @@
-import tkinter as tk
-from tkinter import messagebox
-from conexion import conectar
+from conexion import conexion_dedicada, obtener_conexion
+from catalogo import CatalogoProductos
+from busqueda import IndiceProductos
+from identificadores import nuevo_id
 from datetime import date
 import uuid
 
+# Filas del catálogo: todos los productos o solo los ids indicados
+def cargar_productos(ids=None):
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        if ids is None:
+            cur.execute("SELECT id, nombre, precio, stock, estado FROM Producto")
+        else:
+            cur.execute("SELECT id, nombre, precio, stock, estado FROM Producto WHERE id = ANY(%s)", (list(ids),))
+        return cur.fetchall()
+
+# Catálogo en memoria compartido por las ventanas del proceso
+catalogo = CatalogoProductos(cargar_productos)
+
 # Obtener productos activos
 def obtener_productos_activos():
-    conn = conectar()
-    cur = conn.cursor()
-    cur.execute("SELECT id, nombre, precio FROM Producto WHERE estado = 'ACTIVO'")
-    productos = cur.fetchall()
-    conn.close()
-    return productos
-
-# Crear pedido con más datos
-def crear_pedido(cliente_id, producto_id, cantidad, direccion, tipo, observaciones):
-    conn = conectar()
-    cur = conn.cursor()
-    pedido_id = str(uuid.uuid4())
-    hoy = date.today()
+    return [(p[0], p[1], p[2]) for p in catalogo.activos()]
+
+class StockInsuficienteError(Exception):
+    """faltantes: lista de (producto_id, cantidad pedida, stock disponible o None si no está activo)"""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = ", ".join(f"{p} (pide {c}, hay {d if d is not None else 'no disponible'})" for p, c, d in faltantes)
+        super().__init__(f"Stock insuficiente: {detalle}")
+
 
-    # Insertar el pedido con datos nuevos
-    cur.execute("""
+# Todo el carrito en una sola sentencia (un viaje al servidor): las líneas llegan como dos
+# arreglos, se descuenta el stock de cada producto solo si alcanza, y el pedido y sus partidas
+# se insertan solo si se apartaron todas las líneas. El SELECT final dice qué línea faltó.
+SQL_CREAR_PEDIDO_CARRITO = """
+    WITH lineas AS (
+        SELECT producto_id, SUM(cantidad)::int AS cantidad
+        FROM unnest(%(productos)s::varchar[], %(cantidades)s::int[]) AS l(producto_id, cantidad)
+        GROUP BY producto_id
+    ),
+    apartados AS (
+        UPDATE Producto AS p SET stock = p.stock - l.cantidad
+        FROM lineas AS l
+        WHERE p.id = l.producto_id AND p.estado = 'ACTIVO' AND p.stock >= l.cantidad
+        RETURNING p.id
+    ),
+    pedido AS (
         INSERT INTO Pedido (id, cliente_id, fecha, estado, direccion_entrega, tipo_pedido, observaciones)
-        VALUES (%s, %s, %s, 'PENDIENTE', %s, %s, %s)
-    """, (pedido_id, cliente_id, hoy, direccion, tipo, observaciones))
+        SELECT %(pedido_id)s, %(cliente_id)s, %(fecha)s, 'PENDIENTE', %(direccion)s, %(tipo)s, %(observaciones)s
+        WHERE (SELECT COUNT(*) FROM apartados) = (SELECT COUNT(*) FROM lineas)
+        RETURNING id
+    ),
+    partidas AS (
+        INSERT INTO Pedido_Producto (pedido_id, producto_id, cantidad)
+        SELECT pedido.id, l.producto_id, l.cantidad FROM pedido CROSS JOIN lineas AS l
+    )
+    SELECT l.producto_id, l.cantidad,
+           CASE WHEN p.estado = 'ACTIVO' THEN p.stock END AS disponible,
+           EXISTS (SELECT 1 FROM apartados AS a WHERE a.id = l.producto_id) AS apartado
+    FROM lineas AS l
+    LEFT JOIN Producto AS p ON p.id = l.producto_id
+"""
 
-    cur.execute("INSERT INTO Pedido_Producto (pedido_id, producto_id, cantidad) VALUES (%s, %s, %s)",
-                (pedido_id, producto_id, cantidad))
+# Crear un pedido con varias líneas (carrito): [(producto_id, cantidad), ...]
+def crear_pedido_carrito(cliente_id, lineas, direccion, tipo, observaciones):
+    lineas = list(lineas)
+    if not lineas:
+        raise ValueError("El carrito está vacío")
+    if any(int(cantidad) <= 0 for _, cantidad in lineas):
+        raise ValueError("Las cantidades deben ser positivas")
+
+    # Ordenado por tiempo: el pedido y sus partidas se insertan al final de sus índices
+    pedido_id = nuevo_id()
+    parametros = {
+        "productos": [producto_id for producto_id, _ in lineas],
+        "cantidades": [int(cantidad) for _, cantidad in lineas],
+        "pedido_id": pedido_id,
+        "cliente_id": cliente_id,
+        "fecha": date.today(),
+        "direccion": direccion,
+        "tipo": tipo,
+        "observaciones": observaciones,
+    }
+
+    try:
+        with obtener_conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_CREAR_PEDIDO_CARRITO, parametros)
+            faltantes = [(producto, cantidad, disponible)
+                         for producto, cantidad, disponible, apartado in cur.fetchall() if not apartado]
+            if faltantes:
+                # La excepción hace rollback: se devuelve el stock de las líneas que sí alcanzaban
+                raise StockInsuficienteError(faltantes)
+    finally:
+        # El stock de estos productos cambió, o el catálogo estaba atrasado si faltó alguno
+        catalogo.invalidar(parametros["productos"])
 
-    conn.commit()
-    conn.close()
     return pedido_id
 
+# Crear pedido de un solo producto (un carrito de una línea)
+def crear_pedido(cliente_id, producto_id, cantidad, direccion, tipo, observaciones):
+    return crear_pedido_carrito(cliente_id, [(producto_id, cantidad)], direccion, tipo, observaciones)
+
+# Pedidos por página en la vista de pedidos
+PEDIDOS_POR_PAGINA = 50
+
+ESTADOS_PEDIDO = ("PENDIENTE", "EN_PROCESO", "EN_RUTA", "ENTREGADO", "CANCELADO")
+
+TIPOS_PEDIDO = ("Regular", "Urgente", "Programado")
+
+# Un renglón por producto de cada pedido; un pedido sin productos sale con nombre y cantidad en NULL
+SQL_RENGLONES_PEDIDOS = """
+    SELECT P.id, P.fecha, P.estado, PR.nombre, PP.cantidad, P.tipo_pedido, P.direccion_entrega, P.observaciones
+    FROM ({pedidos}) P
+    LEFT JOIN Pedido_Producto PP ON P.id = PP.pedido_id
+    LEFT JOIN Producto PR ON PP.producto_id = PR.id
+    ORDER BY P.fecha DESC, P.id DESC, PR.nombre
+"""
+
+def _filtros_pedidos(cliente_id, estado=None, desde=None, hasta=None):
+    # Filtros opcionales; todos usan el índice (cliente_id, fecha DESC, id DESC)
+    condiciones = ["cliente_id = %(cliente_id)s"]
+    if estado:
+        condiciones.append("estado = %(estado)s")
+    if desde:
+        condiciones.append("fecha >= %(desde)s")
+    if hasta:
+        condiciones.append("fecha <= %(hasta)s")
+    parametros = {"cliente_id": cliente_id, "estado": estado, "desde": desde, "hasta": hasta}
+    return condiciones, parametros
+
+# Una página de pedidos (paginación por llave sobre (fecha, id), sin OFFSET)
+def consultar_pedidos_pagina(cliente_id, despues_de=None, limite=PEDIDOS_POR_PAGINA, estado=None, desde=None, hasta=None):
+    """
+    Los siguientes `limite` pedidos del cliente, del más reciente al más antiguo, con sus renglones.
+    despues_de es la llave (fecha, id) que regresó la página anterior.
+    Regresa (renglones, llave de la siguiente página o None si ya no hay más).
+    """
+    condiciones, parametros = _filtros_pedidos(cliente_id, estado, desde, hasta)
+    if despues_de is not None:
+        condiciones.append("(fecha, id) < (%(fecha)s, %(id)s)")
+        parametros["fecha"], parametros["id"] = despues_de
+    parametros["limite"] = limite
+
+    pedidos = f"""
+        SELECT * FROM Pedido
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY fecha DESC, id DESC
+        LIMIT %(limite)s
+    """
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_RENGLONES_PEDIDOS.format(pedidos=pedidos), parametros)
+        renglones = cur.fetchall()
+
+    llaves = list(dict.fromkeys((fila[1], fila[0]) for fila in renglones))
+    siguiente = llaves[-1] if len(llaves) == limite else None
+    return renglones, siguiente
+
+# Todos los renglones de pedidos del cliente sin cargarlos a la vez en memoria
+def iterar_pedidos(cliente_id, estado=None, desde=None, hasta=None, tamano_bloque=500):
+    # Cursor con nombre: vive en el servidor y se lee en bloques de tamano_bloque renglones.
+    # La conexión queda prestada hasta que se termina (o se cierra) el generador.
+    condiciones, parametros = _filtros_pedidos(cliente_id, estado, desde, hasta)
+    pedidos = f"SELECT * FROM Pedido WHERE {' AND '.join(condiciones)}"
+    with obtener_conexion() as conn:
+        cur = conn.cursor(name=f"pedidos_{uuid.uuid4().hex}")
+        cur.itersize = tamano_bloque
+        try:
+            cur.execute(SQL_RENGLONES_PEDIDOS.format(pedidos=pedidos), parametros)
+            yield from cur
+        finally:
+            cur.close()
+
 # Consultar pedidos por cliente
 def consultar_pedidos(cliente_id):
-    conn = conectar()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT P.id, P.fecha, P.estado, PR.nombre, PP.cantidad, P.tipo_pedido, P.direccion_entrega, P.observaciones
-        FROM Pedido P
-        JOIN Pedido_Producto PP ON P.id = PP.pedido_id
-        JOIN Producto PR ON PP.producto_id = PR.id
-        WHERE P.cliente_id = %s
-        ORDER BY P.fecha DESC
-    """, (cliente_id,))
-    resultados = cur.fetchall()
-    conn.close()
-    return resultados
-
-# Crear interfaz
-ventana = tk.Tk()
-ventana.title("Cliente Empresa - Tienda Mayorista")
-ventana.geometry("600x600")
-
-tk.Label(ventana, text="ID del Cliente:").pack()
-cliente_entry = tk.Entry(ventana)
-cliente_entry.pack()
-
-productos = obtener_productos_activos()
-producto_var = tk.StringVar()
-tk.Label(ventana, text="Selecciona un Producto:").pack()
-producto_menu = tk.OptionMenu(ventana, producto_var, *[
-    f"{p[0]} - {p[1]} - ${p[2]}" for p in productos
-])
-producto_menu.pack()
-
-tk.Label(ventana, text="Cantidad:").pack()
-cantidad_entry = tk.Entry(ventana)
-cantidad_entry.pack()
-
-tk.Label(ventana, text="Dirección de Entrega:").pack()
-direccion_entry = tk.Entry(ventana, width=50)
-direccion_entry.pack()
-
-tk.Label(ventana, text="Tipo de Pedido:").pack()
-tipo_var = tk.StringVar()
-tipo_menu = tk.OptionMenu(ventana, tipo_var, "Regular", "Urgente", "Programado")
-tipo_menu.pack()
-
-tk.Label(ventana, text="Observaciones (opcional):").pack()
-observaciones_entry = tk.Entry(ventana, width=50)
-observaciones_entry.pack()
-
-def accion_realizar_pedido():
-    cliente_id = cliente_entry.get().strip()
-    cantidad = cantidad_entry.get().strip()
-    prod_str = producto_var.get()
-    direccion = direccion_entry.get().strip()
-    tipo = tipo_var.get().strip()
-    observaciones = observaciones_entry.get().strip()
-
-    if not cliente_id or not cantidad.isdigit() or not prod_str or not direccion or not tipo:
-        messagebox.showerror("Error", "Completa todos los campos obligatorios.")
-        return
-
-    producto_id = prod_str.split(" - ")[0]
-    pedido_id = crear_pedido(cliente_id, producto_id, int(cantidad), direccion, tipo, observaciones)
-    messagebox.showinfo("Éxito", f"Pedido registrado con ID: {pedido_id}")
-
-def accion_consultar_pedidos():
-    cliente_id = cliente_entry.get().strip()
-    pedidos = consultar_pedidos(cliente_id)
-
-    if not pedidos:
-        messagebox.showinfo("Sin resultados", "No hay pedidos para este cliente.")
-        return
-
-    mensaje = ""
-    for pid, fecha, estado, prod, cant, tipo, direccion, obs in pedidos:
-        mensaje += f"ID: {pid}\nFecha: {fecha}\nProducto: {prod} x{cant}\nEstado: {estado}\n"
-        mensaje += f"Tipo: {tipo}\nEntrega: {direccion}\nObs: {obs or 'N/A'}\n\n"
-    messagebox.showinfo("Pedidos", mensaje)
-
-tk.Button(ventana, text="Realizar Pedido", command=accion_realizar_pedido).pack(pady=10)
-tk.Button(ventana, text="Consultar Pedidos", command=accion_consultar_pedidos).pack(pady=5)
-
-ventana.mainloop()
\ No newline at end of file
+    return list(iterar_pedidos(cliente_id))
+
+# Interfaz gráfica; al importar el módulo (p. ej. servicio_http.py) solo quedan las funciones
+if __name__ == "__main__":
+    # tkinter solo para la ventana: servicio_http.py importa este módulo sin interfaz gráfica
+    import tkinter as tk
+    from tkinter import messagebox, ttk
+    from buscador_productos import BuscadorProductos
+
+    # Crear interfaz
+    ventana = tk.Tk()
+    ventana.title("Cliente Empresa - Tienda Mayorista")
+    ventana.geometry("600x600")
+
+    tk.Label(ventana, text="ID del Cliente:").pack()
+    cliente_entry = tk.Entry(ventana)
+    cliente_entry.pack()
+
+    # Cambios hechos por otros procesos (trigger trg_producto_notificar) invalidan el catálogo
+    catalogo.escuchar(conexion_dedicada)
+    producto_var = tk.StringVar()
+    # Búsqueda por id o nombre mientras se escribe, en lugar de un menú con todos los productos
+    indice_productos = IndiceProductos.desde_catalogo(catalogo, incluir=lambda p: p[4] == "ACTIVO")
+    tk.Label(ventana, text="Buscar producto (id o nombre):").pack()
+    producto_buscador = BuscadorProductos(ventana, indice_productos, producto_var)
+    producto_buscador.pack(fill=tk.X)
+
+    tk.Label(ventana, text="Cantidad:").pack()
+    cantidad_entry = tk.Entry(ventana)
+    cantidad_entry.pack()
+
+    # Líneas acumuladas para un pedido de varios productos
+    carrito = []
+    carrito_label = tk.Label(ventana, text="Carrito vacío")
+
+    def accion_agregar_al_carrito():
+        cantidad = cantidad_entry.get().strip()
+        prod_str = producto_var.get()
+        if not prod_str or not cantidad.isdigit() or int(cantidad) <= 0:
+            messagebox.showerror("Error", "Selecciona un producto y una cantidad válida.")
+            return
+        carrito.append((prod_str.split(" - ")[0], int(cantidad)))
+        carrito_label.config(text=f"Carrito: {len(carrito)} línea(s)")
+        cantidad_entry.delete(0, tk.END)
+
+    tk.Button(ventana, text="Agregar al carrito", command=accion_agregar_al_carrito).pack(pady=5)
+    carrito_label.pack()
+
+    tk.Label(ventana, text="Dirección de Entrega:").pack()
+    direccion_entry = tk.Entry(ventana, width=50)
+    direccion_entry.pack()
+
+    tk.Label(ventana, text="Tipo de Pedido:").pack()
+    tipo_var = tk.StringVar()
+    tipo_menu = tk.OptionMenu(ventana, tipo_var, *TIPOS_PEDIDO)
+    tipo_menu.pack()
+
+    tk.Label(ventana, text="Observaciones (opcional):").pack()
+    observaciones_entry = tk.Entry(ventana, width=50)
+    observaciones_entry.pack()
+
+    def accion_realizar_pedido():
+        cliente_id = cliente_entry.get().strip()
+        cantidad = cantidad_entry.get().strip()
+        prod_str = producto_var.get()
+        direccion = direccion_entry.get().strip()
+        tipo = tipo_var.get().strip()
+        observaciones = observaciones_entry.get().strip()
+
+        # Con carrito se piden sus líneas; sin él, el producto y la cantidad seleccionados
+        if not cliente_id or not direccion or not tipo or (not carrito and (not cantidad.isdigit() or not prod_str)):
+            messagebox.showerror("Error", "Completa todos los campos obligatorios.")
+            return
+
+        lineas = carrito or [(prod_str.split(" - ")[0], int(cantidad))]
+        try:
+            pedido_id = crear_pedido_carrito(cliente_id, lineas, direccion, tipo, observaciones)
+        except (StockInsuficienteError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        carrito.clear()
+        carrito_label.config(text="Carrito vacío")
+        messagebox.showinfo("Éxito", f"Pedido registrado con ID: {pedido_id}")
+
+    def mostrar_pedidos(cliente_id):
+        # Ventana con los pedidos del cliente; carga la siguiente página al acercarse al final
+        vista = tk.Toplevel(ventana)
+        vista.title(f"Pedidos de {cliente_id}")
+        vista.geometry("900x450")
+
+        filtros = tk.Frame(vista)
+        filtros.pack(fill=tk.X, pady=5)
+        tk.Label(filtros, text="Estado:").pack(side=tk.LEFT)
+        estado_var = tk.StringVar(value="Todos")
+        tk.OptionMenu(filtros, estado_var, "Todos", *ESTADOS_PEDIDO).pack(side=tk.LEFT)
+        tk.Label(filtros, text="Desde (AAAA-MM-DD):").pack(side=tk.LEFT)
+        desde_entry = tk.Entry(filtros, width=12)
+        desde_entry.pack(side=tk.LEFT)
+        tk.Label(filtros, text="Hasta:").pack(side=tk.LEFT)
+        hasta_entry = tk.Entry(filtros, width=12)
+        hasta_entry.pack(side=tk.LEFT)
+
+        marco = tk.Frame(vista)
+        marco.pack(fill=tk.BOTH, expand=True)
+        columnas = ("fecha", "estado", "producto", "cantidad", "tipo", "entrega", "observaciones")
+        tabla = ttk.Treeview(marco, columns=columnas, show="headings")
+        for columna, encabezado in zip(columnas, ("Fecha", "Estado", "Producto", "Cantidad", "Tipo", "Entrega", "Observaciones")):
+            tabla.heading(columna, text=encabezado)
+        barra = tk.Scrollbar(marco, orient=tk.VERTICAL, command=tabla.yview)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+        tabla.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        pagina = {"filtros": {}, "siguiente": None, "terminado": False, "programada": False}
+
+        def cargar_pagina():
+            pagina["programada"] = False
+            if pagina["terminado"]:
+                return
+            renglones, pagina["siguiente"] = consultar_pedidos_pagina(
+                cliente_id, despues_de=pagina["siguiente"], **pagina["filtros"]
+            )
+            pagina["terminado"] = pagina["siguiente"] is None
+            for pid, fecha, estado, prod, cant, tipo, direccion, obs in renglones:
+                tabla.insert("", tk.END, values=(fecha, estado, prod or "(sin productos)", cant or "",
+                                                 tipo or "", direccion or "", obs or "N/A"))
+            if pagina["terminado"] and not tabla.get_children():
+                messagebox.showinfo("Sin resultados", "No hay pedidos para este cliente.", parent=vista)
+
+        def al_desplazar(primero, ultimo):
+            barra.set(primero, ultimo)
+            # Se pide la siguiente página cuando se ve el último 10% de lo cargado
+            if float(ultimo) > 0.9 and not pagina["programada"]:
+                pagina["programada"] = True
+                vista.after_idle(cargar_pagina)
+
+        tabla.configure(yscrollcommand=al_desplazar)
+
+        def buscar():
+            try:
+                desde = date.fromisoformat(desde_entry.get().strip()) if desde_entry.get().strip() else None
+                hasta = date.fromisoformat(hasta_entry.get().strip()) if hasta_entry.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Error", "Las fechas deben tener el formato AAAA-MM-DD.", parent=vista)
+                return
+            estado = estado_var.get()
+            pagina.update(filtros={"estado": None if estado == "Todos" else estado, "desde": desde, "hasta": hasta},
+                          siguiente=None, terminado=False)
+            tabla.delete(*tabla.get_children())
+            cargar_pagina()
+
+        tk.Button(filtros, text="Buscar", command=buscar).pack(side=tk.LEFT, padx=5)
+        buscar()
+
+    def accion_consultar_pedidos():
+        cliente_id = cliente_entry.get().strip()
+        if not cliente_id:
+            messagebox.showerror("Error", "Escribe el ID del cliente.")
+            return
+        mostrar_pedidos(cliente_id)
+
+    tk.Button(ventana, text="Realizar Pedido", command=accion_realizar_pedido).pack(pady=10)
+    tk.Button(ventana, text="Consultar Pedidos", command=accion_consultar_pedidos).pack(pady=5)
+
+    ventana.mainloop()
\ No newline at end of file
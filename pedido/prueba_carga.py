@@ -0,0 +1,159 @@
+# prueba_carga.py
+#
+# Prueba de carga para servicio_http.py. Abre varias conexiones keep-alive y en cada una
+# manda peticiones encadenadas (pipelining) sin esperar respuesta, hasta --pipeline en vuelo.
+# Reporta peticiones por segundo, códigos de respuesta y percentiles de latencia en JSON.
+#
+#   python prueba_carga.py --url http://127.0.0.1:8080/catalogo --conexiones 50 --segundos 10
+#   python prueba_carga.py --url http://127.0.0.1:8080/pedidos --metodo POST --cuerpo pedido.json
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, deque
+from urllib.parse import urlsplit
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentiles(valores):
+    """p50/p90/p95/p99 por rango más cercano, más mínimo, máximo y media"""
+    if not valores:
+        return {}
+    ordenados = sorted(valores)
+    n = len(ordenados)
+    resumen = {f"p{p}": ordenados[min(n - 1, max(0, -(-p * n // 100) - 1))] for p in PERCENTILES}
+    resumen["min"] = ordenados[0]
+    resumen["max"] = ordenados[-1]
+    resumen["media"] = sum(ordenados) / n
+    return resumen
+
+
+class Carga:
+    def __init__(self, host, puerto, peticion, pipeline, limite):
+        self.host = host
+        self.puerto = puerto
+        self.peticion = peticion
+        self.pipeline = pipeline
+        self.limite = limite        # Instante (perf_counter) en que se deja de mandar
+        self.latencias = []         # Milisegundos
+        self.codigos = Counter()
+        self.errores = 0
+
+    async def _leer_respuesta(self, lector):
+        linea = await lector.readline()
+        if not linea:
+            raise ConnectionError("El servidor cerró la conexión")
+        codigo = int(linea.split()[1])
+        longitud = 0
+        cerrar = False
+        while True:
+            linea = await lector.readline()
+            if linea in (b"\r\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            nombre = nombre.strip().lower()
+            if nombre == "content-length":
+                longitud = int(valor)
+            elif nombre == "connection" and "close" in valor.lower():
+                cerrar = True
+        await lector.readexactly(longitud)
+        return codigo, cerrar
+
+    async def _conexion(self):
+        lector, escritor = await asyncio.open_connection(self.host, self.puerto)
+        enviadas = deque()
+        en_vuelo = asyncio.Semaphore(self.pipeline)
+        terminado = False
+
+        async def mandar():
+            while time.perf_counter() < self.limite and not terminado:
+                await en_vuelo.acquire()
+                enviadas.append(time.perf_counter())
+                escritor.write(self.peticion)
+                await escritor.drain()
+
+        envio = asyncio.create_task(mandar())
+        try:
+            while not (envio.done() and not enviadas):
+                if not enviadas:
+                    await asyncio.sleep(0)
+                    continue
+                codigo, cerrar = await self._leer_respuesta(lector)
+                self.latencias.append((time.perf_counter() - enviadas.popleft()) * 1000)
+                self.codigos[codigo] += 1
+                en_vuelo.release()
+                if cerrar:
+                    break
+        finally:
+            terminado = True
+            # Las que quedaron sin respuesta cuentan como errores
+            self.errores += len(enviadas)
+            envio.cancel()
+            escritor.close()
+
+    async def _cliente(self):
+        # Si el servidor cierra la conexión se abre otra hasta que se acabe el tiempo
+        while time.perf_counter() < self.limite:
+            try:
+                await self._conexion()
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                self.errores += 1
+                await asyncio.sleep(0.05)
+
+    async def correr(self, conexiones):
+        await asyncio.gather(*(self._cliente() for _ in range(conexiones)))
+
+
+def armar_peticion(metodo, url, cuerpo):
+    partes = urlsplit(url)
+    destino = partes.path or "/"
+    if partes.query:
+        destino += "?" + partes.query
+    encabezados = [f"{metodo} {destino} HTTP/1.1", f"Host: {partes.netloc}"]
+    if cuerpo:
+        encabezados += ["Content-Type: application/json", f"Content-Length: {len(cuerpo)}"]
+    return ("\r\n".join(encabezados) + "\r\n\r\n").encode("latin-1") + cuerpo
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio HTTP de pedidos")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/catalogo")
+    parser.add_argument("--metodo", default="GET", choices=("GET", "POST"))
+    parser.add_argument("--cuerpo", help="Archivo JSON con el cuerpo de cada petición")
+    parser.add_argument("--conexiones", type=int, default=50)
+    parser.add_argument("--pipeline", type=int, default=8, help="Peticiones en vuelo por conexión")
+    parser.add_argument("--segundos", type=float, default=10)
+    args = parser.parse_args(argumentos)
+
+    cuerpo = b""
+    if args.cuerpo:
+        with open(args.cuerpo, "rb") as archivo:
+            cuerpo = archivo.read()
+    partes = urlsplit(args.url)
+    peticion = armar_peticion(args.metodo, args.url, cuerpo)
+
+    inicio = time.perf_counter()
+    carga = Carga(partes.hostname, partes.port or 80, peticion, args.pipeline, inicio + args.segundos)
+    asyncio.run(carga.correr(args.conexiones))
+    duracion = time.perf_counter() - inicio
+
+    reporte = {
+        "url": args.url,
+        "metodo": args.metodo,
+        "conexiones": args.conexiones,
+        "pipeline": args.pipeline,
+        "segundos": round(duracion, 3),
+        "respuestas": len(carga.latencias),
+        "por_segundo": round(len(carga.latencias) / duracion, 1),
+        "codigos": {str(codigo): n for codigo, n in sorted(carga.codigos.items())},
+        "errores": carga.errores,
+        "latencia_ms": {nombre: round(valor, 3) for nombre, valor in percentiles(carga.latencias).items()},
+    }
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    return 1 if carga.errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
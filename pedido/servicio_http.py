@@ -0,0 +1,389 @@
+# servicio_http.py
+#
+# Servicio JSON sobre HTTP/1.1 para recibir pedidos sin la ventana de Tk (p. ej. desde la
+# tienda en línea). Solo usa la biblioteca estándar y las funciones de interfaz_cliente.py:
+#
+#   GET  /catalogo[?q=texto&limite=20]   productos activos, o la búsqueda por id o nombre
+#   POST /pedidos                        {"cliente_id", "lineas": [{"producto_id", "cantidad"}],
+#                                         "direccion", "tipo", "observaciones"}
+#   GET  /pedidos?cliente_id=...         [&despues_de=fecha,id&limite=&estado=&desde=&hasta=]
+#   GET  /salud                          peticiones en curso y estadísticas del pool
+#
+#   python servicio_http.py --puerto 8080 --concurrencia 10
+#
+# psycopg2 bloquea, así que cada petición corre en un hilo de un ThreadPoolExecutor del mismo
+# tamaño que el pool de conexiones: ningún hilo espera conexión y el ciclo de eventos nunca se
+# detiene. Un semáforo limita las peticiones atendidas a la vez; si además hay más de
+# EN_ESPERA_MAX esperando, se responde 503 con Retry-After en lugar de encolar sin límite.
+# En cada conexión se siguen leyendo peticiones (pipelining) mientras se atienden las
+# anteriores, hasta PIPELINE_MAX; las respuestas salen en el orden en que llegaron.
+import argparse
+import asyncio
+import json
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from busqueda import MAX_RESULTADOS, IndiceProductos
+from conexion import conexion_dedicada, configurar_pool, estadisticas_pool
+from interfaz_cliente import (
+    ESTADOS_PEDIDO, PEDIDOS_POR_PAGINA, TIPOS_PEDIDO, StockInsuficienteError,
+    catalogo, consultar_pedidos_pagina, crear_pedido_carrito,
+)
+
+PUERTO = 8080
+# Peticiones atendidas a la vez (hilos y conexiones del pool)
+CONCURRENCIA = 10
+# Peticiones esperando turno antes de empezar a responder 503
+EN_ESPERA_MAX = 200
+# Peticiones encadenadas por conexión que se leen antes de responder la primera
+PIPELINE_MAX = 16
+# Segundos sin recibir nada antes de cerrar una conexión keep-alive
+ESPERA_INACTIVA = 30
+CUERPO_MAX = 1024 * 1024
+ENCABEZADOS_MAX = 100
+PEDIDOS_POR_PAGINA_MAX = 500
+
+
+class ErrorHttp(Exception):
+    def __init__(self, estado, mensaje, **datos):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.datos = datos
+
+
+def _a_json(valor):
+    # Los precios salen como texto para no perder centavos en un float
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"No se puede convertir {type(valor).__name__} a JSON")
+
+
+def _producto(fila):
+    id_producto, nombre, precio, stock, _ = fila
+    return {"id": id_producto, "nombre": nombre, "precio": precio, "stock": stock}
+
+
+def _entero(consulta, nombre, defecto, minimo, maximo):
+    valor = consulta.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErrorHttp(HTTPStatus.BAD_REQUEST, f"{nombre} debe ser un entero") from None
+    if not minimo <= valor <= maximo:
+        raise ErrorHttp(HTTPStatus.BAD_REQUEST, f"{nombre} debe estar entre {minimo} y {maximo}")
+    return valor
+
+
+def _fecha(valor, nombre):
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ErrorHttp(HTTPStatus.BAD_REQUEST, f"{nombre} debe ser una fecha AAAA-MM-DD") from None
+
+
+class ServicioPedidos:
+
+    def __init__(self, concurrencia=CONCURRENCIA, en_espera_max=EN_ESPERA_MAX,
+                 pipeline=PIPELINE_MAX, espera=ESPERA_INACTIVA):
+        self.concurrencia = concurrencia
+        self.en_espera_max = en_espera_max
+        self.pipeline = pipeline
+        self.espera = espera
+        self._ejecutor = ThreadPoolExecutor(concurrencia, thread_name_prefix="servicio_http")
+        self._semaforo = None
+        self._en_curso = 0
+        self._indice = None
+        self.rutas = {
+            ("GET", "/catalogo"): self.ver_catalogo,
+            ("GET", "/pedidos"): self.ver_pedidos,
+            ("POST", "/pedidos"): self.crear_pedido,
+            ("GET", "/salud"): self.salud,
+        }
+
+    # -----------------------------------------------------------------------
+    # Rutas (corren en los hilos del ejecutor)
+    # -----------------------------------------------------------------------
+
+    def ver_catalogo(self, consulta, cuerpo):
+        texto = consulta.get("q", "").strip()
+        if texto:
+            limite = _entero(consulta, "limite", MAX_RESULTADOS, 1, 100)
+            filas = self._indice.buscar(texto, limite)
+        else:
+            filas = catalogo.activos()
+        return HTTPStatus.OK, {"productos": [_producto(fila) for fila in filas]}
+
+    def ver_pedidos(self, consulta, cuerpo):
+        cliente_id = consulta.get("cliente_id", "").strip()
+        if not cliente_id:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "Falta cliente_id")
+        estado = consulta.get("estado") or None
+        if estado is not None and estado not in ESTADOS_PEDIDO:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, f"estado debe ser uno de {', '.join(ESTADOS_PEDIDO)}")
+        limite = _entero(consulta, "limite", PEDIDOS_POR_PAGINA, 1, PEDIDOS_POR_PAGINA_MAX)
+
+        # La llave de la página anterior viaja como "fecha,id"
+        despues_de = None
+        if consulta.get("despues_de"):
+            fecha, _, pedido_id = consulta["despues_de"].partition(",")
+            despues_de = (_fecha(fecha, "despues_de"), pedido_id)
+
+        renglones, siguiente = consultar_pedidos_pagina(
+            cliente_id, despues_de, limite, estado,
+            _fecha(consulta.get("desde"), "desde"), _fecha(consulta.get("hasta"), "hasta")
+        )
+
+        pedidos = {}
+        for pedido_id, fecha, estado, producto, cantidad, tipo, direccion, observaciones in renglones:
+            pedido = pedidos.get(pedido_id)
+            if pedido is None:
+                pedido = pedidos[pedido_id] = {
+                    "id": pedido_id, "fecha": fecha, "estado": estado, "tipo": tipo,
+                    "direccion": direccion, "observaciones": observaciones, "productos": [],
+                }
+            if producto is not None:
+                pedido["productos"].append({"nombre": producto, "cantidad": cantidad})
+        return HTTPStatus.OK, {
+            "pedidos": list(pedidos.values()),
+            "siguiente": f"{siguiente[0].isoformat()},{siguiente[1]}" if siguiente else None,
+        }
+
+    def crear_pedido(self, consulta, cuerpo):
+        try:
+            datos = json.loads(cuerpo)
+        except ValueError:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser JSON") from None
+        if not isinstance(datos, dict):
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser un objeto JSON")
+
+        cliente_id = str(datos.get("cliente_id") or "").strip()
+        direccion = str(datos.get("direccion") or "").strip()
+        tipo = datos.get("tipo")
+        observaciones = str(datos.get("observaciones") or "").strip()
+        if not cliente_id or not direccion:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "cliente_id y direccion son obligatorios")
+        if tipo not in TIPOS_PEDIDO:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, f"tipo debe ser uno de {', '.join(TIPOS_PEDIDO)}")
+
+        lineas = datos.get("lineas")
+        if not isinstance(lineas, list) or not all(
+            isinstance(linea, dict) and isinstance(linea.get("producto_id"), str)
+            and type(linea.get("cantidad")) is int for linea in lineas
+        ):
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "lineas debe ser una lista de {producto_id, cantidad}")
+
+        try:
+            pedido_id = crear_pedido_carrito(
+                cliente_id, [(linea["producto_id"], linea["cantidad"]) for linea in lineas],
+                direccion, tipo, observaciones
+            )
+        except StockInsuficienteError as error:
+            raise ErrorHttp(HTTPStatus.CONFLICT, str(error), faltantes=[
+                {"producto_id": producto, "cantidad": cantidad, "disponible": disponible}
+                for producto, cantidad, disponible in error.faltantes
+            ]) from None
+        except ValueError as error:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, str(error)) from None
+        return HTTPStatus.CREATED, {"pedido_id": pedido_id}
+
+    def salud(self, consulta, cuerpo):
+        return HTTPStatus.OK, {"en_curso": self._en_curso, "pool": estadisticas_pool()}
+
+    def _ejecutar(self, ruta, consulta, cuerpo):
+        try:
+            return ruta(consulta, cuerpo)
+        except ErrorHttp as error:
+            return error.estado, {"error": str(error), **error.datos}
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error interno"}
+
+    # -----------------------------------------------------------------------
+    # HTTP
+    # -----------------------------------------------------------------------
+
+    async def _despachar(self, metodo, ruta, consulta, cuerpo):
+        funcion = self.rutas.get((metodo, ruta))
+        if funcion is None:
+            if any(camino == ruta for _, camino in self.rutas):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{metodo} no se permite en {ruta}"}
+            return HTTPStatus.NOT_FOUND, {"error": f"No existe {ruta}"}
+
+        # Contrapresión: con la fila llena se rechaza de inmediato en lugar de acumular memoria
+        if self._en_curso >= self.concurrencia + self.en_espera_max:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Servicio saturado, intenta de nuevo"}
+        self._en_curso += 1
+        try:
+            async with self._semaforo:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._ejecutor, self._ejecutar, funcion, consulta, cuerpo
+                )
+        finally:
+            self._en_curso -= 1
+
+    async def _leer_peticion(self, lector):
+        # Regresa (metodo, ruta, consulta, cuerpo, cerrar) o None si el cliente ya no manda nada
+        linea = await asyncio.wait_for(lector.readline(), self.espera)
+        while linea in (b"\r\n", b"\n"):
+            linea = await asyncio.wait_for(lector.readline(), self.espera)
+        if not linea:
+            return None
+
+        partes = linea.decode("latin-1").split()
+        if len(partes) != 3:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "Línea de petición inválida")
+        metodo, destino, version = partes
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise ErrorHttp(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED, "Solo se acepta HTTP/1.0 y HTTP/1.1")
+
+        encabezados = {}
+        while True:
+            linea = await asyncio.wait_for(lector.readline(), self.espera)
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            if len(encabezados) >= ENCABEZADOS_MAX:
+                raise ErrorHttp(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Demasiados encabezados")
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            encabezados[nombre.strip().lower()] = valor.strip()
+
+        if "transfer-encoding" in encabezados:
+            raise ErrorHttp(HTTPStatus.NOT_IMPLEMENTED, "Usa Content-Length en lugar de Transfer-Encoding")
+        try:
+            longitud = int(encabezados.get("content-length", 0))
+        except ValueError:
+            raise ErrorHttp(HTTPStatus.BAD_REQUEST, "Content-Length inválido") from None
+        if not 0 <= longitud <= CUERPO_MAX:
+            raise ErrorHttp(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"El cuerpo no puede pasar de {CUERPO_MAX} bytes")
+        cuerpo = await asyncio.wait_for(lector.readexactly(longitud), self.espera) if longitud else b""
+
+        conexion = encabezados.get("connection", "").lower()
+        cerrar = "close" in conexion or (version == "HTTP/1.0" and "keep-alive" not in conexion)
+        url = urlsplit(destino)
+        consulta = {nombre: valores[-1] for nombre, valores in parse_qs(url.query).items()}
+        return metodo, url.path, consulta, cuerpo, cerrar
+
+    def _respuesta(self, estado, datos, cerrar):
+        cuerpo = json.dumps(datos, default=_a_json, ensure_ascii=False).encode("utf-8")
+        encabezados = [
+            f"HTTP/1.1 {estado.value} {estado.phrase}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(cuerpo)}",
+        ]
+        if estado == HTTPStatus.SERVICE_UNAVAILABLE:
+            encabezados.append("Retry-After: 1")
+        if cerrar:
+            encabezados.append("Connection: close")
+        return ("\r\n".join(encabezados) + "\r\n\r\n").encode("latin-1") + cuerpo
+
+    async def _escribir(self, respuestas, escritor):
+        # Responde en orden de llegada. Si el cliente se fue, se siguen esperando las
+        # peticiones ya iniciadas (un POST puede estar creando el pedido) sin escribir nada.
+        roto = False
+        while True:
+            elemento = await respuestas.get()
+            if elemento is None:
+                return
+            tarea, cerrar = elemento
+            estado, datos = await tarea
+            if roto:
+                continue
+            try:
+                escritor.write(self._respuesta(estado, datos, cerrar))
+                await escritor.drain()
+            except ConnectionError:
+                roto = True
+            if cerrar:
+                roto = True
+
+    async def _atender(self, lector, escritor):
+        # La cola acotada es la contrapresión por conexión: con PIPELINE_MAX peticiones sin
+        # responder se deja de leer el socket y TCP frena al cliente
+        respuestas = asyncio.Queue(self.pipeline)
+        escritura = asyncio.create_task(self._escribir(respuestas, escritor))
+        try:
+            while not escritor.is_closing():
+                try:
+                    peticion = await self._leer_peticion(lector)
+                except ErrorHttp as error:
+                    respuesta = asyncio.get_running_loop().create_future()
+                    respuesta.set_result((error.estado, {"error": str(error)}))
+                    await respuestas.put((respuesta, True))
+                    break
+                if peticion is None:
+                    break
+                metodo, ruta, consulta, cuerpo, cerrar = peticion
+                await respuestas.put((asyncio.ensure_future(self._despachar(metodo, ruta, consulta, cuerpo)), cerrar))
+                if cerrar:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Cliente inactivo, desconectado o con una línea más larga que el límite del lector
+            pass
+        finally:
+            await respuestas.put(None)
+            await escritura
+            escritor.close()
+            try:
+                await escritor.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _preparar(self):
+        # Un hilo del ejecutor por conexión del pool; el índice se suscribe al catálogo
+        configurar_pool(maximo=self.concurrencia)
+        catalogo.escuchar(conexion_dedicada)
+        self._indice = IndiceProductos.desde_catalogo(catalogo, incluir=lambda p: p[4] == "ACTIVO")
+
+    async def iniciar(self, host, puerto):
+        await asyncio.get_running_loop().run_in_executor(self._ejecutor, self._preparar)
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+        return await asyncio.start_server(self._atender, host, puerto)
+
+    def cerrar(self):
+        catalogo.dejar_de_escuchar()
+        self._ejecutor.shutdown(wait=True)
+
+
+async def servir(host, puerto, **opciones):
+    servicio = ServicioPedidos(**opciones)
+    servidor = await servicio.iniciar(host, puerto)
+    print(f"Escuchando en http://{host}:{puerto}", file=sys.stderr, flush=True)
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servicio.cerrar()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON de pedidos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA,
+                        help="Peticiones atendidas a la vez (tamaño del pool de conexiones)")
+    parser.add_argument("--en-espera", type=int, default=EN_ESPERA_MAX,
+                        help="Peticiones en espera antes de responder 503")
+    parser.add_argument("--pipeline", type=int, default=PIPELINE_MAX,
+                        help="Peticiones encadenadas por conexión")
+    args = parser.parse_args(argumentos)
+
+    try:
+        asyncio.run(servir(args.host, args.puerto, concurrencia=args.concurrencia,
+                           en_espera_max=args.en_espera, pipeline=args.pipeline))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())